@@ -1,16 +1,19 @@
 import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+from aggregates import AggregateEngine
+from clean_store import CLEAN_CHUNKSIZE, iter_clean
+from helper import dump, span, traced_iter, add_instrumentation_args, start_instrumentation
 
 # Paths
-CLEAN_DATA_PATH = "data/clean/survey.csv"
 RAW_DATA_PATH = "data/raw/survey.csv"
 save_folder = "visuals/eda"
-os.makedirs(save_folder, exist_ok=True)
-
-# Load
-df_clean = pd.read_csv(CLEAN_DATA_PATH)
+# Hash of each plot's spec + input data as last rendered; unchanged plots are skipped
+STATE_FILE = os.path.join(".cache", "eda_state.json")
 
 # Clean subset
 # keep_cols = ['Age', 'Country'] + list(df.columns[27:])
@@ -48,133 +51,317 @@ social_factors = [
     ("self_employed_cleaned", "Self-Employed"),
 ]
 
-# ---------- Demographics ----------
-for target, title in targets.items():
-    # Age groups
-    df_clean['Age_group'] = pd.cut(
-        df_clean['Age'],
+# (column, file prefix, title, x label, figure size)
+demographics = [
+    ("Age_group", "age", "Age Group", "Age Group", (8, 6)),
+    ("Gender_cleaned", "gender", "Gender", "Gender", (8, 6)),
+    ("Country", "country", "Top 10 Countries", "Country", (10, 6)),
+    ("Employees_estimate", "company_size", "Company Size", "Company Size (Employees)", (8, 6)),
+]
+
+
+# ---------- Plot registry ----------
+
+def build_plot_specs():
+    """
+    The EDA report as one declarative spec per PNG: the renderer ('kind'),
+    the aggregate it plots ('data') and its labels.
+    """
+    specs = []
+    for target, title in targets.items():
+        # ---------- Demographics ----------
+        for col, prefix, group_title, xlabel, figsize in demographics:
+            specs.append({
+                "file": f"{prefix}_vs_{target}.png", "kind": "stacked_bar", "data": ("share", col, target),
+                "title": f"{title} Responses by {group_title}", "xlabel": xlabel, "ylabel": "Proportion",
+                "legend_title": title, "legend_labels": ["No", "Yes", "Uncertain"], "figsize": figsize,
+            })
+
+        # ---------- Correlations ----------
+        specs.append({
+            "file": f"top_corr_heatmap_{target}.png", "kind": "corr_heatmap", "data": ("top_corr_matrix", target),
+            "title": f"Top Correlations with {title}", "figsize": (10, 8),
+        })
+        specs.append({
+            "file": f"top_corr_barplot_{target}.png", "kind": "corr_barplot", "data": ("top_corr", target),
+            "title": f"Top 10 Correlations with {title}", "xlabel": "Correlation Coefficient",
+        })
+
+    # ---------- Social/Personal Context ----------
+    for target, title in targets.items():
+        for col, label in social_factors:
+            specs += [
+                {
+                    "file": f"{col}_vs_{target}_count.png", "kind": "count_bar", "data": ("labeled_counts", col, target),
+                    "title": f"{label} vs {title}", "xlabel": label, "ylabel": "Count", "legend_title": title,
+                },
+                {
+                    "file": f"{col}_vs_{target}_barplot.png", "kind": "mean_bar", "data": ("target_mean", col, target),
+                    "title": f"{label} vs {title}", "xlabel": label, "ylabel": f"Proportion {title}",
+                },
+                {
+                    "file": f"{col}_vs_{target}_stacked_bar.png", "kind": "stacked_bar",
+                    "data": ("labeled_share", col, target),
+                    "title": f"{label} vs {title} (Stacked Proportions)", "xlabel": label, "ylabel": "Proportion",
+                    "legend_title": title, "figsize": (8, 6),
+                },
+                {
+                    "file": f"{col}_vs_{target}_heatmap.png", "kind": "share_heatmap",
+                    "data": ("labeled_share", col, target),
+                    "title": f"Proportion of {title} by {label} (Heatmap)", "xlabel": title, "ylabel": label,
+                },
+            ]
+    return specs
+
+
+# ---------- Shared aggregates ----------
+
+def add_age_group(df):
+    df['Age_group'] = pd.cut(
+        df['Age'],
         bins=[18, 25, 35, 50, 100],
         labels=["18-25", "26-35", "36-50", "50+"]
     )
+    return df
+
+
+def required_tables(specs):
+    """The contingency tables the specs plot, for the AggregateEngine."""
+    tables = set()
+    for spec in specs:
+        kind, *args = spec["data"]
+        if len(args) == 2:
+            tables.add(tuple(args))
+        if kind == "share" and args[0] == "Country":
+            tables.add(("Country",))
+    return sorted(tables)
+
+
+def aggregate_clean(specs, path=None, chunksize=CLEAN_CHUNKSIZE):
+    """One streaming pass over the clean data, one chunk in memory at a time."""
+    engine = AggregateEngine(required_tables(specs))
+    for i, chunk in enumerate(traced_iter(iter_clean(path=path, chunksize=chunksize), "read_clean")):
+        with span("aggregate_chunk", chunk=i, rows=len(chunk)):
+            engine.update(add_age_group(chunk))
+    return engine
+
+
+class Aggregates:
+    """
+    The small tables the plots are drawn from, derived from one
+    AggregateEngine pass: crosstabs of counts per (column, target) and the
+    correlation matrix. Plots never see the rows themselves.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._corr = None
+
+    def counts(self, col, target):
+        return self.engine.crosstab(col, target)
+
+    def corr(self):
+        if self._corr is None:
+            self._corr = self.engine.corr()
+        return self._corr
+
+    def top_corr(self, target):
+        return self.corr()[target].drop(target).sort_values(ascending=False).head(10)
+
+    def labeled_counts(self, col, target):
+        """Counts with the factor and target codes replaced by their labels (unmapped codes dropped)."""
+        counts = self.counts(col, target)
+        counts = counts.loc[counts.index.isin(list(feature_label_map[col])),
+                            counts.columns.isin(list(target_label_map[target]))]
+        counts.index = counts.index.map(feature_label_map[col])
+        counts.columns = counts.columns.map(target_label_map[target])
+        return counts
+
+    def resolve(self, data_ref):
+        """The table a spec's ('aggregate', *args) data reference points at."""
+        kind, *args = data_ref
+        if kind == "share":
+            col, target = args
+            counts = self.counts(col, target)
+            if col == "Country":
+                country_counts = self.engine.crosstab('Country')
+                top_countries = country_counts.sort_values(ascending=False, kind="stable").head(10).index
+                counts = counts[counts.index.isin(top_countries)]
+            return counts.div(counts.sum(axis=1), axis=0)
+        if kind == "top_corr":
+            return self.top_corr(*args)
+        if kind == "top_corr_matrix":
+            (target,) = args
+            subset_features = self.top_corr(target).index.tolist() + [target]
+            return self.corr().loc[subset_features, subset_features]
+        if kind == "labeled_counts":
+            return self.labeled_counts(*args)
+        if kind == "labeled_share":
+            counts = self.labeled_counts(*args)
+            return counts.div(counts.sum(axis=1), axis=0)
+        if kind == "target_mean":
+            # Mean target code per factor level with a 95% normal-approximation
+            # interval, from the counts alone
+            col, target = args
+            counts = self.counts(col, target)
+            counts = counts.loc[counts.index.isin(list(feature_label_map[col]))]
+            codes = counts.columns.to_numpy(dtype=float)
+            n = counts.sum(axis=1).to_numpy(dtype=float)
+            mean = counts.to_numpy() @ codes / n
+            var = counts.to_numpy() @ codes ** 2 / n - mean ** 2
+            return pd.DataFrame(
+                {"mean": mean, "ci": 1.96 * np.sqrt(np.maximum(var, 0) / n)},
+                index=counts.index.map(feature_label_map[col])
+            )
+        raise ValueError(f"Unknown aggregate {kind!r}")
+
+
+# ---------- Renderers (object-oriented Figure API, no pyplot state) ----------
+# seaborn and matplotlib load with the first plot rendered, not with the module
+
+def _stacked_bar(ax, spec, data):
+    data.plot(kind="bar", stacked=True, colormap="tab10", ax=ax)
+    ax.legend(title=spec["legend_title"], labels=spec.get("legend_labels"))
+
+
+def _corr_heatmap(ax, spec, data):
+    import seaborn as sns
+    sns.heatmap(data, annot=True, cmap="coolwarm", ax=ax)
+
+
+def _corr_barplot(ax, spec, data):
+    import seaborn as sns
+    sns.barplot(x=data.values, y=data.index, palette="coolwarm", ax=ax)
+
+
+def _count_bar(ax, spec, data):
+    import seaborn as sns
+    long = data.rename_axis(index=spec["xlabel"], columns=spec["legend_title"]).stack().rename("Count").reset_index()
+    sns.barplot(data=long, x=spec["xlabel"], y="Count", hue=spec["legend_title"], ax=ax)
+    ax.legend(title=spec["legend_title"])
+
+
+def _mean_bar(ax, spec, data):
+    import seaborn as sns
+    # Same look as sns.barplot, which would need the raw rows for its CI
+    ax.bar(data.index, data["mean"], yerr=data["ci"], ecolor=".26",
+           error_kw={"linewidth": 2}, color=sns.desaturate("C0", .75))
+
+
+def _share_heatmap(ax, spec, data):
+    import seaborn as sns
+    sns.heatmap(data, annot=True, cmap="Blues", cbar=False, fmt=".2f", ax=ax)
+
+
+RENDERERS = {
+    "stacked_bar": _stacked_bar,
+    "corr_heatmap": _corr_heatmap,
+    "corr_barplot": _corr_barplot,
+    "count_bar": _count_bar,
+    "mean_bar": _mean_bar,
+    "share_heatmap": _share_heatmap,
+}
+
+
+def render_plot(spec, data, path):
+    from matplotlib.figure import Figure
+    with span("render_plot", plot=spec["file"], kind=spec["kind"]):
+        fig = Figure(figsize=spec.get("figsize"))
+        ax = fig.subplots()
+        RENDERERS[spec["kind"]](ax, spec, data)
+        ax.set_title(spec["title"])
+        if "xlabel" in spec:
+            ax.set_xlabel(spec["xlabel"])
+        if "ylabel" in spec:
+            ax.set_ylabel(spec["ylabel"])
+        fig.tight_layout()
+        fig.savefig(path)
+    return path
+
+
+# ---------- Report ----------
+
+def _code_hash():
+    # Editing a renderer re-renders its plots
+    with open(__file__, "rb") as f:
+        return joblib.hash(f.read())
+
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, STATE_FILE)
+
+
+def render_report(engine, jobs=None, force=False):
+    """
+    Render every plot in the registry into save_folder, in parallel over
+    `jobs` processes. A plot is skipped when its spec, its input table and
+    this module's code hash the same as when its PNG was last written.
+    Returns (rendered, skipped) file names.
+    """
+    os.makedirs(save_folder, exist_ok=True)
+    aggregates = Aggregates(engine)
+    for target in targets:
+        dump(aggregates.top_corr(target).index)
+
+    state = {} if force else load_state()
+    code = _code_hash()
+    todo, skipped = [], []
+    for spec in build_plot_specs():
+        data = aggregates.resolve(spec["data"])
+        path = os.path.join(save_folder, spec["file"])
+        digest = joblib.hash((spec, data, code))
+        if state.get(spec["file"]) == digest and os.path.exists(path):
+            skipped.append(spec["file"])
+        else:
+            todo.append((spec, data, path, digest))
+
+    rendered = []
+    try:
+        if (jobs or os.cpu_count() or 1) <= 1 or len(todo) <= 1:
+            for spec, data, path, digest in todo:
+                render_plot(spec, data, path)
+                state[spec["file"]] = digest
+                rendered.append(spec["file"])
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [(pool.submit(render_plot, spec, data, path), spec, digest)
+                           for spec, data, path, digest in todo]
+                for future, spec, digest in futures:
+                    future.result()
+                    state[spec["file"]] = digest
+                    rendered.append(spec["file"])
+    finally:
+        # Plots finished before a failure are not rendered again
+        save_state(state)
+    return rendered, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the EDA plots.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Rendering processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Re-render every plot")
+    parser.add_argument("--chunksize", type=int, default=CLEAN_CHUNKSIZE, help="Rows read per chunk")
+    add_instrumentation_args(parser)
+    args = parser.parse_args(argv)
+
+    with start_instrumentation(args, "eda"):
+        # Stream the clean data (Parquet if present) into the aggregates once
+        engine = aggregate_clean(build_plot_specs(), chunksize=args.chunksize)
+
+        rendered, skipped = render_report(engine, jobs=args.jobs, force=args.force)
+    print(f"Rendered {len(rendered)} plots, {len(skipped)} unchanged -> {save_folder}")
+
 
-    ct = pd.crosstab(df_clean['Age_group'], df_clean[target], normalize='index')
-    ct.plot(kind="bar", stacked=True, colormap="tab10", figsize=(8,6))
-    plt.title(f"{title} Responses by Age Group")
-    plt.xlabel("Age Group")
-    plt.ylabel("Proportion")
-    plt.legend(title=title, labels=["No", "Yes", "Uncertain"])
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_folder, f"age_vs_{target}.png"))
-    plt.close()
-
-    # Gender
-    ct = pd.crosstab(df_clean['Gender_cleaned'], df_clean[target], normalize='index')
-    ct.plot(kind="bar", stacked=True, colormap="tab10", figsize=(8,6))
-    plt.title(f"{title} Responses by Gender")
-    plt.xlabel("Gender")
-    plt.ylabel("Proportion")
-    plt.legend(title=title, labels=["No", "Yes", "Uncertain"])
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_folder, f"gender_vs_{target}.png"))
-    plt.close()
-
-    # Country (Top 10)
-    top_countries = df_clean['Country'].value_counts().head(10).index
-    df_top_countries = df_clean[df_clean['Country'].isin(top_countries)]
-    ct = pd.crosstab(df_top_countries['Country'], df_top_countries[target], normalize='index')
-    ct.plot(kind="bar", stacked=True, colormap="tab10", figsize=(10,6))
-    plt.title(f"{title} Responses by Top 10 Countries")
-    plt.xlabel("Country")
-    plt.ylabel("Proportion")
-    plt.legend(title=title, labels=["No", "Yes", "Uncertain"])
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_folder, f"country_vs_{target}.png"))
-    plt.close()
-
-    # Company size
-    ct = pd.crosstab(df_clean['Employees_estimate'], df_clean[target], normalize='index')
-    ct.plot(kind="bar", stacked=True, colormap="tab10", figsize=(8,6))
-    plt.title(f"{title} Responses by Company Size")
-    plt.xlabel("Company Size (Employees)")
-    plt.ylabel("Proportion")
-    plt.legend(title=title, labels=["No", "Yes", "Uncertain"])
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_folder, f"company_size_vs_{target}.png"))
-    plt.close()
-
-    # ---------- Correlations ----------
-    corr = df_clean.corr(numeric_only=True)
-    top10_features = corr[target].drop(target).sort_values(ascending=False).head(10).index
-    print(top10_features)
-    subset_features = top10_features.tolist() + [target]
-    top_corr_matrix = corr.loc[subset_features, subset_features]
-
-    plt.figure(figsize=(10,8))
-    sns.heatmap(top_corr_matrix, annot=True, cmap="coolwarm")
-    plt.title(f"Top Correlations with {title}")
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_folder, f"top_corr_heatmap_{target}.png"))
-    plt.close()
-
-    # Barplot of correlations
-    top_corr = corr[target].drop(target).sort_values(ascending=False).head(10)
-    sns.barplot(x=top_corr.values, y=top_corr.index, palette="coolwarm")
-    plt.title(f"Top 10 Correlations with {title}")
-    plt.xlabel("Correlation Coefficient")
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_folder, f"top_corr_barplot_{target}.png"))
-    plt.close()
-
-# ---------- Social/Personal Context ----------
-
-for target, title in targets.items():
-    for col, label in social_factors:
-        plot_df = df_clean.copy()
-
-        # Apply mappings for both target and factor
-        plot_df[target + "_plot"] = plot_df[target].map(target_label_map[target])
-        plot_df[col + "_plot"] = plot_df[col].map(feature_label_map[col])
-
-        # Countplot
-        sns.countplot(x=col + "_plot", hue=target + "_plot", data=plot_df)
-        plt.title(f"{label} vs {title}")
-        plt.xlabel(label)
-        plt.ylabel("Count")
-        plt.legend(title=title)
-        plt.tight_layout()
-        plt.savefig(os.path.join(save_folder, f"{col}_vs_{target}_count.png"))
-        plt.close()
-
-        # Proportion barplot
-        sns.barplot(
-            x=col + "_plot",
-            y=target,
-            data=plot_df,
-            estimator=lambda x: sum(x)/len(x)
-        )
-        plt.title(f"{label} vs {title}")
-        plt.xlabel(label)
-        plt.ylabel(f"Proportion {title}")
-        plt.tight_layout()
-        plt.savefig(os.path.join(save_folder, f"{col}_vs_{target}_barplot.png"))
-        plt.close()
-
-        # Stacked bar plot
-        ct.plot(kind="bar", stacked=True, figsize=(8, 6), colormap="tab10")
-        plt.title(f"{label} vs {title} (Stacked Proportions)")
-        plt.xlabel(label)
-        plt.ylabel("Proportion")
-        plt.legend(title=title)
-        plt.tight_layout()
-        plt.savefig(os.path.join(save_folder, f"{col}_vs_{target}_stacked_bar.png"))
-        plt.close()
-
-        # Heatmap (proportion table)
-        ct = pd.crosstab(plot_df[col + "_plot"], plot_df[target + "_plot"], normalize='index')
-        sns.heatmap(ct, annot=True, cmap="Blues", cbar=False, fmt=".2f")
-        plt.title(f"Proportion of {title} by {label} (Heatmap)")
-        plt.xlabel(title)
-        plt.ylabel(label)
-        plt.tight_layout()
-        plt.savefig(os.path.join(save_folder, f"{col}_vs_{target}_heatmap.png"))
-        plt.close()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+
+class Vocabulary:
+    """
+    Value -> integer code for one column, growing as later chunks bring new
+    values, so counts from different chunks (or engines) line up.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+        # Order of an ordered categorical (e.g. pd.cut bins), for presentation;
+        # other values are presented sorted
+        self.categories = None
+
+    def code(self, value):
+        if value not in self.codes:
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+        return self.codes[value]
+
+    def encode(self, series):
+        """Codes for a Series; -1 where it is missing."""
+        if self.categories is None and isinstance(series.dtype, pd.CategoricalDtype) and series.cat.ordered:
+            self.categories = list(series.cat.categories)
+        codes, uniques = pd.factorize(series)
+        mapping = np.array([self.code(v.item() if hasattr(v, "item") else v) for v in uniques], dtype=np.intp)
+        if not len(mapping):
+            return codes.astype(np.intp)
+        return np.where(codes >= 0, mapping[np.maximum(codes, 0)], -1)
+
+    def order(self):
+        """Codes in presentation order: ordered-category order, else sorted values."""
+        if self.categories is not None:
+            rank = {v: i for i, v in enumerate(self.categories)}
+            return sorted(range(len(self.values)), key=lambda c: (rank.get(self.values[c], len(rank)), c))
+        try:
+            return sorted(range(len(self.values)), key=lambda c: self.values[c])
+        except TypeError:
+            return sorted(range(len(self.values)), key=lambda c: str(self.values[c]))
+
+
+def _grow(counts, shape):
+    if counts.shape == tuple(shape):
+        return counts
+    return np.pad(counts, [(0, n - m) for n, m in zip(shape, counts.shape)])
+
+
+class AggregateEngine:
+    """
+    Contingency tables and a Pearson correlation matrix accumulated over any
+    number of chunks in one pass, from integer codes and np.bincount, never
+    holding more than one chunk. Engines over different chunks can be merged.
+
+    tables:  column tuples to count, e.g. [("Country",), ("Age_group", "treatment_cleaned")]
+    numeric: columns of the correlation matrix; None takes every numeric
+             column of the first chunk (like DataFrame.corr(numeric_only=True)),
+             () skips the correlations.
+    """
+
+    def __init__(self, tables=(), numeric=None):
+        self.tables = [tuple(t) for t in tables]
+        self.vocab = {col: Vocabulary() for table in self.tables for col in table}
+        self.counts = {table: np.zeros((0,) * len(table), dtype=np.int64) for table in self.tables}
+        self.numeric = list(numeric) if numeric is not None else None
+        self.n_rows = 0
+        self._moments = None
+
+    # ---------- Accumulate ----------
+
+    def update(self, df):
+        codes = {col: vocab.encode(df[col]) for col, vocab in self.vocab.items()}
+        for table in self.tables:
+            shape = [len(self.vocab[col].values) for col in table]
+            table_codes = [codes[col] for col in table]
+            valid = np.logical_and.reduce([c >= 0 for c in table_codes])
+            flat = np.ravel_multi_index([c[valid] for c in table_codes], shape)
+            chunk_counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+            self.counts[table] = _grow(self.counts[table], shape) + chunk_counts
+
+        if self.numeric is None:
+            self.numeric = [c for c in df.columns
+                            if is_numeric_dtype(df[c]) and not isinstance(df[c].dtype, pd.CategoricalDtype)]
+        if self.numeric:
+            self._update_moments(df[self.numeric].to_numpy(dtype=float, na_value=np.nan))
+        self.n_rows += len(df)
+        return self
+
+    def _update_moments(self, X):
+        # Pairwise-complete sums, as DataFrame.corr uses: entry [i, j] only
+        # counts rows where both column i and column j are present
+        present = (~np.isnan(X)).astype(float)
+        X = np.nan_to_num(X)
+        moments = np.stack([
+            present.T @ present,      # n
+            X.T @ present,            # sum x_i
+            (X * X).T @ present,      # sum x_i^2
+            X.T @ X,                  # sum x_i x_j
+        ])
+        self._moments = moments if self._moments is None else self._moments + moments
+
+    def merge(self, other):
+        """Add another engine's counts (same tables and numeric columns) into this one."""
+        if other.tables != self.tables or (self.numeric is not None and other.numeric not in (None, self.numeric)):
+            raise ValueError("Can only merge engines over the same tables and numeric columns")
+        remap = {
+            col: np.array([self.vocab[col].code(v) for v in other.vocab[col].values], dtype=np.intp)
+            for col in self.vocab
+        }
+        for col, vocab in self.vocab.items():
+            if vocab.categories is None:
+                vocab.categories = other.vocab[col].categories
+        for table in self.tables:
+            shape = [len(self.vocab[col].values) for col in table]
+            counts = _grow(self.counts[table], shape)
+            # Codes map one-to-one, so plain fancy-index assignment is safe
+            counts[np.ix_(*[remap[col] for col in table])] += other.counts[table]
+            self.counts[table] = counts
+
+        if self.numeric is None:
+            self.numeric = other.numeric
+        if other._moments is not None:
+            self._moments = other._moments.copy() if self._moments is None else self._moments + other._moments
+        self.n_rows += other.n_rows
+        return self
+
+    # ---------- Results ----------
+
+    def crosstab(self, *cols):
+        """
+        Counts like pd.crosstab(df[row], df[col]) (a DataFrame) or
+        df[col].value_counts(sort=False) (a Series) for one column.
+        """
+        counts = self.counts[tuple(cols)]
+        orders = [self.vocab[col].order() for col in cols]
+        counts = counts[np.ix_(*orders)] if orders else counts
+        labels = [pd.Index([self.vocab[col].values[c] for c in order], name=col) for col, order in zip(cols, orders)]
+        if len(cols) == 1:
+            return pd.Series(counts, index=labels[0], name="count")
+        if len(cols) == 2:
+            # Like pd.crosstab, levels never seen together with the other column are left out
+            keep_rows, keep_cols = counts.sum(axis=1) > 0, counts.sum(axis=0) > 0
+            return pd.DataFrame(counts[keep_rows][:, keep_cols], index=labels[0][keep_rows],
+                                columns=labels[1][keep_cols])
+        raise ValueError("crosstab takes one or two columns")
+
+    def corr(self):
+        """Pearson correlation of the numeric columns, pairwise-complete like DataFrame.corr."""
+        if self._moments is None:
+            return pd.DataFrame(index=self.numeric or [], columns=self.numeric or [], dtype=float)
+        n, sx, sxx, sxy = self._moments
+        # var[i, j]: variance of column i over the rows where j is present too
+        var = n * sxx - sx * sx
+        cov = n * sxy - sx * sx.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.sqrt(var * var.T)
+        corr[(n < 1) | (var <= 0) | (var.T <= 0)] = np.nan
+        return pd.DataFrame(np.clip(corr, -1, 1), index=self.numeric, columns=self.numeric)
@@ -0,0 +1,316 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+# HyperLogLog precision: 2**14 one-byte registers per column, ~0.8% error
+HLL_PRECISION = 14
+# Exact value counts are kept while a column has at most this many distinct
+# values (answers to closed questions); free text stops being tracked
+MAX_TRACKED_VALUES = 50
+# Values kept per numeric column (bottom-k random sample) for the quartiles
+QUANTILE_SAMPLE = 10_000
+AUDIT_CHUNKSIZE = 100_000
+
+
+class HyperLogLog:
+    """Approximate distinct count from 64-bit hashes; registers merge by max."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if not len(hashes):
+            return self
+        width = 64 - self.precision
+        idx = (hashes >> np.uint64(width)).astype(np.intp)
+        rest = hashes & np.uint64((1 << width) - 1)
+        # Rank = leading zeros of the remaining bits + 1 (frexp gives the bit length)
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, width + 1, width - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting is near exact
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+# Hash of a missing value in row hashes
+_MISSING_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _is_number(dtype):
+    return is_numeric_dtype(dtype) and not is_bool_dtype(dtype)
+
+
+def _hash_values(values):
+    """Stable 64-bit hashes; numbers hash as float64 so int/float chunks of a column agree."""
+    values = np.asarray(values)
+    if _is_number(values.dtype):
+        return pd.util.hash_array(values.astype(np.float64))
+    return pd.util.hash_array(values.astype(object), categorize=False)
+
+
+def _python_value(v):
+    return v.item() if hasattr(v, "item") else v
+
+
+class ColumnAudit:
+    """Mergeable statistics of one column."""
+
+    def __init__(self):
+        self.dtype = None
+        self.count = 0
+        self.missing = 0
+        self.hll = HyperLogLog()
+        self.values = {}  # value -> count; None once past MAX_TRACKED_VALUES
+        # Numeric moments (Chan et al. parallel update) and bottom-k sample
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sample_keys = np.empty(0)
+        self.sample_values = np.empty(0)
+
+    def update(self, series, rng):
+        """Add one chunk of the column; returns its per-row hashes (for duplicate detection)."""
+        dtype = series.dtype
+        if self.dtype is None:
+            self.dtype = dtype
+        elif self.dtype != dtype:
+            self.dtype = np.result_type(self.dtype, dtype) if _is_number(self.dtype) and _is_number(dtype) \
+                else np.dtype(object)
+
+        present = series.notna().to_numpy()
+        self.count += len(series)
+        self.missing += int(len(series) - present.sum())
+
+        if self.values is not None or not _is_number(dtype):
+            # Factorize once: distinct values are hashed and counted, rows
+            # just index into them
+            codes, uniques = pd.factorize(series)
+            unique_hashes = _hash_values(uniques)
+            self.hll.add_hashes(unique_hashes)
+            row_hashes = np.where(codes >= 0, unique_hashes[np.maximum(codes, 0)], _MISSING_HASH)
+            if self.values is not None:
+                if len(uniques) > MAX_TRACKED_VALUES:
+                    self.values = None
+                else:
+                    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+                    for value, n in zip(uniques, counts):
+                        value = _python_value(value)
+                        self.values[value] = self.values.get(value, 0) + int(n)
+                    if len(self.values) > MAX_TRACKED_VALUES:
+                        self.values = None
+        else:
+            row_hashes = np.full(len(series), _MISSING_HASH)
+            row_hashes[present] = _hash_values(series.to_numpy()[present])
+            self.hll.add_hashes(row_hashes[present])
+
+        if _is_number(dtype) and present.any():
+            x = series.to_numpy(dtype=np.float64, na_value=np.nan)[present]
+            self._merge_moments(len(x), x.mean(), ((x - x.mean()) ** 2).sum(), x.min(), x.max())
+            self._merge_sample(rng.random(len(x)), x)
+        return row_hashes
+
+    def _merge_moments(self, n, mean, m2, lo, hi):
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+        self.min, self.max = min(self.min, lo), max(self.max, hi)
+
+    def _merge_sample(self, keys, values):
+        keys = np.concatenate([self.sample_keys, keys])
+        values = np.concatenate([self.sample_values, values])
+        if len(keys) > QUANTILE_SAMPLE:
+            keep = np.argpartition(keys, QUANTILE_SAMPLE)[:QUANTILE_SAMPLE]
+            keys, values = keys[keep], values[keep]
+        self.sample_keys, self.sample_values = keys, values
+
+    def merge(self, other):
+        if other.dtype is not None:
+            self.dtype = other.dtype if self.dtype is None else (
+                np.result_type(self.dtype, other.dtype)
+                if is_numeric_dtype(self.dtype) and is_numeric_dtype(other.dtype) else np.dtype(object)
+            )
+        self.count += other.count
+        self.missing += other.missing
+        self.hll.merge(other.hll)
+        if self.values is not None and other.values is not None:
+            for value, n in other.values.items():
+                self.values[value] = self.values.get(value, 0) + n
+            if len(self.values) > MAX_TRACKED_VALUES:
+                self.values = None
+        else:
+            self.values = None
+        if other.n:
+            self._merge_moments(other.n, other.mean, other.m2, other.min, other.max)
+            self._merge_sample(other.sample_keys, other.sample_values)
+        return self
+
+    def report(self):
+        out = {
+            "dtype": str(self.dtype),
+            "missing": self.missing,
+            "missing_fraction": self.missing / self.count if self.count else 0.0,
+            "distinct_approx": self.hll.estimate(),
+            "values": None,
+            "numeric": None,
+        }
+        if self.values is not None:
+            out["distinct_approx"] = len(self.values)
+            out["values"] = dict(sorted(self.values.items(), key=lambda kv: (-kv[1], str(kv[0]))))
+        if self.n:
+            q25, q50, q75 = np.quantile(self.sample_values, [0.25, 0.5, 0.75])
+            out["numeric"] = {
+                "count": self.n, "mean": float(self.mean),
+                "std": float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else None,
+                "min": float(self.min), "25%": float(q25), "50%": float(q50), "75%": float(q75),
+                "max": float(self.max),
+                # Quartiles come from a random sample once a column exceeds it
+                "quantiles_exact": self.n <= QUANTILE_SAMPLE,
+            }
+        return out
+
+
+class AuditEngine:
+    """
+    Data-quality audit of any number of chunks in one pass: missing counts,
+    numeric summaries (like describe(), quartiles from a bounded sample),
+    approximate distinct counts (HyperLogLog), value counts of low-cardinality
+    columns and duplicate rows from 64-bit row hashes. Engines over different
+    chunks merge. With sample_fraction, each chunk is Bernoulli-sampled first
+    for a quick look; counts then describe the sample.
+    """
+
+    def __init__(self, sample_fraction=None, seed=42):
+        if sample_fraction is not None and not 0 < sample_fraction <= 1:
+            raise ValueError(f"sample_fraction must be in (0, 1], got {sample_fraction}")
+        self.sample_fraction = sample_fraction
+        self.rng = np.random.default_rng(seed)
+        self.columns = {}
+        self.rows_seen = 0
+        self.rows_audited = 0
+        self._row_hashes = []
+
+    def update(self, df):
+        self.rows_seen += len(df)
+        if self.sample_fraction is not None and self.sample_fraction < 1:
+            df = df[self.rng.random(len(df)) < self.sample_fraction]
+        self.rows_audited += len(df)
+        # Column hashes combine into one 64-bit hash per row (8 bytes per
+        # row kept for the duplicate count)
+        row_hashes = np.zeros(len(df), dtype=np.uint64)
+        for i, col in enumerate(df.columns):
+            col_hashes = self.columns.setdefault(col, ColumnAudit()).update(df[col], self.rng)
+            row_hashes = row_hashes * np.uint64(0x100000001B3) ^ (col_hashes + np.uint64(i))
+        if len(df):
+            self._row_hashes.append(row_hashes)
+        return self
+
+    def merge(self, other):
+        for col, audit in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(audit)
+            else:
+                self.columns[col] = audit
+        self.rows_seen += other.rows_seen
+        self.rows_audited += other.rows_audited
+        self._row_hashes.extend(other._row_hashes)
+        return self
+
+    def duplicate_rows(self):
+        """Rows identical to an earlier row, like df.duplicated().sum()."""
+        if not self._row_hashes:
+            return 0
+        hashes = np.concatenate(self._row_hashes)
+        return int(len(hashes) - len(np.unique(hashes)))
+
+    def report(self):
+        duplicates = self.duplicate_rows()
+        return {
+            "rows": self.rows_seen,
+            "rows_audited": self.rows_audited,
+            "sample_fraction": self.sample_fraction,
+            "duplicate_rows": duplicates,
+            "duplicate_fraction": duplicates / self.rows_audited if self.rows_audited else 0.0,
+            "columns": {col: audit.report() for col, audit in self.columns.items()},
+        }
+
+
+def audit_frame(df, sample_fraction=None, seed=42):
+    """Audit report of an in-memory DataFrame."""
+    return AuditEngine(sample_fraction, seed).update(df).report()
+
+
+def audit_csv(path, chunksize=AUDIT_CHUNKSIZE, sample_fraction=None, seed=42):
+    """Audit report of a CSV in one streaming pass, one chunk in memory at a time."""
+    engine = AuditEngine(sample_fraction, seed)
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        engine.update(chunk)
+    return engine.report()
+
+
+def save_report(report, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+
+
+def format_audit(report, max_values=20):
+    """The report as text, in the order the old data_audit printout used."""
+    lines = [f"Data Shape: ({report['rows']}, {len(report['columns'])})"]
+    if report["sample_fraction"] is not None:
+        lines.append(f"Sampled: {report['rows_audited']} rows ({report['sample_fraction']:.1%})")
+    lines += ["", "Missing Values:"]
+    width = max((len(c) for c in report["columns"]), default=0)
+    lines += [f"{col:<{width}}  {c['missing']}" for col, c in report["columns"].items()]
+
+    numeric = {col: c["numeric"] for col, c in report["columns"].items() if c["numeric"]}
+    if numeric:
+        lines += ["", "Numeric Summary:", pd.DataFrame(numeric).drop(index="quantiles_exact").to_string()]
+    lines += ["", f"Duplicates: {report['duplicate_rows']}"]
+
+    for col, c in report["columns"].items():
+        if c["numeric"]:
+            continue
+        if c["values"] is not None:
+            shown = list(c["values"])[:max_values]
+            more = f" ... (+{len(c['values']) - len(shown)})" if len(c["values"]) > len(shown) else ""
+            lines.append(f"\nUnique values in {col}: {shown}{more}")
+        else:
+            lines.append(f"\nUnique values in {col}: ~{c['distinct_approx']} distinct (free text, not listed)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming data-quality audit of a CSV.")
+    parser.add_argument("path", nargs="?", default="data/raw/survey.csv")
+    parser.add_argument("--chunksize", type=int, default=AUDIT_CHUNKSIZE)
+    parser.add_argument("--sample", type=float, default=None, help="Audit only this fraction of rows (quick check)")
+    parser.add_argument("--json", metavar="PATH", help="Write the structured report to PATH")
+    args = parser.parse_args()
+
+    report = audit_csv(args.path, args.chunksize, args.sample)
+    if args.json:
+        save_report(report, args.json)
+        print(f"Audit report saved to {args.json}")
+    else:
+        print(format_audit(report))
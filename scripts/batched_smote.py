@@ -0,0 +1,79 @@
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator
+
+
+class BatchedSMOTE(BaseEstimator):
+    """
+    SMOTE that never builds a k-NN index over a whole class and keeps CSR
+    input sparse. Synthetic rows are made `batch_size` base rows at a time:
+    each base row's k nearest neighbours are searched among at most
+    `max_candidates` random rows of its class (exact when the class is
+    smaller), so peak extra memory is batch_size x max_candidates distances.
+    Like SMOTE's default strategy, every class is oversampled to the size of
+    the largest one.
+    """
+
+    def __init__(self, k_neighbors=5, batch_size=1024, max_candidates=2048, random_state=None):
+        self.k_neighbors = k_neighbors
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        self.fit_resample(X, y)
+        return self
+
+    def fit_resample(self, X, y):
+        rng = np.random.default_rng(self.random_state)
+        is_sparse = sparse.issparse(X)
+        X = X.tocsr() if is_sparse else np.asarray(X, dtype=float)
+        y_arr = np.asarray(y)
+        classes, counts = np.unique(y_arr, return_counts=True)
+        target = counts.max()
+
+        new_X, new_y = [X], [y_arr]
+        for cls, count in zip(classes, counts):
+            if count < target:
+                Xc = X[np.flatnonzero(y_arr == cls)]
+                new_X.append(self._synthesize(Xc, target - count, rng))
+                new_y.append(np.full(target - count, cls, dtype=y_arr.dtype))
+
+        X_res = sparse.vstack(new_X, format="csr") if is_sparse else np.vstack(new_X)
+        y_res = np.concatenate(new_y)
+        if hasattr(y, "iloc"):
+            y_res = type(y)(y_res, name=getattr(y, "name", None))
+        return X_res, y_res
+
+    def _synthesize(self, Xc, n_new, rng):
+        n = Xc.shape[0]
+        base = rng.integers(n, size=n_new)
+        k = min(self.k_neighbors, n - 1)
+        if k < 1:
+            # A single row has no neighbours: repeat it
+            return Xc[base]
+
+        sq_norms = np.asarray(Xc.multiply(Xc).sum(axis=1)).ravel() if sparse.issparse(Xc) else (Xc * Xc).sum(axis=1)
+        batches = []
+        for start in range(0, n_new, self.batch_size):
+            rows = base[start:start + self.batch_size]
+            candidates = np.arange(n) if n <= self.max_candidates else rng.choice(n, self.max_candidates, replace=False)
+
+            # Squared distances from the batch to the candidates; no self-matches
+            dots = Xc[rows] @ Xc[candidates].T
+            dots = dots.toarray() if sparse.issparse(dots) else dots
+            dist = sq_norms[rows][:, None] + sq_norms[candidates][None, :] - 2 * dots
+            dist[rows[:, None] == candidates[None, :]] = np.inf
+
+            kk = min(k, len(candidates) - 1)
+            nearest = np.argpartition(dist, kk - 1, axis=1)[:, :kk]
+            pick = nearest[np.arange(len(rows)), rng.integers(kk, size=len(rows))]
+            neighbours = candidates[pick]
+
+            gap = rng.random(len(rows))
+            base_rows, neighbour_rows = Xc[rows], Xc[neighbours]
+            if sparse.issparse(Xc):
+                batches.append(base_rows + sparse.diags(gap) @ (neighbour_rows - base_rows))
+            else:
+                batches.append(base_rows + gap[:, None] * (neighbour_rows - base_rows))
+        return sparse.vstack(batches, format="csr") if sparse.issparse(Xc) else np.vstack(batches)
@@ -0,0 +1,385 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import threading
+import contextlib
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import numpy as np
+from helper import rss_mb
+from synthetic_data import write_raw
+
+# Synthetic inputs are cached per (rows, seed) under BENCH_DIR/data
+BENCH_DIR = "benchmarks"
+RESULTS_PATH = os.path.join(BENCH_DIR, "latest.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+BENCH_ROWS = 10_000
+BENCH_STAGES = ("clean", "eda", "train", "importance")
+BENCH_MODELS = ("RandomForest_Balanced", "LogisticRegression", "CategoricalNB")
+# A case regresses when it is this much slower / bigger than the baseline,
+# and by more than the noise floor
+TOLERANCE = 0.25
+NOISE_SECONDS = 0.05
+NOISE_MB = 10.0
+# RSS polling interval while a case runs
+RSS_SAMPLE_SECONDS = 0.01
+IMPORTANCE_REPEATS = 3
+IMPORTANCE_BOOTSTRAP = 200
+EVAL_BOOTSTRAP = 10_000
+
+
+# ---------- Cases ----------
+# Each case runs in a fresh process: setup() is not timed, run() is, and
+# the memory run() adds on top of setup()'s is the case's memory (case_rss_mb).
+
+def _paths(workdir):
+    return {
+        "clean": os.path.join(workdir, "clean", "survey.parquet"),
+        "models": os.path.join(workdir, "models"),
+    }
+
+
+def _training_split(workdir):
+    from clean_store import CLEAN_COLUMNS, load_clean
+    from model_training import drop_cols, prepare_features, holdout_split
+    df = load_clean(columns=[c for c in CLEAN_COLUMNS if c not in drop_cols], path=_paths(workdir)["clean"])
+    X, y, categorical_cols = prepare_features(df)
+    return (*holdout_split(X, y), categorical_cols)
+
+
+def _pipeline(name, categorical_cols, matrix_format):
+    from model_training import build_preprocessor, build_models, build_pipelines
+    return build_pipelines(
+        build_preprocessor(categorical_cols, matrix_format), {name: build_models()[name]}, matrix_format
+    )[name]
+
+
+def _fitted_model_path(workdir, name, matrix_format):
+    """Path of the benchmark's fitted `name` pipeline, fitting it first if needed (untimed)."""
+    path = os.path.join(_paths(workdir)["models"], f"{name}.joblib")
+    if not os.path.exists(path):
+        X_train, _, y_train, _, categorical_cols = _training_split(workdir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump(_pipeline(name, categorical_cols, matrix_format).fit(X_train, y_train), path)
+    return path
+
+
+def case_clean(workdir, raw_path, opts):
+    from clean_data import clean_streaming
+    out = _paths(workdir)["clean"]
+    n_rows, _ = clean_streaming(raw_path, parquet_file=out, chunksize=opts["chunksize"])
+    return {"clean_rows": n_rows}
+
+
+def case_eda(workdir, raw_path, opts):
+    from EDA import build_plot_specs, aggregate_clean
+    engine = aggregate_clean(build_plot_specs(), path=_paths(workdir)["clean"], chunksize=opts["chunksize"])
+    return {"tables": len(engine.tables)}
+
+
+def setup_fit(workdir, opts, name):
+    X_train, _, y_train, _, categorical_cols = _training_split(workdir)
+    return _pipeline(name, categorical_cols, opts["matrix_format"]), X_train, y_train
+
+
+def case_fit(workdir, raw_path, opts, name, state):
+    clf, X_train, y_train = state
+    clf.fit(X_train, y_train)
+    path = os.path.join(_paths(workdir)["models"], f"{name}.joblib")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(clf, path)
+    return {"train_rows": len(X_train)}
+
+
+def case_cv(workdir, raw_path, opts, name, state):
+    from model_training import CV_FOLDS
+    from orchestrator import run_training_grid
+    clf, X_train, y_train = state
+    fold_results, _ = run_training_grid(
+        {name: clf}, X_train, y_train, cv=CV_FOLDS, scoring="f1_macro", n_workers=opts["workers"],
+        final_fit=False, cache_dir=None
+    )
+    scores = np.array([r["Score"] for r in fold_results], dtype=float)
+    ok = np.isfinite(scores)
+    return {"folds": len(scores), "failed_folds": int((~ok).sum()),
+            "cv_f1_mean": float(scores[ok].mean()) if ok.any() else None}
+
+
+def setup_predict(workdir, opts, name):
+    path = _fitted_model_path(workdir, name, opts["matrix_format"])
+    _, X_test, _, y_test, _ = _training_split(workdir)
+    return joblib.load(path), X_test, y_test
+
+
+def case_predict(workdir, raw_path, opts, name, state):
+    from sklearn.metrics import f1_score
+    clf, X_test, y_test = state
+    y_pred = clf.predict(X_test)
+    return {"test_rows": len(X_test), "test_f1_macro": float(f1_score(y_test, y_pred, average="macro"))}
+
+
+def setup_bootstrap_eval(workdir, opts):
+    _, X_test, _, y_test, _ = _training_split(workdir)
+    predictions = {}
+    for name in opts["models"]:
+        clf = joblib.load(_fitted_model_path(workdir, name, opts["matrix_format"]))
+        predictions[name] = clf.predict(X_test)
+    return np.asarray(y_test), predictions
+
+
+def case_bootstrap_eval(workdir, raw_path, opts, state):
+    from evaluation import bootstrap_evaluate
+    y_test, predictions = state
+    for y_pred in predictions.values():
+        bootstrap_evaluate(y_test, y_pred, opts["eval_bootstrap"])
+    return {"models": len(predictions), "resamples": opts["eval_bootstrap"], "test_rows": len(y_test)}
+
+
+def setup_importance(workdir, opts):
+    model_paths = {name: _fitted_model_path(workdir, name, opts["matrix_format"]) for name in opts["models"]}
+    _, X_test, _, y_test, _ = _training_split(workdir)
+    return model_paths, X_test, y_test
+
+
+def case_importance(workdir, raw_path, opts, state):
+    from feature_importance import permutation_importance
+    model_paths, X_test, y_test = state
+    tables = permutation_importance(
+        model_paths, X_test, y_test, n_repeats=opts["importance_repeats"],
+        n_bootstrap=opts["importance_bootstrap"], workers=opts["workers"]
+    )
+    return {"models": len(tables), "features": int(X_test.shape[1])}
+
+
+def build_cases(stages, models):
+    """Ordered {case name: (run, setup, extra args)}; later cases read what earlier ones wrote."""
+    cases = {}
+    if "clean" in stages:
+        cases["clean"] = (case_clean, None, ())
+    if "eda" in stages:
+        cases["eda_aggregate"] = (case_eda, None, ())
+    if "train" in stages:
+        for name in models:
+            cases[f"fit:{name}"] = (case_fit, setup_fit, (name,))
+            cases[f"cv:{name}"] = (case_cv, setup_fit, (name,))
+            cases[f"predict:{name}"] = (case_predict, setup_predict, (name,))
+        cases["bootstrap_eval"] = (case_bootstrap_eval, setup_bootstrap_eval, ())
+    if "importance" in stages:
+        cases["importance"] = (case_importance, setup_importance, ())
+    return cases
+
+
+# ---------- Runner ----------
+
+def _max_rss_mb(who):
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+
+def _current_rss_mb():
+    # helper.rss_mb is in 1e6 bytes; the ru_maxrss figures here are MiB
+    return (rss_mb() or 0.0) * 1e6 / 1024 ** 2
+
+
+@contextlib.contextmanager
+def _sample_rss(peak):
+    """Poll this process's current RSS every RSS_SAMPLE_SECONDS; peak[0] is the highest seen."""
+    stop = threading.Event()
+
+    def poll():
+        while not stop.wait(RSS_SAMPLE_SECONDS):
+            peak[0] = max(peak[0], _current_rss_mb())
+
+    thread = threading.Thread(target=poll, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+        peak[0] = max(peak[0], _current_rss_mb())
+
+
+def _run_case(case, workdir, raw_path, opts):
+    """Runs in a fresh process: untimed setup, then the timed case."""
+    run, setup, extra = build_cases(BENCH_STAGES, opts["models"])[case]
+    with contextlib.redirect_stdout(io.StringIO()):
+        if setup is not None:
+            extra = (*extra, setup(workdir, opts, *extra))
+        rss_before = _max_rss_mb(resource.RUSAGE_SELF)
+        rss_start = _current_rss_mb()
+        children_before = _max_rss_mb(resource.RUSAGE_CHILDREN)
+        peak = [rss_start]
+        with _sample_rss(peak):
+            start = time.perf_counter()
+            info = run(workdir, raw_path, opts, *extra)
+            seconds = time.perf_counter() - start
+    peak_self = _max_rss_mb(resource.RUSAGE_SELF)
+    peak_children = _max_rss_mb(resource.RUSAGE_CHILDREN)
+    # A forked child's RSS starts with the parent's pages, so a worker pool
+    # started by run() adds its peak over the RSS run() started with
+    children_added = peak_children - rss_start if peak_children > children_before else 0.0
+    return {
+        "seconds": seconds,
+        "rss_before_mb": rss_before,
+        # Whole process, setup (data loading, model fitting) included
+        "peak_rss_mb": max(peak_self, peak_children),
+        # What run() itself added on top of the setup: the highest sampled RSS
+        # (or high-water mark growth, for spikes between samples) over the
+        # RSS it started with, or what its worker pools (CV, importance) added
+        "case_rss_mb": max(peak[0] - rss_start, peak_self - rss_before, children_added, 0.0),
+        **info,
+    }
+
+
+def run_benchmarks(rows=BENCH_ROWS, stages=BENCH_STAGES, models=BENCH_MODELS, repeat=1, seed=42, workers=1,
+                   matrix_format="auto", chunksize=None):
+    """
+    Generate (or reuse) `rows` synthetic raw rows and benchmark each case in
+    its own process, `repeat` times. Reports the fastest run's seconds and
+    the largest memory (case and whole-process peak) per case.
+    """
+    from clean_store import CLEAN_CHUNKSIZE
+    workdir = os.path.join(BENCH_DIR, "data", f"{rows}_{seed}")
+    raw_path = os.path.join(workdir, "raw.csv")
+    if not os.path.exists(raw_path):
+        start = time.perf_counter()
+        write_raw(raw_path, rows, seed)
+        print(f"Generated {rows} synthetic rows in {time.perf_counter() - start:.1f}s: {raw_path}")
+    if "clean" not in stages and not os.path.exists(_paths(workdir)["clean"]):
+        stages = ("clean", *stages)
+
+    opts = {
+        "models": list(models), "workers": workers, "matrix_format": matrix_format,
+        "chunksize": chunksize or CLEAN_CHUNKSIZE,
+        "importance_repeats": IMPORTANCE_REPEATS, "importance_bootstrap": IMPORTANCE_BOOTSTRAP,
+        "eval_bootstrap": EVAL_BOOTSTRAP,
+    }
+    # Models fitted by an earlier benchmark run (other code) must not leak in
+    if "train" in stages or "clean" in stages:
+        for name in models:
+            path = os.path.join(_paths(workdir)["models"], f"{name}.joblib")
+            if os.path.exists(path):
+                os.remove(path)
+
+    results = {}
+    for case in build_cases(stages, models):
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                runs.append(pool.submit(_run_case, case, workdir, raw_path, opts).result())
+        best = min(runs, key=lambda r: r["seconds"])
+        results[case] = {
+            **best,
+            "seconds_all": [r["seconds"] for r in runs],
+            "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+            "case_rss_mb": max(r["case_rss_mb"] for r in runs),
+        }
+        print(f"{case:<36} {best['seconds']:8.3f}s  case RSS {results[case]['case_rss_mb']:8.1f} MB  "
+              f"(process peak {results[case]['peak_rss_mb']:.1f} MB)")
+
+    return {"meta": environment_info(rows, seed, repeat, opts), "cases": results}
+
+
+def environment_info(rows, seed, repeat, opts):
+    import numpy, pandas, sklearn, imblearn
+    return {
+        "rows": rows, "seed": seed, "repeat": repeat,
+        "workers": opts["workers"], "matrix_format": opts["matrix_format"], "chunksize": opts["chunksize"],
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "packages": {m.__name__: m.__version__ for m in (numpy, pandas, sklearn, imblearn)},
+    }
+
+
+# ---------- Baseline comparison ----------
+
+def compare_results(current, baseline, tolerance=TOLERANCE):
+    """
+    One row per (case, metric) present in either run: baseline and current
+    value, ratio, and status ok / regression / improvement / new / missing.
+    """
+    for key in ("rows", "matrix_format"):
+        if current["meta"].get(key) != baseline["meta"].get(key):
+            raise ValueError(f"Runs are not comparable: {key} {baseline['meta'].get(key)} -> {current['meta'].get(key)}")
+
+    rows = []
+    for case in list(baseline["cases"]) + [c for c in current["cases"] if c not in baseline["cases"]]:
+        # Memory is compared on what the timed case adds, not on the setup
+        for metric, noise in (("seconds", NOISE_SECONDS), ("case_rss_mb", NOISE_MB)):
+            old = baseline["cases"].get(case, {}).get(metric)
+            new = current["cases"].get(case, {}).get(metric)
+            if old is None or new is None:
+                status, ratio = ("new" if old is None else "missing"), None
+            else:
+                ratio = new / old if old else None
+                if new > old * (1 + tolerance) and new - old > noise:
+                    status = "regression"
+                elif new < old / (1 + tolerance) and old - new > noise:
+                    status = "improvement"
+                else:
+                    status = "ok"
+            rows.append({"case": case, "metric": metric, "baseline": old, "current": new,
+                         "ratio": ratio, "status": status})
+    return rows
+
+
+def print_comparison(rows):
+    for r in rows:
+        fmt = lambda v: f"{v:10.3f}" if v is not None else f"{'-':>10}"
+        ratio = f"{r['ratio']:6.2f}x" if r["ratio"] is not None else f"{'':>7}"
+        flag = {"regression": "❌", "improvement": "✅"}.get(r["status"], "  ")
+        print(f"{flag} {r['case']:<36} {r['metric']:<12} {fmt(r['baseline'])} -> {fmt(r['current'])} {ratio}  {r['status']}")
+
+
+def save_json(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic survey data.")
+    parser.add_argument("--rows", type=int, default=BENCH_ROWS, help="Synthetic raw rows (e.g. 10000 to 10000000)")
+    parser.add_argument("--stages", nargs="+", choices=BENCH_STAGES, default=list(BENCH_STAGES))
+    parser.add_argument("--models", nargs="+", choices=BENCH_MODELS, default=list(BENCH_MODELS))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="Core budget for CV and importance (default: 1)")
+    parser.add_argument("--matrix-format", choices=("auto", "dense", "sparse"), default="auto")
+    parser.add_argument("--chunksize", type=int, default=None, help="Rows per chunk for cleaning and EDA")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also store the results as {BASELINE_PATH}")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, default=None, metavar="BASELINE",
+                        help=f"Compare with a stored run (default: {BASELINE_PATH}); exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Allowed relative slowdown / memory growth (default: 0.25)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.rows, args.stages, args.models, args.repeat, args.seed, args.workers,
+                             args.matrix_format, args.chunksize)
+    save_json(results, args.output)
+    print(f"\nResults saved to {args.output}")
+    if args.save_baseline:
+        save_json(results, BASELINE_PATH)
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            comparison = compare_results(results, json.load(f), args.tolerance)
+        print(f"\nAgainst {args.compare} (tolerance {args.tolerance:.0%}):")
+        print_comparison(comparison)
+        regressions = [r for r in comparison if r["status"] == "regression"]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+            sys.exit(1)
@@ -1,23 +1,15 @@
 import os
+import argparse
 import pandas as pd
 import numpy as np
-from helper import data_audit
+from audit import AuditEngine, format_audit, save_report
+from helper import data_audit, dump, is_verbose, span, traced_iter, add_instrumentation_args, start_instrumentation
+from encoding import UNKNOWN_POLICIES, build_lookup_tables, encode_columns
+from clean_store import CLEAN_DATA_PATH, ParquetCleanWriter, parquet_available
 
 # Paths
 RAW_DATA_PATH = "data/raw/survey.csv"
-CLEAN_DATA_PATH = "data/clean"
-OUTPUT_FILE = os.path.join(CLEAN_DATA_PATH, "survey.csv")
-
-# Load
-df = pd.read_csv(RAW_DATA_PATH)
-
-# Checking for missing or inconsistencies in dataset
-data_audit(df)
-
-df = df.replace(r'^\s*$', np.nan, regex=True)
-
-# Normalize Gender column: lowercase, strip whitespace
-df['Gender_cleaned'] = df['Gender'].str.lower().str.strip()
+OUTPUT_FORMATS = ("parquet", "csv", "both")
 
 # Define gender mappings
 male_labels = {
@@ -29,16 +21,10 @@ female_labels = {
     'female (cis)', 'female (trans)', 'trans-female', 'trans woman'
 }
 
-# Map values to Male/Female/Other
-def clean_gender(g):
-    if g in male_labels:
-        return 'Male'
-    elif g in female_labels:
-        return 'Female'
-    else:
-        return 'Other'
-
-df['Gender_cleaned'] = df['Gender_cleaned'].apply(clean_gender)
+gender_mapping = {
+    **{label: 'Male' for label in male_labels},
+    **{label: 'Female' for label in female_labels}
+}
 
 employee_estimates = {
     '1-5': 3,
@@ -73,53 +59,243 @@ mapping_leave = {
     "Very difficult" : 5
 }
 
-df['Employees_estimate'] = df['no_employees'].map(employee_estimates)
-df['work_interfere_cleaned'] = df['work_interfere'].map(mapping_work)
-df['leave_cleaned'] = df['leave'].map(mapping_leave)
-
 yes_no = ['self_employed', 'family_history', 'treatment', 'remote_work', 'tech_company', 'benefits', 'care_options', 'wellness_program',
           'seek_help', 'anonymity', 'mental_health_consequence', 'phys_health_consequence', 'coworkers', 'supervisor', 'mental_health_interview',
           'phys_health_interview', 'mental_vs_physical', 'obs_consequence']
 
-for col in yes_no:
-    df[col + '_cleaned'] = df[col].map(mapping_yes_no)
+# Declarative encoding spec: output column -> rule (see encoding.encode_columns).
+# Order matters: it is the column order of the clean file.
+ENCODING_SPEC = {
+    # Gender is lowercased/stripped first; anything unrecognised is 'Other'
+    'Gender_cleaned': {'source': 'Gender', 'mapping': gender_mapping, 'default': 'Other', 'normalize': True},
+    'Employees_estimate': {'source': 'no_employees', 'mapping': employee_estimates},
+    'work_interfere_cleaned': {'source': 'work_interfere', 'mapping': mapping_work},
+    'leave_cleaned': {'source': 'leave', 'mapping': mapping_leave},
+    **{col + '_cleaned': {'source': col, 'mapping': mapping_yes_no} for col in yes_no}
+}
+LOOKUP_TABLES = build_lookup_tables(ENCODING_SPEC)
+
+# Default number of raw rows held in memory at once in streaming mode
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def map_columns(df, on_unknown="default"):
+    """
+    Apply the gender / employee / work_interfere / leave / yes-no mappings,
+    adding the '_cleaned' columns to df. Works on the full file or any chunk.
+    on_unknown ('default', 'warn' or 'raise') controls unmapped raw answers.
+    """
+    with span("map_columns", rows=len(df)):
+        df = df.replace(r'^\s*$', np.nan, regex=True)
+        return encode_columns(df, ENCODING_SPEC, LOOKUP_TABLES, on_unknown=on_unknown)
+
+
+def select_clean_columns(df):
+    # Taking the clean subset of the df
+    keep_cols = ['Age', 'Country'] + list(ENCODING_SPEC)
+    df_clean = df[keep_cols].copy()
+
+    # Imputing values
+    df_clean['self_employed_cleaned'] = df_clean['self_employed_cleaned'].fillna(0)
+    df_clean['work_interfere_cleaned'] = df_clean['work_interfere_cleaned'].fillna(4)
+    return df_clean
+
+
+def filter_ages(df_clean):
+    with span("filter_ages", rows=len(df_clean)) as sp:
+        df_clean = df_clean[(df_clean['Age'] >= 18) & (df_clean['Age'] <= 100)]
+        sp.attrs["kept"] = len(df_clean)
+    return df_clean
+
+
+def clean_chunk(df, on_unknown="default"):
+    """Full cleaning of one block of raw rows (mappings, subset, age filter)."""
+    return filter_ages(select_clean_columns(map_columns(df, on_unknown)))
+
+
+def report_ages_and_countries(df_clean):
+    # Check Age distribution
+    dump("Age Summary:")
+    dump(df_clean['Age'].describe())
+    dump("\nUnique Ages (lowest 10):", sorted(df_clean['Age'].unique())[:10])
+    dump("Unique Ages (highest 10):", sorted(df_clean['Age'].unique())[-10:])
+
+    # Check for weird or extreme ages
+    weird_ages = df_clean[(df_clean['Age'] < 10) | (df_clean['Age'] > 100)]
+    dump("\nWeird ages detected:")
+    dump(weird_ages[['Age']].value_counts())
+
+    # Check Country values
+    dump("\nNumber of unique countries:", df_clean['Country'].nunique())
+    dump("Most common countries:\n", df_clean['Country'].value_counts().head(15))
+
+    # Look for messy country names (short ones, weird ones)
+    dump("\nPotentially messy country entries:")
+    dump([c for c in df_clean['Country'].unique() if len(str(c)) <= 3])
+
+
+def output_paths(output_dir=CLEAN_DATA_PATH, fmt="parquet"):
+    """(parquet_file, csv_file) for an output format; None means not written."""
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"fmt must be one of {OUTPUT_FORMATS}, got {fmt!r}")
+    if fmt != "csv" and not parquet_available():
+        print("[WARN] pyarrow is not installed; writing CSV only.")
+        fmt = "csv"
+    parquet_file = os.path.join(output_dir, "survey.parquet") if fmt in ("parquet", "both") else None
+    csv_file = os.path.join(output_dir, "survey.csv") if fmt in ("csv", "both") else None
+    return parquet_file, csv_file
+
+
+def write_audit(report, audit_path=None):
+    """Print the raw-data audit when verbose and save it as JSON when a path is given."""
+    if audit_path:
+        save_report(report, audit_path)
+        print("Audit report saved to:", audit_path)
+    dump(format_audit(report))
+
+
+def clean_single_pass(raw_path=RAW_DATA_PATH, parquet_file=None, csv_file=None, on_unknown="default",
+                      audit_path=None):
+    # Load
+    with span("read_csv", path=raw_path) as sp:
+        df = pd.read_csv(raw_path)
+        sp.count(rows=len(df))
+
+    # Checking for missing or inconsistencies in dataset
+    if is_verbose() or audit_path:
+        with span("audit", rows=len(df)):
+            write_audit(data_audit(df), audit_path)
+
+    df = map_columns(df, on_unknown)
+    dump(df.head())
+
+    df_clean = select_clean_columns(df)
+    if is_verbose():
+        report_ages_and_countries(df_clean)
+
+    df_clean = filter_ages(df_clean)
+    print("New shape after dropping valid ages: ", df_clean.shape)
+
+    # Save cleaned data
+    if parquet_file:
+        with span("write_parquet", rows=len(df_clean)), ParquetCleanWriter(parquet_file) as writer:
+            writer.write(df_clean)
+    if csv_file:
+        os.makedirs(os.path.dirname(csv_file), exist_ok=True)
+        with span("write_csv", rows=len(df_clean)):
+            df_clean.to_csv(csv_file, index=False)
+    return df_clean.shape
+
+
+# ---------- Streaming mode ----------
+
+def _merge_dtype(a, b):
+    # Same promotion pd.concat would apply to the full column
+    if a == b:
+        return a
+    if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+        return np.result_type(a, b)
+    return np.dtype(object)
+
+
+def resolve_clean_dtypes(raw_path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    First streaming pass: the dtype each output column would have had if the
+    whole file had been cleaned at once (e.g. a mapped column that has a NaN
+    in any chunk is float64 everywhere, so it prints as '3.0' not '3').
+    """
+    dtypes = None
+    for chunk in pd.read_csv(raw_path, chunksize=chunksize):
+        chunk_dtypes = select_clean_columns(map_columns(chunk)).dtypes
+        if dtypes is None:
+            dtypes = chunk_dtypes.to_dict()
+        else:
+            for col, dtype in chunk_dtypes.items():
+                dtypes[col] = _merge_dtype(dtypes[col], dtype)
+    return dtypes or {}
 
-print(df.head())
 
-# Make sure the clean folder exists
-os.makedirs(CLEAN_DATA_PATH, exist_ok=True)
+def clean_streaming(raw_path=RAW_DATA_PATH, parquet_file=None, csv_file=None,
+                    chunksize=DEFAULT_CHUNKSIZE, on_unknown="default", audit_path=None):
+    """
+    Clean raw_path in blocks of `chunksize` rows and append each block to the
+    outputs (Parquet row groups and/or CSV rows). Peak memory depends on
+    chunksize, not on the input size, and both outputs are byte-identical to
+    clean_single_pass. Parquet has a fixed schema, so only the CSV needs the
+    extra dtype-resolving pass. The raw-data audit (verbose or audit_path)
+    is accumulated from the same chunks.
+    """
+    dtypes = resolve_clean_dtypes(raw_path, chunksize) if csv_file else {}
+    audit = AuditEngine() if is_verbose() or audit_path else None
 
-# Taking the clean subset of the df
-keep_cols = ['Age', 'Country'] + list(df.columns[27:])
-df_clean = df[keep_cols].copy()
+    writer = ParquetCleanWriter(parquet_file) if parquet_file else None
+    f = None
+    if csv_file:
+        os.makedirs(os.path.dirname(csv_file), exist_ok=True)
+        f = open(csv_file, "w", newline="")
 
-# Imputing values
-df_clean['self_employed_cleaned'] = df_clean['self_employed_cleaned'].fillna(0)
-df_clean['work_interfere_cleaned'] = df_clean['work_interfere_cleaned'].fillna(4)
+    n_rows, n_cols = 0, 0
+    try:
+        for i, chunk in enumerate(traced_iter(pd.read_csv(raw_path, chunksize=chunksize), "read_csv")):
+            if audit:
+                with span("audit", chunk=i, rows=len(chunk)):
+                    audit.update(chunk)
+            chunk_clean = clean_chunk(chunk, on_unknown)
+            if writer:
+                with span("write_parquet", chunk=i, rows=len(chunk_clean)):
+                    writer.write(chunk_clean)
+            if f:
+                for col, dtype in dtypes.items():
+                    if chunk_clean[col].dtype != dtype:
+                        chunk_clean[col] = chunk_clean[col].astype(dtype)
+                with span("write_csv", chunk=i, rows=len(chunk_clean)):
+                    chunk_clean.to_csv(f, header=(i == 0), index=False)
+            n_rows += len(chunk_clean)
+            n_cols = chunk_clean.shape[1]
+    finally:
+        if writer:
+            writer.close()
+        if f:
+            f.close()
 
-# Check Age distribution
-print("Age Summary:")
-print(df_clean['Age'].describe())
-print("\nUnique Ages (lowest 10):", sorted(df_clean['Age'].unique())[:10])
-print("Unique Ages (highest 10):", sorted(df_clean['Age'].unique())[-10:])
+    if audit:
+        write_audit(audit.report(), audit_path)
+    print("New shape after dropping valid ages: ", (n_rows, n_cols))
+    return n_rows, n_cols
 
-# Check for weird or extreme ages
-weird_ages = df_clean[(df_clean['Age'] < 10) | (df_clean['Age'] > 100)]
-print("\nWeird ages detected:")
-print(weird_ages[['Age']].value_counts())
 
-# Check Country values
-print("\nNumber of unique countries:", df_clean['Country'].nunique())
-print("Most common countries:\n", df_clean['Country'].value_counts().head(15))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean the raw OSMI survey export.")
+    parser.add_argument("--input", default=RAW_DATA_PATH)
+    parser.add_argument("--output-dir", default=CLEAN_DATA_PATH)
+    parser.add_argument(
+        "--format", choices=OUTPUT_FORMATS, default="parquet",
+        help="Clean file format; the CSV is an optional export (default: parquet)"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=None,
+        help="Stream the input in blocks of this many rows (flat memory)"
+    )
+    parser.add_argument(
+        "--audit", metavar="PATH", default=None,
+        help="Save the raw-data audit (missing values, distinct counts, duplicates...) as JSON"
+    )
+    parser.add_argument(
+        "--on-unknown", choices=UNKNOWN_POLICIES, default="default",
+        help="What to do with answers missing from the mappings (default: encode as NaN / 'Other')"
+    )
+    add_instrumentation_args(parser)
+    args = parser.parse_args(argv)
 
-# Look for messy country names (short ones, weird ones)
-print("\nPotentially messy country entries:")
-print([c for c in df_clean['Country'].unique() if len(str(c)) <= 3])
+    parquet_file, csv_file = output_paths(args.output_dir, args.format)
+    with start_instrumentation(args, "clean_data"):
+        if args.chunksize:
+            clean_streaming(args.input, parquet_file, csv_file, args.chunksize, args.on_unknown, args.audit)
+        else:
+            clean_single_pass(args.input, parquet_file, csv_file, args.on_unknown, args.audit)
 
-df_clean = df_clean[(df_clean['Age'] >= 18) & (df_clean['Age'] <= 100)]
-print("New shape after dropping valid ages: ", df_clean.shape)
+    print("Cleaned data saved to:", ", ".join(p for p in (parquet_file, csv_file) if p))
 
-# Save cleaned data
-df_clean.to_csv(OUTPUT_FILE, index=False)
 
-print("Cleaned data saved to:", OUTPUT_FILE)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
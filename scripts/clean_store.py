@@ -0,0 +1,215 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Paths
+CLEAN_DATA_PATH = "data/clean"
+CLEAN_PARQUET = os.path.join(CLEAN_DATA_PATH, "survey.parquet")
+CLEAN_CSV = os.path.join(CLEAN_DATA_PATH, "survey.csv")
+
+# Schema of the clean file, in column order. Codes are small nullable ints
+# (so NaN no longer forces float64) and free-text columns are categoricals.
+CLEAN_DTYPES = {
+    'Age': 'Int16',
+    'Country': 'category',
+    'Gender_cleaned': 'category',
+    'Employees_estimate': 'Int16',
+    'work_interfere_cleaned': 'Int8',
+    'leave_cleaned': 'Int8',
+    'self_employed_cleaned': 'Int8',
+    'family_history_cleaned': 'Int8',
+    'treatment_cleaned': 'Int8',
+    'remote_work_cleaned': 'Int8',
+    'tech_company_cleaned': 'Int8',
+    'benefits_cleaned': 'Int8',
+    'care_options_cleaned': 'Int8',
+    'wellness_program_cleaned': 'Int8',
+    'seek_help_cleaned': 'Int8',
+    'anonymity_cleaned': 'Int8',
+    'mental_health_consequence_cleaned': 'Int8',
+    'phys_health_consequence_cleaned': 'Int8',
+    'coworkers_cleaned': 'Int8',
+    'supervisor_cleaned': 'Int8',
+    'mental_health_interview_cleaned': 'Int8',
+    'phys_health_interview_cleaned': 'Int8',
+    'mental_vs_physical_cleaned': 'Int8',
+    'obs_consequence_cleaned': 'Int8',
+}
+CLEAN_COLUMNS = list(CLEAN_DTYPES)
+# Rows per chunk for iter_clean
+CLEAN_CHUNKSIZE = 100_000
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def to_clean_dtypes(df):
+    """Cast the clean columns present in df to the compact schema."""
+    return df.astype({c: CLEAN_DTYPES[c] for c in df.columns if c in CLEAN_DTYPES})
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    arrow_types = {'Int8': pa.int8(), 'Int16': pa.int16(), 'category': pa.string()}
+    return pa.schema([(c, arrow_types[d]) for c, d in CLEAN_DTYPES.items()])
+
+
+class ParquetCleanWriter:
+    """
+    Appends clean chunks to one Parquet file as row groups, all with the fixed
+    CLEAN_DTYPES schema, so chunked and single-pass writes load back identically.
+    """
+
+    def __init__(self, path=CLEAN_PARQUET):
+        import pyarrow.parquet as pq
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.schema = _arrow_schema()
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, df_clean):
+        import pyarrow as pa
+
+        # Categories are stored as plain (dictionary-encoded) strings: each
+        # chunk has its own categories, the schema must not
+        df_store = to_clean_dtypes(df_clean[CLEAN_COLUMNS])
+        for col, dtype in CLEAN_DTYPES.items():
+            if dtype == 'category':
+                df_store[col] = df_store[col].astype(object)
+        table = pa.Table.from_pandas(df_store, schema=self.schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_clean_parquet(df_clean, path=CLEAN_PARQUET):
+    with ParquetCleanWriter(path) as writer:
+        writer.write(df_clean)
+
+
+def default_clean_path():
+    """The newest of survey.parquet / survey.csv in data/clean."""
+    candidates = [p for p in (CLEAN_PARQUET, CLEAN_CSV) if os.path.exists(p)]
+    if CLEAN_PARQUET in candidates and not parquet_available():
+        candidates.remove(CLEAN_PARQUET)
+    if not candidates:
+        raise FileNotFoundError(f"No clean data found in {CLEAN_DATA_PATH}; run clean_data.py first")
+    return max(candidates, key=os.path.getmtime)
+
+
+def load_clean(columns=None, path=None):
+    """
+    Load the clean survey data with the compact CLEAN_DTYPES schema.
+    Only `columns` are read (all of them if None); Parquet skips the others
+    on disk, CSV via usecols. Column order follows `columns`.
+    """
+    path = path or default_clean_path()
+    columns = list(columns) if columns is not None else None
+
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns)
+
+    df = to_clean_dtypes(df)
+    return df[columns] if columns is not None else df
+
+
+def iter_clean(columns=None, path=None, chunksize=CLEAN_CHUNKSIZE, start_row=0):
+    """
+    load_clean() in chunks of at most `chunksize` rows, for data that does
+    not fit in memory. Categoricals only carry the categories of their chunk.
+    Rows before `start_row` are skipped: Parquet row groups entirely before
+    it are never read, CSV lines before it are not parsed.
+    """
+    path = path or default_clean_path()
+    columns = list(columns) if columns is not None else None
+
+    skip = 0
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        groups, offset = [], 0
+        for i in range(pf.num_row_groups):
+            n_rows = pf.metadata.row_group(i).num_rows
+            if offset + n_rows > start_row:
+                if not groups:
+                    skip = max(0, start_row - offset)
+                groups.append(i)
+            offset += n_rows
+        batches = (
+            b.to_pandas() for b in pf.iter_batches(batch_size=chunksize, row_groups=groups, columns=columns)
+        ) if groups else iter(())
+    else:
+        batches = pd.read_csv(
+            path, usecols=columns, chunksize=chunksize, skiprows=range(1, start_row + 1) if start_row else None
+        )
+
+    for df in batches:
+        if skip:
+            # Rows of the first row group that are still before start_row
+            df, skip = df.iloc[skip:], max(0, skip - len(df))
+            if df.empty:
+                continue
+        df = to_clean_dtypes(df.reset_index(drop=True))
+        yield df[columns] if columns is not None else df
+
+
+def read_clean_rows(rows, columns=None, path=None, chunksize=CLEAN_CHUNKSIZE):
+    """
+    The clean rows at positions `rows`, in ascending order. Parquet reads only
+    the row groups holding them; CSV is streamed chunk by chunk.
+    """
+    path = path or default_clean_path()
+    columns = list(columns) if columns is not None else None
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+
+    parts = []
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        offset = 0
+        for i in range(pf.num_row_groups):
+            n_rows = pf.metadata.row_group(i).num_rows
+            lo, hi = np.searchsorted(rows, [offset, offset + n_rows])
+            if hi > lo:
+                group = pf.read_row_group(i, columns=columns).to_pandas()
+                parts.append(group.iloc[rows[lo:hi] - offset])
+            offset += n_rows
+    else:
+        offset = 0
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+            lo, hi = np.searchsorted(rows, [offset, offset + len(chunk)])
+            if hi > lo:
+                parts.append(chunk.iloc[rows[lo:hi] - offset])
+            offset += len(chunk)
+
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    df = to_clean_dtypes(df)
+    return df[columns] if columns is not None else df
+
+
+def clean_row_count(path=None):
+    """Rows in the clean data: from the Parquet footer, or by counting CSV lines."""
+    path = path or default_clean_path()
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path, "rb") as f:
+        return max(0, sum(1 for _ in f) - 1)
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import argparse
+import importlib
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Subcommand -> (module, summary). A command's module is imported only when
+# that command runs, so `cli.py --help` loads nothing beyond argparse
+COMMANDS = {
+    "fetch": ("fetch_data", "Download the raw survey (skipped when present)"),
+    "clean": ("clean_data", "Clean the raw survey export into data/clean"),
+    "train": ("model_training", "Train, evaluate and save the model zoo"),
+    "ensemble": ("ensemble", "Rebuild voting/stacking ensembles from the saved models (no refit)"),
+    "importance": ("feature_importance", "Feature importance reports for the saved models"),
+    "eda": ("EDA", "Render the EDA plots"),
+    "score": ("predict", "Score survey responses with a saved model pipeline"),
+}
+
+# ---------- Import-time budget ----------
+
+# Seconds a command module may take to import in a fresh interpreter
+IMPORT_BUDGET_SECONDS = 1.5
+# Packages no command module may load at import time: they belong in the
+# functions that use them
+HEAVY_MODULES = ("sklearn", "imblearn", "scipy", "matplotlib", "seaborn", "kagglehub")
+
+_PROBE = """
+import sys, json, time
+sys.path.insert(0, {scripts_dir!r})
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+loaded = {{name.partition(".")[0] for name in sys.modules}}
+print(json.dumps({{"seconds": seconds, "heavy": sorted(loaded & set({heavy!r}))}}))
+"""
+
+
+def measure_import(module, repeat=3):
+    """
+    Import `module` in `repeat` fresh interpreters. Returns the fastest
+    import time (seconds, interpreter startup excluded) and the heavy
+    packages the import pulled in.
+    """
+    best = None
+    for _ in range(repeat):
+        code = _PROBE.format(scripts_dir=SCRIPTS_DIR, module=module, heavy=HEAVY_MODULES)
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def check_startup(budget=IMPORT_BUDGET_SECONDS, repeat=3):
+    """Print the import time of every command module; False when one is over budget or loads a heavy package."""
+    ok = True
+    for command, (module, _) in COMMANDS.items():
+        result = measure_import(module, repeat)
+        problems = []
+        if result["seconds"] > budget:
+            problems.append(f"over the {budget:.2f}s budget")
+        if result["heavy"]:
+            problems.append(f"imports {', '.join(result['heavy'])}")
+        ok = ok and not problems
+        status = "; ".join(problems) or "ok"
+        print(f"{command:<11} {module:<19} {result['seconds']:6.3f}s  {status}")
+    return ok
+
+
+# ---------- Entry point ----------
+
+def build_parser():
+    epilog = "\n".join(f"  {name:<11} {summary}" for name, (_, summary) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="Mental health survey pipeline. Run `cli.py <command> --help` for a command's options.",
+        epilog=f"commands:\n{epilog}\n  {'startup':<11} Check every command's import time against the budget",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", choices=[*COMMANDS, "startup"])
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS,
+                        help="startup: seconds allowed per module import")
+    parser.add_argument("--repeat", type=int, default=3, help="startup: fresh interpreters per module (fastest wins)")
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in COMMANDS:
+        command, rest = argv[0], argv[1:]
+        # The command's own parser reports usage as `cli.py <command>`
+        sys.argv[0] = f"{os.path.basename(sys.argv[0])} {command}"
+        importlib.import_module(COMMANDS[command][0]).main(rest)
+        return
+
+    args = build_parser().parse_args(argv)
+    if args.command == "startup":
+        sys.exit(0 if check_startup(args.budget, args.repeat) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import contextlib
+
+# Content-addressed store of raw dataset files, shared by every workspace
+# that points MH_DATASET_STORE at the same folder:
+#   objects/ab/abcdef...   one read-only file per distinct content (sha256)
+#   manifest.json          versions: {version: {dataset, files: {name: {sha256, size}}, ...}}
+#                          latest:   {dataset: version}
+# A version id is the sha256 of its (file name, content hash) list, so the
+# same files always make the same version.
+STORE_ENV = "MH_DATASET_STORE"
+DEFAULT_STORE_DIR = os.path.join(".cache", "datasets")
+MANIFEST_NAME = "manifest.json"
+# Written next to checked-out files: which version they are, readable in O(1)
+CHECKOUT_NAME = ".dataset.json"
+
+_HASH_BLOCK = 1 << 20
+# Linux FICLONE ioctl: copy-on-write clone on btrfs / XFS (reflink)
+_FICLONE = 0x40049409
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def version_id(files):
+    """Version of a {name: {"sha256": ...}} file set: independent of where or when it was ingested."""
+    h = hashlib.sha256()
+    for name in sorted(files):
+        h.update(f"{name}\0{files[name]['sha256']}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+
+
+def link_or_copy(src, dst, hardlink=True):
+    """
+    Materialise src at dst without a full copy when the filesystem allows:
+    reflink (copy-on-write) first, then a hardlink, then a plain copy.
+    Returns the method used.
+    """
+    tmp = f"{dst}.tmp{os.getpid()}"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(tmp)
+    try:
+        _reflink(src, tmp)
+        method = "reflink"
+    except (OSError, ImportError):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        try:
+            if not hardlink:
+                raise OSError("hardlink not allowed")
+            os.link(src, tmp)
+            method = "hardlink"
+        except OSError:
+            # Different filesystem (or no link support): one real copy
+            shutil.copy2(src, tmp)
+            method = "copy"
+    os.replace(tmp, dst)
+    return method
+
+
+class DatasetStore:
+    """Content-addressed dataset versions with checkout into a working folder by link."""
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get(STORE_ENV) or DEFAULT_STORE_DIR
+        self.manifest_path = os.path.join(self.root, MANIFEST_NAME)
+
+    # ---------- Manifest ----------
+
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"versions": {}, "latest": {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Serialise manifest updates between processes sharing the store."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as lock:
+            try:
+                import fcntl
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            yield
+
+    def _save_manifest(self, manifest):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def resolve(self, dataset=None, version=None):
+        """
+        Manifest entry of `version`, or of the latest version of `dataset`
+        (None when there is none). A dictionary lookup: nothing is hashed.
+        """
+        manifest = self.manifest()
+        if version is None:
+            version = manifest["latest"].get(dataset)
+            if version is None:
+                return None
+        entry = manifest["versions"].get(version)
+        if entry is None:
+            raise KeyError(f"Unknown dataset version {version!r} in {self.root}")
+        return {"version": version, **entry}
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    def path(self, name, dataset=None, version=None):
+        """Store path of one file of a dataset version, e.g. path('survey.csv', version=...)."""
+        entry = self.resolve(dataset, version)
+        if entry is None:
+            raise KeyError(f"No version of {dataset!r} in {self.root}")
+        return self.object_path(entry["files"][name]["sha256"])
+
+    # ---------- Ingest ----------
+
+    def _add_object(self, path):
+        digest = file_sha256(path)
+        obj = self.object_path(digest)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            # Never a hardlink here: later edits to the source must not reach the store
+            link_or_copy(path, obj, hardlink=False)
+            # Checkouts may be hardlinks to this file: keep it immutable
+            os.chmod(obj, 0o444)
+        return digest
+
+    def ingest(self, source_dir, dataset, origin=None):
+        """
+        Add every file of source_dir (e.g. a kagglehub download or a
+        pre-seeded offline folder) as a new version of `dataset`, make it the
+        latest one and return its manifest entry. Contents already in the
+        store are not stored twice.
+        """
+        files = {}
+        for name in sorted(os.listdir(source_dir)):
+            path = os.path.join(source_dir, name)
+            if os.path.isfile(path) and not name.startswith("."):
+                files[name] = {"sha256": self._add_object(path), "size": os.path.getsize(path)}
+        if not files:
+            raise FileNotFoundError(f"No files to ingest in {source_dir}")
+
+        version = version_id(files)
+        with self._locked():
+            manifest = self.manifest()
+            entry = manifest["versions"].setdefault(version, {
+                "dataset": dataset, "files": files, "origin": origin or os.path.abspath(source_dir),
+                "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+            manifest["latest"][dataset] = version
+            self._save_manifest(manifest)
+        return {"version": version, **entry}
+
+    # ---------- Checkout ----------
+
+    def checkout(self, target_dir, dataset=None, version=None):
+        """
+        Make target_dir hold exactly the files of a version, linked from the
+        store (reflink or hardlink, copy only across filesystems). Files that
+        are already that version are left alone, and files of the previous
+        checkout that are not in this version are removed (other files in
+        target_dir are not touched). Returns {name: method}, with method
+        "unchanged" for files that were already in place and "removed" for
+        files of the previous checkout.
+        """
+        entry = self.resolve(dataset, version)
+        if entry is None:
+            raise KeyError(f"No version of {dataset!r} in {self.root}")
+        os.makedirs(target_dir, exist_ok=True)
+
+        previous = read_checkout(target_dir) or {}
+        previous_files = previous.get("files", {})
+        methods, placed = {}, {}
+        for name, meta in entry["files"].items():
+            dst = os.path.join(target_dir, name)
+            obj = self.object_path(meta["sha256"])
+            if _is_checked_out(dst, obj, previous_files.get(name), meta["sha256"]):
+                methods[name] = "unchanged"
+            else:
+                methods[name] = link_or_copy(obj, dst)
+            st = os.stat(dst)
+            placed[name] = {"sha256": meta["sha256"], "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        for name in previous_files:
+            if name not in entry["files"]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(target_dir, name))
+                methods[name] = "removed"
+
+        tmp = os.path.join(target_dir, CHECKOUT_NAME + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"dataset": entry["dataset"], "version": entry["version"], "store": os.path.abspath(self.root),
+                       "files": placed}, f, indent=2, sort_keys=True)
+        os.replace(tmp, os.path.join(target_dir, CHECKOUT_NAME))
+        return methods
+
+
+def _is_checked_out(dst, obj, recorded, sha256):
+    if not os.path.exists(dst):
+        return False
+    if os.path.samefile(dst, obj):
+        return True
+    # Reflinked / copied earlier and untouched since
+    st = os.stat(dst)
+    return bool(recorded) and recorded["sha256"] == sha256 \
+        and [recorded["size"], recorded["mtime_ns"]] == [st.st_size, st.st_mtime_ns]
+
+
+def read_checkout(target_dir):
+    """
+    {dataset, version, store, files} of the version checked out in
+    target_dir, or None. One small JSON read, no hashing: how downstream
+    stages learn which dataset version they are working on.
+    """
+    path = os.path.join(target_dir, CHECKOUT_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
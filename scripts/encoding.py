@@ -0,0 +1,94 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+# How to treat a non-missing raw value that is not in a rule's mapping
+UNKNOWN_POLICIES = ("default", "warn", "raise")
+
+
+def build_lookup_table(mapping):
+    """
+    Turn a {raw value: encoded value} dict into a (keys Index, values array)
+    pair. Encoding is then one hash lookup (get_indexer) plus one np.take.
+    """
+    return pd.Index(list(mapping.keys())), np.asarray(list(mapping.values()))
+
+
+def build_lookup_tables(spec):
+    """One table per distinct mapping; rules sharing a mapping share a table."""
+    tables = {}
+    for rule in spec.values():
+        key = id(rule["mapping"])
+        if key not in tables:
+            tables[key] = build_lookup_table(rule["mapping"])
+    return tables
+
+
+def _encode_block(values, table, default, on_unknown, names):
+    """
+    Encode a 2-D object block column-wise against one table. Returns one array
+    per column; like Series.map, a column only becomes float/object when it
+    actually needs the default.
+    """
+    keys, lut = table
+    idx = keys.get_indexer(values.ravel()).reshape(values.shape)
+    unmatched = idx < 0
+    if not unmatched.any():
+        return list(lut.take(idx).T)
+
+    if on_unknown != "default":
+        flat = values[unmatched]
+        unknown = pd.unique(flat[pd.notna(flat)])
+        if len(unknown):
+            msg = f"Unmapped values in {names}: {list(unknown[:10])}"
+            if on_unknown == "raise":
+                raise ValueError(msg)
+            warnings.warn(msg)
+
+    # Slot len(lut) holds the default; missing and unknown values both land there
+    out_dtype = object if lut.dtype == object else np.result_type(lut, np.asarray(default))
+    lut_ext = np.append(lut.astype(out_dtype), np.asarray(default, dtype=out_dtype))
+    idx[unmatched] = len(lut)
+    result = lut_ext.take(idx)
+    needs_default = unmatched.any(axis=0)
+    return [result[:, j] if needs_default[j] else result[:, j].astype(lut.dtype)
+            for j in range(values.shape[1])]
+
+
+def encode_columns(df, spec, tables=None, on_unknown="default"):
+    """
+    Encode every rule in `spec` ({output column: rule}) and return df with the
+    output columns appended in spec order. A rule is a dict with:
+      - 'source':    raw column name
+      - 'mapping':   {raw value: encoded value}
+      - 'default':   value for missing or unmapped raw values (default NaN)
+      - 'normalize': lowercase + strip the raw strings first (default False)
+    Rules that share a mapping are encoded together as one 2-D block.
+    on_unknown is 'default' (silently use the default), 'warn' or 'raise'.
+    """
+    if on_unknown not in UNKNOWN_POLICIES:
+        raise ValueError(f"on_unknown must be one of {UNKNOWN_POLICIES}, got {on_unknown!r}")
+    if tables is None:
+        tables = build_lookup_tables(spec)
+
+    # Group output columns by (mapping, default, normalize) so each group is one lookup
+    groups = {}
+    for out_col, rule in spec.items():
+        default = rule.get("default", np.nan)
+        group_key = (id(rule["mapping"]), repr(default), rule.get("normalize", False))
+        groups.setdefault(group_key, (rule, []))[1].append(out_col)
+
+    encoded = {}
+    for rule, out_cols in groups.values():
+        sources = [spec[c]["source"] for c in out_cols]
+        block = df[sources]
+        if rule.get("normalize", False):
+            block = block.apply(lambda s: s.astype(object).str.lower().str.strip())
+        values = block.to_numpy(dtype=object)
+        result = _encode_block(
+            values, tables[id(rule["mapping"])], rule.get("default", np.nan), on_unknown, sources
+        )
+        encoded.update(zip(out_cols, result))
+
+    encoded_df = pd.DataFrame({c: encoded[c] for c in spec}, index=df.index)
+    return pd.concat([df, encoded_df], axis=1)
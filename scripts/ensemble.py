@@ -0,0 +1,218 @@
+import os
+import time
+import argparse
+import numpy as np
+
+# Ensembles over already-fitted pipelines:
+#   soft  - weighted average of the members' predict_proba (soft voting)
+#   stack - a meta-learner on the members' out-of-fold predict_proba
+# Neither refits a member: the pipelines trained by model_training.py are used as saved
+ENSEMBLE_METHODS = ("soft", "stack")
+# Saved as <name>.joblib next to the members; voting_clf keeps its old name
+ENSEMBLE_NAMES = {"soft": "voting_clf", "stack": "stacking_clf"}
+# Out-of-fold class probabilities of every model, written during cross-validation
+OOF_FILE = "oof_proba.npz"
+
+
+# ---------- Out-of-fold probabilities ----------
+
+def collect_oof(fold_results, names, n_rows):
+    """
+    {name: (n_rows, n_classes) out-of-fold predict_proba} from the fold
+    results of run_training_grid(oof_proba=True), plus the class order.
+    Rows of a failed fold stay NaN.
+    """
+    oof, classes = {}, None
+    for name in names:
+        folds = [r for r in fold_results if r["Model"] == name and r.get("Proba") is not None]
+        if not folds:
+            continue
+        classes = folds[0]["Classes"] if classes is None else classes
+        if not np.array_equal(folds[0]["Classes"], classes):
+            raise ValueError(f"{name} was fitted on different classes: {folds[0]['Classes']} vs {classes}")
+        matrix = np.full((n_rows, len(classes)), np.nan)
+        for r in folds:
+            matrix[r["Test_idx"]] = r["Proba"]
+        oof[name] = matrix
+    return oof, classes
+
+
+def save_oof(path, oof, classes, y):
+    np.savez(path, classes=np.asarray(classes), y=np.asarray(y), **oof)
+
+
+def load_oof(path):
+    """(oof, classes, y) as saved by save_oof."""
+    with np.load(path, allow_pickle=False) as npz:
+        oof = {key: npz[key] for key in npz.files if key not in ("classes", "y")}
+        return oof, npz["classes"], npz["y"]
+
+
+# ---------- Ensemble ----------
+
+class PrefitEnsemble:
+    """
+    Soft voting or stacking over fitted classifiers (pipelines) that share
+    classes_. Only the optional meta-learner is ever fitted, on out-of-fold
+    probabilities; predict/predict_proba take the same raw frame as the
+    members, so each member applies its own preprocessing.
+
+    Saved ensembles hold no copy of their members: they are pickled as the
+    member names, weights and meta-learner, and the members are loaded from
+    <members_dir>/<name>.joblib (numpy_scorer.load_model, so an exported
+    artifact is memory-mapped) the first time they are needed. An updated
+    member is therefore picked up by the ensemble without rebuilding it.
+    """
+
+    def __init__(self, estimators, method="soft", weights=None, meta_learner=None, members_dir=None):
+        if method not in ENSEMBLE_METHODS:
+            raise ValueError(f"method must be one of {ENSEMBLE_METHODS}, got {method!r}")
+        self._estimators = list(estimators)
+        self.names = [name for name, _ in self._estimators]
+        self.method = method
+        self.weights = weights
+        self.meta_learner = meta_learner
+        self.members_dir = members_dir
+        self.classes_ = np.asarray(self._estimators[0][1].classes_)
+        self._check_classes()
+
+    def _check_classes(self):
+        for name, estimator in self._estimators:
+            if not np.array_equal(estimator.classes_, self.classes_):
+                raise ValueError(f"{name} has classes {estimator.classes_}, expected {self.classes_}")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_estimators"] = None
+        return state
+
+    def set_members_dir(self, members_dir):
+        """Load the members from members_dir (where the ensemble itself was saved)."""
+        if members_dir != self.members_dir:
+            self.members_dir = members_dir
+            self._estimators = None
+
+    @property
+    def estimators(self):
+        """[(name, fitted member)], loaded on first use for an unpickled ensemble."""
+        if self._estimators is None:
+            from numpy_scorer import load_model
+            if self.members_dir is None:
+                raise ValueError("This ensemble was saved without members_dir; set_members_dir() first")
+            self._estimators = []
+            for name in self.names:
+                path = os.path.join(self.members_dir, f"{name}.joblib")
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Ensemble member {name} is missing: no {path}")
+                self._estimators.append((name, load_model(path)))
+            self._check_classes()
+        return self._estimators
+
+    def _weights(self):
+        if self.weights is None:
+            return np.ones(len(self.names))
+        return np.array([self.weights.get(name, 1.0) for name in self.names], dtype=float)
+
+    def combine(self, probas):
+        """Ensemble probabilities from the members' (n_members, n_rows, n_classes) probabilities."""
+        probas = np.asarray(probas)
+        if self.method == "soft":
+            return np.average(probas, axis=0, weights=self._weights())
+        features = np.concatenate(list(probas), axis=1)
+        return self.meta_learner.predict_proba(features)
+
+    def fit_meta(self, oof, y):
+        """
+        Fit the stacking meta-learner on out-of-fold probabilities ({name:
+        matrix}); rows where a member's fold failed (NaN) are left out.
+        """
+        if self.method != "stack":
+            return self
+        if self.meta_learner is None:
+            from sklearn.linear_model import LogisticRegression
+            self.meta_learner = LogisticRegression(max_iter=5000, class_weight="balanced")
+        probas = np.stack([oof[name] for name in self.names])
+        complete = ~np.isnan(probas).any(axis=(0, 2))
+        features = np.concatenate(list(probas[:, complete]), axis=1)
+        self.meta_learner.fit(features, np.asarray(y)[complete])
+        self.meta_rows_ = int(complete.sum())
+        return self
+
+    def predict_proba(self, X):
+        return self.combine([estimator.predict_proba(X) for _, estimator in self.estimators])
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+
+
+def build_ensemble(fitted, method="soft", oof=None, y=None, weights=None, members_dir=None):
+    """
+    PrefitEnsemble over {name: fitted pipeline}, saved as <members_dir>/<name>.joblib.
+    Stacking needs the members' out-of-fold probabilities (`oof`) and the
+    matching training labels `y`; members without out-of-fold probabilities
+    are left out of the stack.
+    """
+    names = [name for name in fitted if method == "soft" or (oof is not None and name in oof)]
+    if len(names) < 2:
+        raise ValueError(f"A {method} ensemble needs at least two models, got {names}")
+    ensemble = PrefitEnsemble([(name, fitted[name]) for name in names], method, weights, members_dir=members_dir)
+    return ensemble.fit_meta(oof, y)
+
+
+def oof_score(ensemble, oof, y, scorer):
+    """Score of a soft-voting ensemble on the out-of-fold rows every member has (no refit, no test data)."""
+    probas = np.stack([oof[name] for name in ensemble.names])
+    complete = ~np.isnan(probas).any(axis=(0, 2))
+    y_pred = ensemble.classes_.take(ensemble.combine(probas[:, complete]).argmax(axis=1))
+    return scorer(np.asarray(y)[complete], y_pred)
+
+
+def parse_weights(pairs):
+    """['RandomForest_Balanced=2', 'LogisticRegression=1'] -> {name: weight}."""
+    weights = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        weights[name] = float(value)
+    return weights or None
+
+
+def main(argv=None):
+    import joblib
+    from model_training import MODELS_DIR, TARGETS, holdout_split, load_training_data, macro_f1, target_dir
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild an ensemble from the saved pipelines and their out-of-fold probabilities (no refit)."
+    )
+    parser.add_argument("models", nargs="*", default=["RandomForest_Balanced", "LogisticRegression", "CategoricalNB"])
+    parser.add_argument("--method", choices=ENSEMBLE_METHODS, default="soft")
+    parser.add_argument("--weights", nargs="+", metavar="MODEL=W", help="Soft-voting weights (default: equal)")
+    parser.add_argument("--target", choices=TARGETS, default=TARGETS[0])
+    args = parser.parse_args(argv)
+
+    models_dir = target_dir(args.target, MODELS_DIR)
+    oof, _, y_train = load_oof(os.path.join(models_dir, OOF_FILE))
+    fitted = {}
+    for name in args.models:
+        path = os.path.join(models_dir, f"{name}.joblib")
+        if os.path.exists(path):
+            fitted[name] = joblib.load(path)
+        else:
+            print(f"{name}: no saved pipeline at {path}, left out")
+
+    start = time.perf_counter()
+    ensemble = build_ensemble(fitted, args.method, oof, y_train, parse_weights(args.weights), models_dir)
+    seconds = time.perf_counter() - start
+
+    X, y, _ = load_training_data(args.target)
+    _, X_test, _, y_test = holdout_split(X, y)
+    score = macro_f1(y_test, ensemble.predict(X_test))
+    path = os.path.join(models_dir, f"{ENSEMBLE_NAMES[args.method]}.joblib")
+    joblib.dump(ensemble, path)
+    print(f"{args.method} ensemble of {', '.join(ensemble.names)} built in {seconds:.2f}s; "
+          f"Test F1 (macro): {score:.3f} -> {path}")
+
+
+if __name__ == "__main__":
+    # Through the module, so saved ensembles unpickle as ensemble.PrefitEnsemble, not __main__'s
+    from ensemble import main
+    main()
@@ -0,0 +1,125 @@
+import numpy as np
+
+# Bootstrap resamples of the test predictions per model, and the CI level
+# reported in model_performance_summary.csv
+N_BOOTSTRAP = 10_000
+CI_LEVEL = 0.95
+SEED = 42
+# Resamples drawn and counted per bincount call: bounds the (resamples x
+# rows) index matrix to ~BOOTSTRAP_BATCH_ELEMENTS entries whatever the test size
+BOOTSTRAP_BATCH_ELEMENTS = 1 << 22
+
+
+# ---------- Resampling ----------
+
+def encode_labels(y_true, y_pred, labels=None):
+    """(true codes, predicted codes, labels): labels sorted, codes index into them."""
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    labels = np.union1d(y_true, y_pred) if labels is None else np.asarray(labels)
+    return np.searchsorted(labels, y_true), np.searchsorted(labels, y_pred), labels
+
+
+def bootstrap_confusion(true_codes, pred_codes, n_classes, n_bootstrap=N_BOOTSTRAP, seed=SEED):
+    """
+    Confusion matrices (n_bootstrap, true, predicted) of bootstrap resamples
+    of the rows, counted with one bincount per batch of resamples: each
+    row's (true, predicted) pair becomes one cell id, offset by its resample.
+    Each batch's (resamples x rows) indices are drawn from one generator
+    seeded with `seed`, so every model evaluated with the same seed (and
+    rows) is scored on the same resamples, paired.
+    """
+    cells = (true_codes * n_classes + pred_codes).astype(np.int64)
+    n_cells = n_classes * n_classes
+    n_rows = len(cells)
+    step = max(1, BOOTSTRAP_BATCH_ELEMENTS // max(n_rows, 1))
+    rng = np.random.default_rng(seed)
+    counts = np.empty((n_bootstrap, n_cells), dtype=np.int64)
+    for start in range(0, n_bootstrap, step):
+        size = min(step, n_bootstrap - start)
+        batch = rng.integers(0, n_rows, size=(size, n_rows))
+        offsets = np.arange(size, dtype=np.int64)[:, None] * n_cells
+        counts[start:start + size] = np.bincount(
+            (cells[batch] + offsets).ravel(), minlength=size * n_cells
+        ).reshape(size, n_cells)
+    return counts.reshape(n_bootstrap, n_classes, n_classes)
+
+
+# ---------- Metrics ----------
+
+def _ratio(num, den):
+    # zero_division=0, as sklearn reports it
+    return np.divide(num, den, out=np.zeros(np.broadcast(num, den).shape), where=den > 0)
+
+
+def confusion_metrics(cm):
+    """
+    accuracy, macro_f1, precision, recall and f1 (per class, last axis) of
+    confusion matrices cm[..., true, predicted]. Like f1_score(average=
+    'macro'), the macro average skips classes absent from both the truth and
+    the predictions of that (re)sample.
+    """
+    cm = np.asarray(cm, dtype=float)
+    tp = np.diagonal(cm, axis1=-2, axis2=-1)
+    actual, predicted = cm.sum(axis=-1), cm.sum(axis=-2)
+    f1 = _ratio(2 * tp, actual + predicted)
+    present = (actual + predicted) > 0
+    return {
+        "accuracy": _ratio(tp.sum(axis=-1), cm.sum(axis=(-2, -1))),
+        "macro_f1": _ratio((f1 * present).sum(axis=-1), present.sum(axis=-1)),
+        "precision": _ratio(tp, predicted),
+        "recall": _ratio(tp, actual),
+        "f1": f1,
+    }
+
+
+def confidence_interval(samples, level=CI_LEVEL, axis=0):
+    """Percentile interval (low, high) of bootstrap samples along `axis`."""
+    tail = (1 - level) / 2 * 100
+    return np.percentile(samples, tail, axis=axis), np.percentile(samples, 100 - tail, axis=axis)
+
+
+def bootstrap_evaluate(y_true, y_pred, n_bootstrap=N_BOOTSTRAP, seed=SEED, labels=None, level=CI_LEVEL):
+    """
+    Point metrics of one model's test predictions and their distribution
+    over `n_bootstrap` resamples of the rows (bootstrap_confusion). Returns
+    {labels, confusion, point: metrics, boot: metrics per resample,
+    ci: {metric: (low, high)}, confusion_ci: (low, high)}.
+    """
+    true_codes, pred_codes, labels = encode_labels(y_true, y_pred, labels)
+    k = len(labels)
+    confusion = np.bincount(true_codes * k + pred_codes, minlength=k * k).reshape(k, k)
+    boot_cm = bootstrap_confusion(true_codes, pred_codes, k, n_bootstrap, seed)
+    boot = confusion_metrics(boot_cm)
+    return {
+        "labels": labels,
+        "confusion": confusion,
+        "point": confusion_metrics(confusion),
+        "boot": boot,
+        "ci": {metric: confidence_interval(values, level) for metric, values in boot.items()},
+        "confusion_ci": confidence_interval(boot_cm, level),
+    }
+
+
+def summary_columns(evaluation):
+    """Flat CI columns of bootstrap_evaluate's result for model_performance_summary.csv."""
+    ci = evaluation["ci"]
+    row = {
+        "Test_Accuracy_CI_low": ci["accuracy"][0], "Test_Accuracy_CI_high": ci["accuracy"][1],
+        "Test_F1_macro_CI_low": ci["macro_f1"][0], "Test_F1_macro_CI_high": ci["macro_f1"][1],
+    }
+    for metric in ("precision", "recall"):
+        for i, label in enumerate(evaluation["labels"]):
+            column = f"Test_{metric}_{label}"
+            row[column] = evaluation["point"][metric][i]
+            row[f"{column}_CI_low"] = ci[metric][0][i]
+            row[f"{column}_CI_high"] = ci[metric][1][i]
+    return row
+
+
+def paired_difference(evaluation, reference, metric="macro_f1", level=CI_LEVEL):
+    """
+    CI of (evaluation - reference) for a metric, from the two models'
+    scores on the same resamples. An interval excluding 0 means the
+    difference is not resampling noise.
+    """
+    return confidence_interval(evaluation["boot"][metric] - reference["boot"][metric], level)
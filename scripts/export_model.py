@@ -0,0 +1,289 @@
+import os
+import argparse
+import joblib
+import numpy as np
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import CategoricalNB
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder
+from helper import densify
+from model_training import MODELS_DIR, TARGETS, load_training_data, target_dir
+from numpy_scorer import ARTIFACT_EXT, ARTIFACT_VERSION, NumpyScorer, save_arrays
+
+EXPORTED_MODELS = ["LogisticRegression", "CategoricalNB", "RandomForest_Balanced"]
+# Max |predict_proba difference| accepted by the parity check
+PARITY_TOL = 1e-9
+
+
+# ---------- Preprocessor ----------
+
+def _is_passthrough(transformer):
+    if isinstance(transformer, str):
+        return transformer == "passthrough"
+    # Newer sklearn stores remainder='passthrough' as an identity FunctionTransformer
+    return isinstance(transformer, FunctionTransformer) and transformer.func is None
+
+
+def _column_names(ct, columns):
+    columns = list(columns) if not isinstance(columns, str) else [columns]
+    if columns and isinstance(columns[0], (int, np.integer)):
+        return [str(ct.feature_names_in_[i]) for i in columns]
+    return [str(c) for c in columns]
+
+
+def flatten_preprocessor(ct):
+    """
+    Input columns of a fitted ColumnTransformer, in output order, with the
+    output column(s) each one feeds:
+      onehot:  categories and, per category, its output column (-1 = dropped)
+      numeric: its single passthrough output column
+    Returns (features, n_output_columns).
+    """
+    if not isinstance(ct, ColumnTransformer):
+        raise ValueError(f"Expected a ColumnTransformer preprocessor, got {type(ct).__name__}")
+
+    features, offset = [], 0
+    for _, transformer, columns in ct.transformers_:
+        if isinstance(transformer, str) and transformer == "drop":
+            continue
+        names = _column_names(ct, columns)
+        if _is_passthrough(transformer):
+            for name in names:
+                features.append({"name": name, "type": "numeric", "out": offset})
+                offset += 1
+        elif isinstance(transformer, OneHotEncoder):
+            if getattr(transformer, "_infrequent_enabled", False):
+                raise ValueError("OneHotEncoder with infrequent categories is not supported")
+            drop_idx = transformer.drop_idx_
+            for j, name in enumerate(names):
+                categories = np.asarray(transformer.categories_[j])
+                drop = None if drop_idx is None else drop_idx[j]
+                out = []
+                for k in range(len(categories)):
+                    if drop is not None and k == drop:
+                        out.append(-1)
+                    else:
+                        out.append(offset)
+                        offset += 1
+                features.append({
+                    "name": name, "type": "onehot", "categories": categories, "out": np.array(out),
+                    "handle_unknown": "error" if transformer.handle_unknown == "error" else "ignore",
+                })
+        else:
+            raise ValueError(f"Unsupported transformer {type(transformer).__name__} for {names}")
+    return features, offset
+
+
+# ---------- Models ----------
+
+def _linear_params(model):
+    """(W, b) with one row per class, so predict_proba = softmax(x @ W.T + b)."""
+    coef, intercept = model.coef_, model.intercept_
+    if coef.shape[0] == 1:
+        # Binary: sigmoid(z) == softmax([0, z])
+        return np.vstack([np.zeros_like(coef), coef]), np.array([0.0, intercept[0]])
+    multi_class = getattr(model, "multi_class", "auto")
+    if multi_class == "ovr" or (multi_class == "auto" and model.solver == "liblinear"):
+        raise ValueError("One-vs-rest LogisticRegression is not supported, only multinomial")
+    return coef, intercept
+
+
+def _linear_tables(features, model):
+    W, bias = _linear_params(model)
+    for feature in features:
+        if feature["type"] == "onehot":
+            out = feature["out"]
+            kept = np.flatnonzero(out >= 0)
+            # Last row: the unknown category, encoded as all zeros
+            table = np.zeros((len(out) + 1, W.shape[0]))
+            table[kept] = W[:, out[kept]].T
+            feature["table"] = table
+        else:
+            feature["type"] = "linear"
+            feature["weights"] = W[:, feature["out"]].copy()
+    return bias
+
+
+def _naive_bayes_tables(features, model):
+    log_prob = model.feature_log_prob_
+    for feature in features:
+        if feature["type"] == "onehot":
+            out = feature["out"]
+            # Row for "all zeros" (dropped or unknown category), then swap in
+            # the one column that is 1 for each kept category. A column that
+            # was never 1 in training has no log-prob for 1: NaN, as sklearn
+            # would fail on it too.
+            base = sum(log_prob[c][:, 0] for c in out if c >= 0)
+            table = np.tile(base, (len(out) + 1, 1))
+            for k, c in enumerate(out):
+                if c >= 0:
+                    one = log_prob[c][:, 1] if log_prob[c].shape[1] > 1 else np.nan
+                    table[k] = base - log_prob[c][:, 0] + one
+            feature["table"] = table
+        else:
+            # A passthrough column is itself a category index for CategoricalNB
+            feature["type"] = "index"
+            feature["table"] = log_prob[feature["out"]].T.copy()
+    return model.class_log_prior_.copy()
+
+
+def _forest_arrays(model, n_out):
+    """
+    Every tree of a fitted RandomForestClassifier as one concatenated node
+    table: global child ids (-1 at leaves), split feature and threshold, and
+    each node's class probabilities normalised the way predict_proba does.
+    """
+    if model.n_outputs_ != 1:
+        raise ValueError("Only single-output forests are supported")
+    if model.n_features_in_ != n_out:
+        raise ValueError("RandomForestClassifier does not match the preprocessor output")
+    roots, left, right, feature, threshold, proba = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        roots.append(offset)
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        # Leaves have feature -2; any valid column keeps the lookups in range
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        value = tree.value[:, 0, :model.n_classes_].astype(float)
+        normalizer = value.sum(axis=1)[:, None]
+        normalizer[normalizer == 0.0] = 1.0
+        proba.append(value / normalizer)
+        offset += tree.node_count
+    return {
+        "tree.roots": np.array(roots, dtype=np.intp),
+        "tree.left": np.concatenate(left).astype(np.int32),
+        "tree.right": np.concatenate(right).astype(np.int32),
+        "tree.feature": np.concatenate(feature).astype(np.int32),
+        "tree.threshold": np.concatenate(threshold).astype(np.float64),
+        "tree.proba": np.concatenate(proba),
+    }
+
+
+# ---------- Export ----------
+
+def export_pipeline(pipeline, path):
+    """
+    Flatten a fitted preprocessor + LogisticRegression / CategoricalNB /
+    RandomForestClassifier pipeline into a NumPy-only, memory-mappable
+    artifact for NumpyScorer. Samplers (SMOTE) and the densify step do
+    nothing at predict time and are skipped.
+    """
+    preprocessor, model = None, None
+    for name, step in pipeline.steps:
+        if hasattr(step, "fit_resample"):
+            continue
+        if isinstance(step, FunctionTransformer) and step.func in (None, densify):
+            continue
+        if isinstance(step, ColumnTransformer) and preprocessor is None and model is None:
+            preprocessor = step
+        elif model is None:
+            model = step
+        else:
+            raise ValueError(f"Unsupported pipeline step {name!r} ({type(step).__name__})")
+
+    features, n_out = flatten_preprocessor(preprocessor)
+    model_arrays, bias = {}, None
+    if isinstance(model, LogisticRegression):
+        bias = _linear_tables(features, model)
+    elif isinstance(model, CategoricalNB):
+        if len(model.feature_log_prob_) != n_out:
+            raise ValueError("CategoricalNB does not match the preprocessor output")
+        bias = _naive_bayes_tables(features, model)
+    elif isinstance(model, RandomForestClassifier):
+        # The trees split on the design matrix itself: keep each column's output position
+        model_arrays = _forest_arrays(model, n_out)
+    else:
+        raise ValueError(
+            f"Cannot export {type(model).__name__}; supported: LogisticRegression, CategoricalNB, RandomForestClassifier"
+        )
+
+    classes = np.asarray(model.classes_)
+    if classes.dtype == object:
+        classes = classes.astype(str)
+    meta = {
+        "version": ARTIFACT_VERSION,
+        "model": type(model).__name__,
+        "columns": [str(c) for c in preprocessor.feature_names_in_],
+        "n_outputs": n_out,
+        "features": [
+            {k: v for k, v in f.items() if k in ("name", "type", "handle_unknown")} for f in features
+        ],
+    }
+    arrays = {"classes": classes, **model_arrays}
+    if bias is not None:
+        arrays["bias"] = bias
+    forest = isinstance(model, RandomForestClassifier)
+    for i, feature in enumerate(features):
+        for key in ("categories", "table", "weights", "out"):
+            if key in feature and (key != "out" or forest):
+                values = np.asarray(feature[key])
+                arrays[f"{i}.{key}"] = values.astype(str) if values.dtype == object else values
+        if "categories" in feature:
+            # The scorer binary-searches the categories
+            order = np.argsort(arrays[f"{i}.categories"], kind="stable")
+            arrays[f"{i}.categories"] = arrays[f"{i}.categories"][order]
+            if forest:
+                arrays[f"{i}.out"] = arrays[f"{i}.out"][order]
+            else:
+                arrays[f"{i}.table"] = np.vstack([feature["table"][order], feature["table"][-1:]])
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    save_arrays(path, meta, arrays)
+    return meta
+
+
+def check_parity(pipeline, scorer, X):
+    """Compare NumpyScorer against the original pipeline on X."""
+    expected = pipeline.predict_proba(X)
+    actual = scorer.predict_proba(X)
+    return {
+        "rows": len(X),
+        "max_abs_proba_diff": float(np.abs(expected - actual).max()),
+        "prediction_agreement": float(np.mean(pipeline.predict(X) == scorer.predict(X))),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=f"Export saved pipelines to NumPy-only, memory-mapped {ARTIFACT_EXT} scoring artifacts."
+    )
+    parser.add_argument("models", nargs="*", default=EXPORTED_MODELS, help=f"Default: {' '.join(EXPORTED_MODELS)}")
+    parser.add_argument("--target", choices=TARGETS, default=TARGETS[0])
+    parser.add_argument("--models-dir", help=f"Default: the target's folder under {MODELS_DIR}")
+    parser.add_argument("--check", action="store_true", help="Check parity with the pipeline on the clean data")
+    args = parser.parse_args()
+    models_dir = args.models_dir or target_dir(args.target, MODELS_DIR)
+
+    X = load_training_data(args.target)[0] if args.check else None
+    failed = []
+    for name in args.models:
+        pipeline_path = os.path.join(models_dir, f"{name}.joblib")
+        if not os.path.exists(pipeline_path):
+            print(f"{name}: no saved pipeline at {pipeline_path}, skipped")
+            continue
+        pipeline = joblib.load(pipeline_path)
+        path = os.path.join(models_dir, f"{name}{ARTIFACT_EXT}")
+        export_pipeline(pipeline, path)
+
+        scorer = NumpyScorer(path)
+        print(f"✅ {name} -> {path} ({os.path.getsize(path) / 1024:.1f} KB, "
+              f"loads in {scorer.load_seconds * 1000:.1f} ms)")
+
+        if args.check:
+            parity = check_parity(pipeline, scorer, X)
+            print(f"   parity on {parity['rows']} rows: max |Δproba| {parity['max_abs_proba_diff']:.2e}, "
+                  f"predictions agree {parity['prediction_agreement']:.2%}")
+            if parity["max_abs_proba_diff"] > PARITY_TOL or parity["prediction_agreement"] < 1:
+                failed.append(name)
+            memory = scorer.memory()
+            if "rss_mb" in memory:
+                print(f"   resident after scoring: {memory['rss_mb']:.2f} of {memory['artifact_mb']:.2f} MB mapped, "
+                      f"{memory['shared_mb']:.2f} MB of it shared with other processes")
+
+    if failed:
+        raise SystemExit(f"Parity check failed for: {', '.join(failed)}")
@@ -1,157 +1,366 @@
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import joblib
 import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from helper import build_pretty_name_mapping
+from helper import build_pretty_name_mapping, dump, span, add_instrumentation_args, start_instrumentation
+from model_training import TARGETS, load_training_data, holdout_split, target_dir
+from numpy_scorer import load_model
 
 # Paths
 model_path = "models"
 save_folder = "visuals/feature_importance"
-os.makedirs(save_folder, exist_ok=True)
+
+# Saved pipelines scored by permutation importance (missing ones are skipped)
+PERMUTATION_MODELS = ["RandomForest_Balanced", "LogisticRegression", "CategoricalNB", "voting_clf", "stacking_clf"]
+N_REPEATS = 10
+N_BOOTSTRAP = 1000
+SEED = 42
+
 
 # =========================
-# RANDOM FOREST FEATURE IMPORTANCE
+# PERMUTATION IMPORTANCE (all models, held-out data)
 # =========================
-rf_pipeline = joblib.load(os.path.join(model_path, "RandomForest_Balanced.joblib"))
-rf_model = rf_pipeline.named_steps['model']
-preprocessor_rf = rf_pipeline.named_steps['preprocessor']
-
-rf_features = preprocessor_rf.get_feature_names_out()
-rf_importances = rf_model.feature_importances_
-
-# Indices of features sorted by importance (descending)
-rf_indices = np.argsort(rf_importances)[::-1]
-
-# Pretty name mapping
-pretty_map_rf = build_pretty_name_mapping(preprocessor_rf)
-
-# ---- TOP 15 ----
-rf_top15_features = rf_features[rf_indices[:15]]
-rf_top15_importances = rf_importances[rf_indices[:15]]
-
-rf_top15 = pd.DataFrame({
-    "Feature": rf_top15_features,
-    "Pretty": [pretty_map_rf.get(f, f) for f in rf_top15_features],
-    "Importance": rf_top15_importances
-}).sort_values(by="Importance", ascending=False)
-
-print("\n=== Random Forest Feature Importance (Top 15) ===")
-print(rf_top15[["Pretty", "Importance"]].to_string(index=False))
-
-plt.figure(figsize=(10, 6))
-plt.barh(rf_top15["Pretty"], rf_top15["Importance"])
-plt.gca().invert_yaxis()
-plt.title("Top 15 Feature Importances (Random Forest)")
-plt.xlabel("Importance")
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "RF_15_features_pretty.png"))
-plt.close()
-
-# ---- BOTTOM 15 (least important) ----
-rf_bottom15_features = rf_features[rf_indices[-15:]]
-rf_bottom15_importances = rf_importances[rf_indices[-15:]]
-
-rf_bottom15 = pd.DataFrame({
-    "Feature": rf_bottom15_features,
-    "Pretty": [pretty_map_rf.get(f, f) for f in rf_bottom15_features],
-    "Importance": rf_bottom15_importances
-}).sort_values(by="Importance", ascending=True)
-
-print("\n=== Random Forest Least Important Features (Bottom 15) ===")
-print(rf_bottom15[["Pretty", "Importance"]].to_string(index=False))
-
-plt.figure(figsize=(10, 6))
-plt.barh(rf_bottom15["Pretty"], rf_bottom15["Importance"])
-plt.title("Least 15 Important Features (Random Forest)")
-plt.xlabel("Importance (lower → less predictive power)")
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "RF_least15_features_pretty.png"))
-plt.close()
-
-# ---- Combined RF summary (Top + Bottom) ----
-rf_top15_labeled = rf_top15.copy()
-rf_top15_labeled["Group"] = "Top"
-
-rf_bottom15_labeled = rf_bottom15.copy()
-rf_bottom15_labeled["Group"] = "Bottom"
-
-rf_summary = pd.concat([rf_top15_labeled, rf_bottom15_labeled], ignore_index=True)
-
-# Save all tables to CSV
-rf_top15.to_csv(os.path.join(save_folder, "rf_top15_importances.csv"), index=False)
-rf_bottom15.to_csv(os.path.join(save_folder, "rf_bottom15_importances.csv"), index=False)
-rf_summary.to_csv(os.path.join(save_folder, "rf_top_bottom_summary.csv"), index=False)
-
-print("\n=== Random Forest Summary (Top + Bottom 15) ===")
-print(rf_summary[["Group", "Pretty", "Importance"]].to_string(index=False))
+
+def f1_macro_weighted(y_true, y_pred, weights, labels):
+    """
+    Macro F1 of one prediction vector under many row weightings at once:
+    weights is (n_weightings, n_rows), e.g. bootstrap resample counts.
+    Returns one score per weighting. Like f1_score(average='macro',
+    zero_division=0) on the resampled rows (and evaluation.confusion_metrics),
+    a label is averaged only in the weightings where it occurs in y_true or
+    y_pred.
+    """
+    total, present = np.zeros(len(weights)), np.zeros(len(weights))
+    for label in labels:
+        true, pred = y_true == label, y_pred == label
+        tp = weights @ (true & pred)
+        fp = weights @ (~true & pred)
+        fn = weights @ (true & ~pred)
+        denom = 2 * tp + fp + fn
+        total += np.divide(2 * tp, denom, out=np.zeros(len(weights)), where=denom > 0)
+        present += denom > 0
+    return np.divide(total, present, out=np.zeros(len(weights)), where=present > 0)
+
+
+def bootstrap_weights(n_rows, n_bootstrap, seed=SEED):
+    """Resample counts per row: one multinomial draw (a bootstrap sample) per row of the result."""
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(n_rows, np.full(n_rows, 1 / n_rows), size=n_bootstrap).astype(float)
+
+
+# Worker-process state, set once per worker by _init_worker
+_WORKER = {}
+
+
+def _init_worker(model_paths, X, y, weights, n_repeats, seed):
+    _WORKER.update(
+        # Exported artifacts are memory-mapped: workers share one copy of the forest
+        models={name: load_model(path) for name, path in model_paths.items()},
+        X=X, y=np.asarray(y), weights=weights, n_repeats=n_repeats, seed=seed
+    )
+
+
+def _permutation_task(name, col_idx, baseline_boot):
+    """
+    Importance of one input column for one model: n_repeats permutations of
+    the column scored with a single predict call on the stacked copies.
+    """
+    model, X, y, weights = _WORKER["models"][name], _WORKER["X"], _WORKER["y"], _WORKER["weights"]
+    n, n_repeats = len(X), _WORKER["n_repeats"]
+    col = X.columns[col_idx]
+    labels = model.classes_
+
+    rng = np.random.default_rng([_WORKER["seed"], col_idx])
+    perms = rng.permuted(np.tile(np.arange(n), (n_repeats, 1)), axis=1)
+    stacked = X.iloc[np.tile(np.arange(n), n_repeats)].reset_index(drop=True)
+    # .array.take keeps the column's (categorical) dtype
+    stacked[col] = X[col].array.take(perms.ravel())
+    with span("permutation_predict", model=name, feature=col, rows=len(stacked)):
+        y_pred = np.asarray(model.predict(stacked)).reshape(n_repeats, n)
+
+    ones = np.ones((1, n))
+    permuted_full = np.array([f1_macro_weighted(y, p, ones, labels)[0] for p in y_pred])
+    permuted_boot = np.mean([f1_macro_weighted(y, p, weights, labels) for p in y_pred], axis=0)
+    return {
+        "Model": name,
+        "Feature": col,
+        "Drops": baseline_boot[0] - permuted_full,
+        "Boot": baseline_boot[1] - permuted_boot,
+    }
+
+
+def permutation_importance(model_paths, X, y, n_repeats=N_REPEATS, n_bootstrap=N_BOOTSTRAP, workers=None, seed=SEED):
+    """
+    Permutation importance of every input column for every pipeline in
+    model_paths on held-out (X, y), scored by macro F1. Input columns are
+    permuted as a whole, so all one-hot columns of a question move together
+    and any model taking the raw frame (e.g. voting_clf) works unchanged.
+
+    The (model, column) tasks run on a process pool that loads the models
+    and data once per worker. The 95% CI bootstraps the held-out rows:
+    baseline and permuted predictions are rescored on the same resamples.
+    Returns one DataFrame per model with Importance (mean F1 drop over the
+    repeats), Importance_std, CI_low and CI_high.
+    """
+    weights = bootstrap_weights(len(X), n_bootstrap, seed)
+    y_arr = np.asarray(y)
+
+    baselines = {}
+    for name, path in model_paths.items():
+        model = load_model(path)
+        y_pred = np.asarray(model.predict(X))
+        baselines[name] = (
+            f1_macro_weighted(y_arr, y_pred, np.ones((1, len(X))), model.classes_)[0],
+            f1_macro_weighted(y_arr, y_pred, weights, model.classes_),
+        )
+
+    tasks = [(name, j) for name in model_paths for j in range(X.shape[1])]
+    initargs = (model_paths, X, y, weights, n_repeats, seed)
+    if (workers or os.cpu_count() or 1) <= 1:
+        _init_worker(*initargs)
+        results = [_permutation_task(name, j, baselines[name]) for name, j in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            futures = [pool.submit(_permutation_task, name, j, baselines[name]) for name, j in tasks]
+            results = [f.result() for f in futures]
+
+    tables = {}
+    for name in model_paths:
+        rows = [r for r in results if r["Model"] == name]
+        tables[name] = pd.DataFrame({
+            "Feature": [r["Feature"] for r in rows],
+            "Pretty": [r["Feature"].removesuffix("_cleaned") for r in rows],
+            "Importance": [r["Drops"].mean() for r in rows],
+            "Importance_std": [r["Drops"].std() for r in rows],
+            "CI_low": [np.percentile(r["Boot"], 2.5) for r in rows],
+            "CI_high": [np.percentile(r["Boot"], 97.5) for r in rows],
+        }).sort_values(by="Importance", ascending=False)
+    return tables
+
+
+def permutation_report(n_repeats=N_REPEATS, n_bootstrap=N_BOOTSTRAP, workers=None, target=TARGETS[0],
+                       models_dir=model_path, out_dir=save_folder):
+    import matplotlib.pyplot as plt
+    model_paths = {
+        name: os.path.join(models_dir, f"{name}.joblib") for name in PERMUTATION_MODELS
+        if os.path.exists(os.path.join(models_dir, f"{name}.joblib"))
+    }
+    if not model_paths:
+        print("\n[WARN] No saved models for permutation importance; run model_training.py first")
+        return
+
+    X, y, _ = load_training_data(target)
+    _, X_test, _, y_test = holdout_split(X, y)
+    tables = permutation_importance(model_paths, X_test, y_test, n_repeats, n_bootstrap, workers)
+
+    for name, table in tables.items():
+        dump(f"\n=== Permutation Importance: {name} (macro F1 drop, Top 15) ===")
+        dump(table[["Pretty", "Importance", "CI_low", "CI_high"]].head(15).to_string(index=False))
+        table.to_csv(os.path.join(out_dir, f"{name}_permutation_importances.csv"), index=False)
+
+        top15 = table.head(15)
+        with span("render_plot", plot=f"{name}_permutation_15_features.png"):
+            plt.figure(figsize=(10, 6))
+            plt.barh(
+                top15["Pretty"], top15["Importance"],
+                xerr=[top15["Importance"] - top15["CI_low"], top15["CI_high"] - top15["Importance"]]
+            )
+            plt.gca().invert_yaxis()
+            plt.title(f"Top 15 Permutation Importances ({name})")
+            plt.xlabel("Drop in macro F1 when permuted (95% bootstrap CI)")
+            plt.tight_layout()
+            plt.savefig(os.path.join(out_dir, f"{name}_permutation_15_features.png"))
+            plt.close()
+
+    summary = pd.concat([t.assign(Model=name) for name, t in tables.items()], ignore_index=True)
+    summary = summary[["Model"] + [c for c in summary.columns if c != "Model"]]
+    summary.to_csv(os.path.join(out_dir, "permutation_importance_summary.csv"), index=False)
+    print(f"Permutation importances of {', '.join(tables)} saved to {out_dir}")
+
 
 # =========================
-# LOGISTIC REGRESSION FEATURE IMPORTANCE
-# (your LR Yes + No code goes here, unchanged)
+# RANDOM FOREST FEATURE IMPORTANCE
 # =========================
 
-lr_pipeline = joblib.load(os.path.join(model_path, "LogisticRegression.joblib"))
-lr_model = lr_pipeline.named_steps['model']
-preprocessor_lr = lr_pipeline.named_steps['preprocessor']
+def rf_importance_report(rf_pipeline, out_dir=save_folder):
+    import matplotlib.pyplot as plt
+    rf_model = rf_pipeline.named_steps['model']
+    preprocessor_rf = rf_pipeline.named_steps['preprocessor']
+
+    rf_features = preprocessor_rf.get_feature_names_out()
+    rf_importances = rf_model.feature_importances_
+
+    # Indices of features sorted by importance (descending)
+    rf_indices = np.argsort(rf_importances)[::-1]
+
+    # Pretty name mapping
+    pretty_map_rf = build_pretty_name_mapping(preprocessor_rf)
+
+    # ---- TOP 15 ----
+    rf_top15_features = rf_features[rf_indices[:15]]
+    rf_top15_importances = rf_importances[rf_indices[:15]]
+
+    rf_top15 = pd.DataFrame({
+        "Feature": rf_top15_features,
+        "Pretty": [pretty_map_rf.get(f, f) for f in rf_top15_features],
+        "Importance": rf_top15_importances
+    }).sort_values(by="Importance", ascending=False)
+
+    dump("\n=== Random Forest Feature Importance (Top 15) ===")
+    dump(rf_top15[["Pretty", "Importance"]].to_string(index=False))
+
+    plt.figure(figsize=(10, 6))
+    plt.barh(rf_top15["Pretty"], rf_top15["Importance"])
+    plt.gca().invert_yaxis()
+    plt.title("Top 15 Feature Importances (Random Forest)")
+    plt.xlabel("Importance")
+    plt.tight_layout()
+    plt.savefig(os.path.join(out_dir, "RF_15_features_pretty.png"))
+    plt.close()
+
+    # ---- BOTTOM 15 (least important) ----
+    rf_bottom15_features = rf_features[rf_indices[-15:]]
+    rf_bottom15_importances = rf_importances[rf_indices[-15:]]
 
-lr_features = preprocessor_lr.get_feature_names_out()
-pretty_map_lr = build_pretty_name_mapping(preprocessor_lr)
+    rf_bottom15 = pd.DataFrame({
+        "Feature": rf_bottom15_features,
+        "Pretty": [pretty_map_rf.get(f, f) for f in rf_bottom15_features],
+        "Importance": rf_bottom15_importances
+    }).sort_values(by="Importance", ascending=True)
 
-classes = lr_model.classes_
+    dump("\n=== Random Forest Least Important Features (Bottom 15) ===")
+    dump(rf_bottom15[["Pretty", "Importance"]].to_string(index=False))
 
-# ---- Class 1 = "Yes" ----
-yes_class = 1
-yes_idx = list(classes).index(yes_class)
-coeffs_yes = lr_model.coef_[yes_idx]
+    plt.figure(figsize=(10, 6))
+    plt.barh(rf_bottom15["Pretty"], rf_bottom15["Importance"])
+    plt.title("Least 15 Important Features (Random Forest)")
+    plt.xlabel("Importance (lower → less predictive power)")
+    plt.tight_layout()
+    plt.savefig(os.path.join(out_dir, "RF_least15_features_pretty.png"))
+    plt.close()
+
+    # ---- Combined RF summary (Top + Bottom) ----
+    rf_top15_labeled = rf_top15.copy()
+    rf_top15_labeled["Group"] = "Top"
 
-lr_yes_importances = pd.DataFrame({
-    "Feature": lr_features,
-    "Pretty": [pretty_map_lr.get(f, f) for f in lr_features],
-    "Coefficient": coeffs_yes,
-    "Abs_Coefficient": np.abs(coeffs_yes)
-}).sort_values(by="Abs_Coefficient", ascending=False).head(15)
+    rf_bottom15_labeled = rf_bottom15.copy()
+    rf_bottom15_labeled["Group"] = "Bottom"
 
-print("\n=== Logistic Regression Coefficients (Class = Yes, Top 15) ===")
-print(lr_yes_importances[["Pretty", "Coefficient"]].to_string(index=False))
+    rf_summary = pd.concat([rf_top15_labeled, rf_bottom15_labeled], ignore_index=True)
 
-lr_yes_importances.to_csv(os.path.join(save_folder, "lr_yes_top15_coeffs.csv"), index=False)
+    # Save all tables to CSV
+    rf_top15.to_csv(os.path.join(out_dir, "rf_top15_importances.csv"), index=False)
+    rf_bottom15.to_csv(os.path.join(out_dir, "rf_bottom15_importances.csv"), index=False)
+    rf_summary.to_csv(os.path.join(out_dir, "rf_top_bottom_summary.csv"), index=False)
 
-plt.figure(figsize=(10, 6))
-plt.barh(lr_yes_importances["Pretty"], lr_yes_importances["Coefficient"])
-plt.gca().invert_yaxis()
-plt.title("Top 15 Influential Features (Logistic Regression — Yes)")
-plt.xlabel("Coefficient (positive → more likely to seek help)")
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "LR_15_features_yes_pretty.png"))
-plt.close()
+    dump("\n=== Random Forest Summary (Top + Bottom 15) ===")
+    dump(rf_summary[["Group", "Pretty", "Importance"]].to_string(index=False))
 
-# ---- Class 0 = "No" ----
-if 0 in classes:
-    no_class = 0
-    no_idx = list(classes).index(no_class)
-    coeffs_no = lr_model.coef_[no_idx]
 
-    lr_no_importances = pd.DataFrame({
+# =========================
+# LOGISTIC REGRESSION FEATURE IMPORTANCE
+# (your LR Yes + No code goes here, unchanged)
+# =========================
+
+def lr_coefficient_report(lr_pipeline, out_dir=save_folder):
+    import matplotlib.pyplot as plt
+    lr_model = lr_pipeline.named_steps['model']
+    preprocessor_lr = lr_pipeline.named_steps['preprocessor']
+
+    lr_features = preprocessor_lr.get_feature_names_out()
+    pretty_map_lr = build_pretty_name_mapping(preprocessor_lr)
+
+    classes = lr_model.classes_
+    coef = lr_model.coef_
+    if coef.shape[0] == 1:
+        # Binary target (e.g. treatment): one row, for classes[1]; classes[0] gets its negation
+        coef = np.vstack([-coef[0], coef[0]])
+
+    # ---- Class 1 = "Yes" ----
+    yes_class = 1
+    yes_idx = list(classes).index(yes_class)
+    coeffs_yes = coef[yes_idx]
+
+    lr_yes_importances = pd.DataFrame({
         "Feature": lr_features,
         "Pretty": [pretty_map_lr.get(f, f) for f in lr_features],
-        "Coefficient": coeffs_no,
-        "Abs_Coefficient": np.abs(coeffs_no)
+        "Coefficient": coeffs_yes,
+        "Abs_Coefficient": np.abs(coeffs_yes)
     }).sort_values(by="Abs_Coefficient", ascending=False).head(15)
 
-    print("\n=== Logistic Regression Coefficients (Class = No, Top 15) ===")
-    print(lr_no_importances[["Pretty", "Coefficient"]].to_string(index=False))
+    dump("\n=== Logistic Regression Coefficients (Class = Yes, Top 15) ===")
+    dump(lr_yes_importances[["Pretty", "Coefficient"]].to_string(index=False))
 
-    lr_no_importances.to_csv(os.path.join(save_folder, "lr_no_top15_coeffs.csv"), index=False)
+    lr_yes_importances.to_csv(os.path.join(out_dir, "lr_yes_top15_coeffs.csv"), index=False)
 
     plt.figure(figsize=(10, 6))
-    plt.barh(lr_no_importances["Pretty"], lr_no_importances["Coefficient"])
+    plt.barh(lr_yes_importances["Pretty"], lr_yes_importances["Coefficient"])
     plt.gca().invert_yaxis()
-    plt.title("Top 15 Influential Features (Logistic Regression — No)")
-    plt.xlabel("Coefficient (positive → more likely to predict 'No')")
+    plt.title("Top 15 Influential Features (Logistic Regression — Yes)")
+    plt.xlabel("Coefficient (positive → more likely to seek help)")
     plt.tight_layout()
-    plt.savefig(os.path.join(save_folder, "LR_15_features_no_pretty.png"))
+    plt.savefig(os.path.join(out_dir, "LR_15_features_yes_pretty.png"))
     plt.close()
-else:
-    print("\n[WARN] Class 0 ('No') not found in Logistic Regression classes:", classes)
\ No newline at end of file
+
+    # ---- Class 0 = "No" ----
+    if 0 in classes:
+        no_class = 0
+        no_idx = list(classes).index(no_class)
+        coeffs_no = coef[no_idx]
+
+        lr_no_importances = pd.DataFrame({
+            "Feature": lr_features,
+            "Pretty": [pretty_map_lr.get(f, f) for f in lr_features],
+            "Coefficient": coeffs_no,
+            "Abs_Coefficient": np.abs(coeffs_no)
+        }).sort_values(by="Abs_Coefficient", ascending=False).head(15)
+
+        dump("\n=== Logistic Regression Coefficients (Class = No, Top 15) ===")
+        dump(lr_no_importances[["Pretty", "Coefficient"]].to_string(index=False))
+
+        lr_no_importances.to_csv(os.path.join(out_dir, "lr_no_top15_coeffs.csv"), index=False)
+
+        plt.figure(figsize=(10, 6))
+        plt.barh(lr_no_importances["Pretty"], lr_no_importances["Coefficient"])
+        plt.gca().invert_yaxis()
+        plt.title("Top 15 Influential Features (Logistic Regression — No)")
+        plt.xlabel("Coefficient (positive → more likely to predict 'No')")
+        plt.tight_layout()
+        plt.savefig(os.path.join(out_dir, "LR_15_features_no_pretty.png"))
+        plt.close()
+    else:
+        print("\n[WARN] Class 0 ('No') not found in Logistic Regression classes:", classes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Feature importance reports for the saved models.")
+    parser.add_argument("--repeats", type=int, default=N_REPEATS, help="Permutations per feature")
+    parser.add_argument("--bootstrap", type=int, default=N_BOOTSTRAP, help="Bootstrap resamples for the CIs")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: all cores)")
+    parser.add_argument("--target", choices=TARGETS, default=TARGETS[0],
+                        help="Whose models to explain: models/ and visuals/feature_importance/ for the default "
+                             "target, a <target> subfolder of each otherwise")
+    add_instrumentation_args(parser)
+    args = parser.parse_args(argv)
+
+    models_dir = target_dir(args.target, model_path)
+    out_dir = target_dir(args.target, save_folder)
+    os.makedirs(out_dir, exist_ok=True)
+
+    with start_instrumentation(args, "feature_importance"):
+        rf_file = os.path.join(models_dir, "RandomForest_Balanced.joblib")
+        if os.path.exists(rf_file):
+            rf_importance_report(joblib.load(rf_file), out_dir)
+        else:
+            print(f"\n[WARN] {rf_file} not found; skipping Random Forest impurity importances")
+
+        lr_file = os.path.join(models_dir, "LogisticRegression.joblib")
+        lr_coefficient_report(joblib.load(lr_file), out_dir)
+
+        permutation_report(args.repeats, args.bootstrap, args.workers, args.target, models_dir, out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,96 @@
-import kagglehub
-import shutil
 import os
+import argparse
+from dataset_store import STORE_ENV, DatasetStore, read_checkout
 
-# Define target directory (where you want files copied)
-target_path = "/Users/ashutoshdubal/PythonProjects/Predicting Mental Health Risk Using Lifestyle Survey Data/data/raw"
+DATASET = "osmi/mental-health-in-tech-survey"
+# Where the stages read the raw export (data/raw/survey.csv)
+target_path = os.path.join("data", "raw")
+# Folder with the dataset files to use instead of downloading (offline /
+# pre-seeded cache); --source-dir overrides it
+SOURCE_ENV = "MH_DATASET_SOURCE"
 
-# Check if target already has files (you can adjust to check for specific file if needed)
-if os.path.exists(target_path) and os.listdir(target_path):
-    print("Dataset already exists in target location. Skipping download and copy.")
-else:
-    print("Dataset not found locally. Downloading...")
 
-    # Download using kagglehub (saves to default cache)
-    source_path = kagglehub.dataset_download("osmi/mental-health-in-tech-survey")
+def download():
+    """Download with kagglehub (into its own cache) and return the folder holding the files."""
+    # Only needed for an actual download
+    import kagglehub
+    return kagglehub.dataset_download(DATASET)
 
-    # Make sure target folder exists
-    os.makedirs(target_path, exist_ok=True)
 
-    # Copy files from source to target
-    for file_name in os.listdir(source_path):
-        src_file = os.path.join(source_path, file_name)
-        dst_file = os.path.join(target_path, file_name)
+def _has_files(folder):
+    return os.path.isdir(folder) and any(
+        not name.startswith(".") and os.path.isfile(os.path.join(folder, name)) for name in os.listdir(folder)
+    )
 
-        if os.path.isfile(src_file):
-            shutil.copy2(src_file, dst_file)
 
-    print("Files copied to:", target_path)
\ No newline at end of file
+def fetch(target_path=target_path, source_dir=None, version=None, refresh=False, store=None):
+    """
+    Put a version of the dataset in target_path, linked from the
+    content-addressed store:
+      - `version`: that stored version, no download
+      - `source_dir`: ingest that folder as a (possibly new) version first
+      - otherwise the latest stored version; when the store has none yet,
+        the files already in target_path are ingested as the first one, and
+        only an empty target_path (or `refresh`) downloads
+    Returns the manifest entry of the checked-out version.
+    """
+    store = store or DatasetStore()
+    source_dir = source_dir or os.environ.get(SOURCE_ENV)
+
+    if version is not None:
+        entry = store.resolve(version=version)
+    elif source_dir:
+        print(f"Ingesting {source_dir} into the dataset store ({store.root})...")
+        entry = store.ingest(source_dir, DATASET)
+    else:
+        entry = None if refresh else store.resolve(DATASET)
+        if entry is None and not refresh and _has_files(target_path):
+            # e.g. a fresh clone with data/raw/survey.csv already present:
+            # those files become the first stored version, no download
+            print(f"Dataset not found in the store. Ingesting the files already in {target_path}...")
+            entry = store.ingest(target_path, DATASET)
+        elif entry is None:
+            print("Dataset not found in the store. Downloading...")
+            entry = store.ingest(download(), DATASET, origin=f"kaggle:{DATASET}")
+
+    current = read_checkout(target_path)
+    methods = store.checkout(target_path, version=entry["version"])
+    if current and current["version"] == entry["version"] and set(methods.values()) == {"unchanged"}:
+        print(f"Dataset version {entry['version']} already in {target_path}. Nothing to do.")
+    else:
+        linked = ", ".join(f"{name} ({method})" for name, method in sorted(methods.items()))
+        print(f"Dataset version {entry['version']} checked out to {target_path}: {linked}")
+    return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fetch the OSMI survey into data/raw through the local content-addressed dataset store."
+    )
+    parser.add_argument("--target", default=target_path, help="Folder the raw files are checked out to")
+    parser.add_argument(
+        "--source-dir", default=None,
+        help=f"Ingest the files of this folder instead of downloading (offline; default: ${SOURCE_ENV})"
+    )
+    parser.add_argument("--version", default=None, help="Check out this stored version (see --list)")
+    parser.add_argument("--refresh", action="store_true", help="Download again even if the store has a version")
+    parser.add_argument(
+        "--store", default=None,
+        help=f"Dataset store folder, shareable between workspaces (default: ${STORE_ENV} or .cache/datasets)"
+    )
+    parser.add_argument("--list", action="store_true", help="List the stored versions and exit")
+    args = parser.parse_args(argv)
+
+    store = DatasetStore(args.store)
+    if args.list:
+        manifest = store.manifest()
+        for version, entry in sorted(manifest["versions"].items(), key=lambda kv: kv[1]["ingested_at"]):
+            latest = " (latest)" if manifest["latest"].get(entry["dataset"]) == version else ""
+            files = ", ".join(f"{name} {meta['size']} B" for name, meta in sorted(entry["files"].items()))
+            print(f"{version}  {entry['ingested_at']}  {entry['origin']}  {files}{latest}")
+        return
+    fetch(args.target, args.source_dir, args.version, args.refresh, store)
+
+
+if __name__ == "__main__":
+    main()
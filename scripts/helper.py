@@ -1,22 +1,43 @@
-from sklearn.pipeline import Pipeline
+import os
+import sys
+import json
+import math
+import time
+import cProfile
+import itertools
+import threading
+import contextlib
 
-def data_audit(df):
-    print("\nData Shape:", df.shape)
-    print("\nMissing Values:")
-    print(df.isnull().sum())
+# Heavy dependencies (scipy, sklearn, the audit engine) are imported inside
+# the helpers that need them: every stage script imports this module, and
+# `--help` or a dry run should not pay for them
 
-    print("\nNumeric Summary:")
-    print(df.describe())
+def data_audit(df, sample_fraction=None):
+    """
+    Structured data-quality report of df: missing values, numeric summary,
+    approximate distinct counts, value counts and duplicate rows (see
+    audit.AuditEngine; audit.format_audit renders it as text).
+    """
+    from audit import audit_frame
+    return audit_frame(df, sample_fraction)
 
-    print("\nDuplicates:", df.duplicated().sum())
+def densify(X):
+    """Sparse -> dense ndarray (for estimators that do not accept CSR input)."""
+    from scipy import sparse
+    return X.toarray() if sparse.issparse(X) else X
 
-    for col in df.select_dtypes(include='object'):
-        print(f"\nUnique values in {col}:", df[col].dropna().unique())
+def matrix_nbytes(X):
+    """Memory held by a dense array or a CSR/CSC matrix (data + indices + indptr)."""
+    from scipy import sparse
+    if sparse.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
 
 def extract_estimator_with_attr(model, attr_name):
     if hasattr(model, attr_name):
         return model
-    if isinstance(model, Pipeline):
+    # Any (sklearn or imblearn) Pipeline
+    if hasattr(model, "named_steps"):
         for _, step in model.named_steps.items():
             if hasattr(step, attr_name):
                 return step
@@ -50,4 +71,247 @@ def build_pretty_name_mapping(preprocessor):
             orig = name.split("__", 1)[1]
             mapping[name] = orig
 
-    return mapping
\ No newline at end of file
+    return mapping
+
+# ---------- Instrumentation ----------
+# Spans time a stage or sub-step and record its rows, throughput and memory.
+# Tracing is off unless a trace file is set (--trace on the stage scripts,
+# or the MH_TRACE environment variable); worker processes and pipeline.py
+# stages inherit it and append to the same file, one event per line:
+#   chrome - Trace Event Format (chrome://tracing, ui.perfetto.dev)
+#   jsonl  - one JSON object per finished span
+TRACE_ENV = "MH_TRACE"
+TRACE_FORMAT_ENV = "MH_TRACE_FORMAT"
+TRACE_FORMATS = ("chrome", "jsonl")
+# Diagnostic console dumps (head(), value lists, full reports) are off by default
+VERBOSE_ENV = "MH_VERBOSE"
+# RSS sampling period while spans are open
+MEMORY_SAMPLE_SECONDS = 0.05
+
+_TRACE = {"pid": None}
+
+
+def is_verbose():
+    return os.environ.get(VERBOSE_ENV, "") not in ("", "0")
+
+
+def dump(*args, **kwargs):
+    """print() for diagnostic dumps: silent unless verbose (--verbose / MH_VERBOSE=1)."""
+    if is_verbose():
+        print(*args, **kwargs)
+
+
+def rss_mb():
+    """Resident memory of this process in MB (None where it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak rather than current, but the best available off Linux
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1e6 if sys.platform == "darwin" else rss * 1024 / 1e6
+    except ImportError:
+        return None
+
+
+def configure_tracing(path, fmt=None):
+    """Start a new trace file for this run; processes started from here on append to it."""
+    fmt = fmt or ("jsonl" if path.endswith(".jsonl") else "chrome")
+    if fmt not in TRACE_FORMATS:
+        raise ValueError(f"trace format must be one of {TRACE_FORMATS}, got {fmt!r}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    open(path, "w").close()
+    os.environ[TRACE_ENV] = path
+    os.environ[TRACE_FORMAT_ENV] = fmt
+    _TRACE["pid"] = None
+
+
+def _json_safe(value):
+    # NaN/inf are not JSON; trace viewers reject them
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _write_event(tracer, event):
+    # One os.write per line on an O_APPEND descriptor: lines from concurrent
+    # processes never interleave, and nothing sits in a buffer across fork()
+    line = json.dumps(_json_safe(event), default=str) + (",\n" if tracer["format"] == "chrome" else "\n")
+    os.write(tracer["fd"], line.encode())
+
+
+def _sample_memory(tracer):
+    while True:
+        time.sleep(MEMORY_SAMPLE_SECONDS)
+        rss = rss_mb()
+        if rss is None:
+            return
+        with tracer["lock"]:
+            for sp in tracer["open"]:
+                sp.rss_peak = max(sp.rss_peak, rss)
+            active = bool(tracer["open"])
+        if active and tracer["format"] == "chrome":
+            _write_event(tracer, {"name": "rss_mb", "ph": "C", "ts": time.time_ns() // 1000,
+                                  "pid": os.getpid(), "args": {"rss_mb": round(rss, 1)}})
+
+
+def _tracer():
+    """This process's trace state, (re)opened lazily so forked and spawned workers join the trace."""
+    if _TRACE["pid"] == os.getpid():
+        return _TRACE
+    path = os.environ.get(TRACE_ENV)
+    _TRACE.clear()
+    _TRACE.update(pid=os.getpid(), fd=None, open=[], lock=threading.Lock(), local=threading.local())
+    if not path:
+        return _TRACE
+
+    fmt = os.environ.get(TRACE_FORMAT_ENV) or ("jsonl" if path.endswith(".jsonl") else "chrome")
+    _TRACE.update(format=fmt, script=os.path.basename(sys.argv[0]) or "python",
+                  fd=os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644))
+    if fmt == "chrome":
+        if os.fstat(_TRACE["fd"]).st_size == 0:
+            # The closing bracket is optional in the JSON array trace format
+            os.write(_TRACE["fd"], b"[\n")
+        _write_event(_TRACE, {"name": "process_name", "ph": "M", "pid": os.getpid(),
+                              "args": {"name": f"{_TRACE['script']} ({os.getpid()})"}})
+    if rss_mb() is not None:
+        threading.Thread(target=_sample_memory, args=(_TRACE,), daemon=True).start()
+    return _TRACE
+
+
+class Span:
+    """One timed block; count() adds to its counters (rows, bytes, ...)."""
+
+    def __init__(self, name, attrs, active=True):
+        self.name = name
+        self.attrs = attrs
+        self.active = active
+        self.counters = {}
+
+    def count(self, **counters):
+        if self.active:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+        return self
+
+
+@contextlib.contextmanager
+def span(name, rows=None, **attrs):
+    """
+    Time the block as span `name` with attrs as its arguments, e.g.
+        with span("read_csv", path=path) as sp:
+            df = pd.read_csv(path)
+            sp.count(rows=len(df))
+    (or span(..., rows=n) when the row count is known up front). Records
+    wall time, counters and counter/s, and RSS at start, end and peak
+    (sampled). A no-op when tracing is off.
+    """
+    tracer = _tracer()
+    if tracer["fd"] is None:
+        yield Span(name, attrs, active=False)
+        return
+
+    sp = Span(name, attrs)
+    if rows is not None:
+        sp.count(rows=rows)
+    stack = tracer["local"].__dict__.setdefault("stack", [])
+    parent = stack[-1].name if stack else None
+    sp.rss_start = sp.rss_peak = rss_mb() or 0.0
+    with tracer["lock"]:
+        tracer["open"].append(sp)
+    stack.append(sp)
+    ts, start = time.time_ns() // 1000, time.perf_counter()
+    error = None
+    try:
+        yield sp
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        with tracer["lock"]:
+            tracer["open"].remove(sp)
+        rss_end = rss_mb() or 0.0
+        args = {
+            **sp.attrs, **sp.counters,
+            **{f"{k}_per_s": v / seconds for k, v in sp.counters.items() if seconds > 0},
+            "rss_start_mb": round(sp.rss_start, 1), "rss_end_mb": round(rss_end, 1),
+            "rss_peak_mb": round(max(sp.rss_peak, rss_end), 1),
+        }
+        if error:
+            args["error"] = error
+        if tracer["format"] == "chrome":
+            event = {"name": name, "cat": tracer["script"], "ph": "X", "ts": ts,
+                     "dur": round(seconds * 1e6), "pid": tracer["pid"], "tid": threading.get_native_id(),
+                     "args": args}
+        else:
+            event = {"name": name, "script": tracer["script"], "pid": tracer["pid"],
+                     "tid": threading.get_native_id(), "parent": parent, "start": ts / 1e6,
+                     "seconds": seconds, **args}
+        _write_event(tracer, event)
+
+
+def traced_iter(iterable, name, **attrs):
+    """Yield from iterable, timing each next() as a span that counts len(item) rows (chunked reads)."""
+    iterator = iter(iterable)
+    for i in itertools.count():
+        with span(name, chunk=i, **attrs) as sp:
+            item = next(iterator, None)
+            if item is not None:
+                sp.count(rows=len(item))
+        if item is None:
+            return
+        yield item
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """
+    cProfile the block into `path` (pstats format, e.g. for snakeviz) when
+    path is set; otherwise a no-op. Spans install no tracing hooks, so a
+    sampling profiler such as py-spy (py-spy record -- python scripts/...)
+    can be pointed at an unprofiled run instead.
+    """
+    if not path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+        print(f"Profile saved to {path}")
+
+
+def add_instrumentation_args(parser):
+    """--trace, --profile and --verbose for a stage script's argument parser."""
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--trace", metavar="PATH",
+                       help="Write timing/memory spans to PATH: Chrome trace, or JSON lines if it ends in .jsonl")
+    group.add_argument("--profile", metavar="PATH", help="cProfile the run into PATH (pstats)")
+    group.add_argument("-v", "--verbose", action="store_true", help="Print the diagnostic dumps")
+    return parser
+
+
+def start_instrumentation(args, stage):
+    """
+    Apply add_instrumentation_args options. Returns a context manager for
+    the script's main block: profiled (if asked) and traced as span `stage`.
+    """
+    if args.verbose:
+        os.environ[VERBOSE_ENV] = "1"
+    if args.trace:
+        configure_tracing(args.trace)
+    stack = contextlib.ExitStack()
+    stack.enter_context(profiled(args.profile))
+    stack.enter_context(span(stage))
+    return stack
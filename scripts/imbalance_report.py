@@ -0,0 +1,96 @@
+import os
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import f1_score
+from helper import matrix_nbytes
+from model_training import (
+    CV_FOLDS, MATRIX_FORMATS, MODELS_DIR,
+    load_training_data, holdout_split, build_preprocessor, build_models, build_pipelines, summarize_folds
+)
+from orchestrator import FOLD_CACHE_DIR, run_training_grid
+from samplers import IMBALANCE_MODES, build_sampler
+
+IMBALANCE_REPORT_PATH = os.path.join(MODELS_DIR, "imbalance_comparison.csv")
+
+
+def measure_resampling(mode, Xt, y):
+    """Time, peak traced memory and output size of one sampler on the encoded training set."""
+    sampler = build_sampler(mode)
+    if sampler is None:
+        return {"Resample_seconds": 0.0, "Resample_peak_MB": 0.0,
+                "Resampled_rows": Xt.shape[0], "Resampled_MB": matrix_nbytes(Xt) / 1e6}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    X_res, _ = sampler.fit_resample(Xt, y)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"Resample_seconds": seconds, "Resample_peak_MB": peak / 1e6,
+            "Resampled_rows": X_res.shape[0], "Resampled_MB": matrix_nbytes(X_res) / 1e6}
+
+
+def compare_imbalance_modes(modes=IMBALANCE_MODES, matrix_format="auto", n_workers=None, fold_cache=FOLD_CACHE_DIR):
+    """
+    Train every model under every imbalance mode and report, per (mode,
+    model), the resampling cost on the full training set (time, peak memory,
+    rows and MB handed to the model) next to CV and test macro F1, with the
+    F1 change relative to SMOTE.
+    """
+    X, y, categorical_cols = load_training_data()
+    X_train, X_test, y_train, y_test = holdout_split(X, y)
+    Xt = clone(build_preprocessor(categorical_cols, matrix_format)).fit_transform(X_train)
+
+    rows = []
+    for mode in modes:
+        cost = measure_resampling(mode, Xt, y_train)
+        print(f"\n⚖️  {mode}: resampled to {cost['Resampled_rows']} rows in {cost['Resample_seconds']:.2f}s, "
+              f"peak {cost['Resample_peak_MB']:.1f} MB")
+
+        pipelines = build_pipelines(
+            build_preprocessor(categorical_cols, matrix_format), build_models(), matrix_format, mode
+        )
+        fold_results, fitted = run_training_grid(
+            pipelines, X_train, y_train, cv=CV_FOLDS, scoring='f1_macro', n_workers=n_workers,
+            cache_dir=fold_cache
+        )
+        for name in pipelines:
+            clf, fit_seconds = fitted[name]
+            cv_row = summarize_folds(fold_results, name)
+            test_f1 = f1_score(y_test, clf.predict(X_test), average="macro")
+            print(f"{name}: CV F1 {cv_row['CV_F1_mean']:.3f}, test F1 {test_f1:.3f}")
+            rows.append({
+                "Mode": mode, "Model": name, **cost,
+                "Fit_seconds": fit_seconds,
+                "CV_F1_mean": cv_row["CV_F1_mean"],
+                "Test_F1_macro": test_f1,
+            })
+
+    report = pd.DataFrame(rows)
+    if "smote" in modes:
+        smote_f1 = report[report["Mode"] == "smote"].set_index("Model")["Test_F1_macro"]
+        report["Test_F1_vs_smote"] = report["Test_F1_macro"] - report["Model"].map(smote_f1)
+    else:
+        report["Test_F1_vs_smote"] = np.nan
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare imbalance-handling modes: cost vs macro F1.")
+    parser.add_argument("modes", nargs="*", default=list(IMBALANCE_MODES),
+                        help=f"Default: {' '.join(IMBALANCE_MODES)}")
+    parser.add_argument("--matrix-format", choices=MATRIX_FORMATS, default="auto")
+    parser.add_argument("--workers", type=int, default=None, help="Core budget (default: all cores)")
+    args = parser.parse_args()
+    unknown = set(args.modes) - set(IMBALANCE_MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    report = compare_imbalance_modes(args.modes, args.matrix_format, args.workers)
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    report.to_csv(IMBALANCE_REPORT_PATH, index=False)
+    print(f"\n{report.to_string(index=False)}\n\nSaved to {IMBALANCE_REPORT_PATH}")
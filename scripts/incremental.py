@@ -0,0 +1,315 @@
+import os
+import time
+import shutil
+import argparse
+import warnings
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import f1_score
+from sklearn.naive_bayes import CategoricalNB
+from clean_store import (
+    CLEAN_COLUMNS, CLEAN_CHUNKSIZE, clean_row_count, default_clean_path, iter_clean, read_clean_rows
+)
+from ensemble import ENSEMBLE_NAMES
+from model_training import (
+    MODELS_DIR, TARGETS, VERSIONS_DIR, drop_cols, prepare_features, save_core_model, load_training_state,
+    save_training_state, target_dir
+)
+from numpy_scorer import ARTIFACT_EXT
+from orchestrator import split_pipeline
+
+# Pipelines updated in place of a full retrain
+INCREMENTAL_MODELS = ["RandomForest_Balanced", "LogisticRegression", "CategoricalNB"]
+# Every saved version, per model: <models dir>/versions/<name>/v0000.joblib
+# is the full retrain the updates started from (VERSIONS_DIR, reset by each retrain)
+# LogisticRegression has no partial_fit: each update refits it, warm-started
+# from the current weights, on the batch plus a uniform sample of up to this
+# many earlier rows (replay), so the batch cannot pull it away from them
+LR_REPLAY_ROWS = 20_000
+REPLAY_SEED = 42
+# RandomForest updates add trees trained on the batch only; by default as
+# many as keep the trees per row seen constant. The forest grows up to this
+# many trees (or stays at its size if it is already larger); after that the
+# new trees replace the oldest ones, so the forest keeps a fixed size and
+# gradually follows the recent data
+RF_MAX_TREES = 400
+
+
+def read_new_rows(rows_seen, chunksize=CLEAN_CHUNKSIZE):
+    """
+    Clean rows after the first `rows_seen`, read chunk by chunk; Parquet row
+    groups that only hold rows already trained on are not read at all.
+    """
+    path = default_clean_path()
+    n_rows = clean_row_count(path)
+    if n_rows < rows_seen:
+        raise ValueError(
+            f"The clean data has {n_rows} rows but {rows_seen} were already trained on; "
+            f"it was rebuilt, run model_training.py for a full retrain"
+        )
+    columns = [c for c in CLEAN_COLUMNS if c not in drop_cols]
+    new = list(iter_clean(columns=columns, path=path, chunksize=chunksize, start_row=rows_seen))
+    return pd.concat(new, ignore_index=True) if new else None
+
+
+def read_replay_rows(rows_seen, n_rows=LR_REPLAY_ROWS, seed=REPLAY_SEED):
+    """A uniform sample of up to n_rows of the first `rows_seen` clean rows (all of them when fewer)."""
+    if rows_seen <= n_rows:
+        rows = np.arange(rows_seen)
+    else:
+        rows = np.random.default_rng([seed, rows_seen]).choice(rows_seen, size=n_rows, replace=False)
+    return read_clean_rows(rows, columns=[c for c in CLEAN_COLUMNS if c not in drop_cols])
+
+
+def transform_batch(pipeline, X, y):
+    """
+    The new batch as the final estimator sees it: the fitted preprocessor is
+    applied as is (categories unseen so far are ignored by the one-hot
+    encoder) and the sampler resamples the batch when it has enough rows.
+    """
+    prefix, _ = split_pipeline(pipeline)
+    Xt, yt = X, y
+    for name, step in prefix:
+        if hasattr(step, "fit_resample"):
+            try:
+                Xt, yt = clone(step).fit_resample(Xt, yt)
+            except ValueError as e:
+                warnings.warn(f"Batch not resampled by {name!r} ({e}); using it as is")
+        else:
+            Xt = step.transform(Xt)
+    return Xt, yt
+
+
+def update_model(model, Xt, yt, new_trees, max_trees=RF_MAX_TREES):
+    """Update a fitted estimator in place with one transformed batch; returns what changed."""
+    if isinstance(model, CategoricalNB):
+        # Category counts simply accumulate
+        model.partial_fit(Xt, yt)
+        return "partial_fit"
+
+    if isinstance(model, RandomForestClassifier):
+        if set(np.unique(yt)) != set(model.classes_):
+            # Trees trained on fewer classes could not be averaged with the rest
+            return "skipped: batch lacks some classes"
+        n_estimators = model.n_estimators
+        max_trees = max(max_trees, n_estimators)
+        new_trees = min(new_trees, max_trees)
+        model.set_params(warm_start=True, n_estimators=n_estimators + new_trees)
+        with warnings.catch_warnings():
+            # 'balanced' weights come from the batch alone, which is what we
+            # want for trees that only see the batch
+            warnings.filterwarnings("ignore", message="class_weight presets", category=UserWarning)
+            model.fit(Xt, yt)
+        model.set_params(warm_start=False)
+        # estimators_ is in training order: drop the oldest trees over the cap
+        replaced = len(model.estimators_) - max_trees
+        if replaced > 0:
+            del model.estimators_[:replaced]
+            model.set_params(n_estimators=max_trees)
+            return f"+{new_trees} trees replacing the {replaced} oldest ({n_estimators} -> {model.n_estimators})"
+        return f"+{new_trees} trees ({n_estimators} -> {model.n_estimators})"
+
+    if isinstance(model, LogisticRegression):
+        # Xt holds the replayed earlier rows and the batch (update_models):
+        # a full fit to convergence, started from the current weights
+        model.set_params(warm_start=True)
+        model.fit(Xt, yt)
+        model.set_params(warm_start=False)
+        return f"warm-started refit on {len(yt)} rows (batch + replay)"
+
+    raise ValueError(f"No incremental update for {type(model).__name__}")
+
+
+def version_path(name, version, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, os.path.basename(VERSIONS_DIR), name, f"v{version:04d}.joblib")
+
+
+def save_version(name, clf, version, models_dir=MODELS_DIR):
+    """Save clf as version `version` of `name` and make it the current model."""
+    path = version_path(name, version, models_dir)
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists; versions are never overwritten")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    current = os.path.join(models_dir, f"{name}.joblib")
+    if not os.path.exists(version_path(name, 0, models_dir)) and os.path.exists(current):
+        # The first saved update of a history keeps the full retrain it grows
+        # from (a retrain archives the previous history, v0000 included)
+        shutil.copy2(current, version_path(name, 0, models_dir))
+
+    joblib.dump(clf, path)
+    joblib.dump(clf, current)
+    save_core_model(name, clf, models_dir)
+    return path
+
+
+def refresh_derived(updated, models_dir=MODELS_DIR):
+    """
+    Bring what is derived from the updated models up to date: their .mmap
+    exports are re-exported (load_model would otherwise fall back to the
+    slower pipeline), and ensembles are checked. Saved ensembles load their
+    members by name, so soft voting uses the updated models as they are;
+    a stacking meta-learner was fitted on the retrained members' out-of-fold
+    probabilities, so it is reported as stale until the next full retrain.
+    Returns the names of the stale ensembles.
+    """
+    from export_model import export_pipeline
+
+    for name, clf in updated.items():
+        artifact = os.path.join(models_dir, f"{name}{ARTIFACT_EXT}")
+        if os.path.exists(artifact):
+            export_pipeline(clf, artifact)
+            print(f"✅ Re-exported {artifact}")
+
+    stale = []
+    path = os.path.join(models_dir, f"{ENSEMBLE_NAMES['stack']}.joblib")
+    if os.path.exists(path):
+        members = getattr(joblib.load(path), "names", [])
+        if any(name in updated for name in members):
+            stale.append(ENSEMBLE_NAMES["stack"])
+            warnings.warn(
+                f"{path} stacks {', '.join(members)} with a meta-learner fitted before this update; "
+                f"run model_training.py to refit it"
+            )
+    return stale
+
+
+def model_rows_seen(state, name):
+    """
+    Clean rows `name` has been trained on. A model can lag behind
+    state["rows_seen"] (every row read so far) when it skipped an update:
+    those rows are then part of its next batch.
+    """
+    return state.get("model_rows_seen", {}).get(name, state["rows_seen"])
+
+
+def update_models(model_names=INCREMENTAL_MODELS, trees_per_1k_rows=None, chunksize=CLEAN_CHUNKSIZE,
+                  max_trees=RF_MAX_TREES, target=TARGETS[0], models_dir=None):
+    """
+    Update the saved pipelines with the clean rows added since they were
+    last trained (full retrain or update), and save them as a new version.
+    Each batch is first scored with the current models (prequential F1),
+    then used for the update. A model whose update is skipped (a forest
+    batch lacking some classes) keeps those rows for its next batch.
+    Models are read from (and saved to) `target`'s folder under MODELS_DIR
+    unless `models_dir` is given. Returns the version record, or None when
+    there are no new rows.
+    """
+    models_dir = models_dir or target_dir(target)
+    state = load_training_state(models_dir)
+    if state is None:
+        raise FileNotFoundError("No training state; run model_training.py for a full training first")
+
+    paths = {}
+    for name in model_names:
+        path = os.path.join(models_dir, f"{name}.joblib")
+        if os.path.exists(path):
+            paths[name] = path
+        else:
+            print(f"[WARN] {path} not found; skipping")
+    seen = {name: model_rows_seen(state, name) for name in paths}
+    start_row = min(seen.values(), default=state["rows_seen"])
+
+    df_new = read_new_rows(start_row, chunksize)
+    n_rows = start_row + (0 if df_new is None else len(df_new))
+    if n_rows == state["rows_seen"]:
+        print(f"No new rows since the last training ({state['rows_seen']} rows seen)")
+        return None
+    X_all, y_all, _ = prepare_features(df_new, target)
+    version = len(state["versions"]) + 1
+    print(f"Updating with {n_rows - state['rows_seen']} new rows "
+          f"(rows {state['rows_seen']}-{n_rows - 1}) -> version {version}")
+
+    # Earlier rows replayed into the logistic update, read only when needed
+    df_replay = None
+
+    record = {
+        "version": version,
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "rows": [state["rows_seen"], n_rows],
+        "models": {},
+    }
+    # Models left out of this update keep their own position too
+    updated = {}
+    model_seen = {name: model_rows_seen(state, name) for name in dict.fromkeys(INCREMENTAL_MODELS + list(paths))}
+    for name, path in paths.items():
+        # This model's batch: every row after the last one it was trained on
+        offset = seen[name] - start_row
+        X, y = X_all.iloc[offset:], y_all.iloc[offset:]
+        if X.empty:
+            continue
+        clf = joblib.load(path)
+        _, (_, model) = split_pipeline(clf)
+
+        try:
+            f1_before = f1_score(y, clf.predict(X), average="macro")
+        except (ValueError, IndexError) as e:
+            # e.g. CategoricalNB on an age it has never seen; the update adds it
+            print(f"[WARN] {name} cannot score the batch before updating: {type(e).__name__}: {e}")
+            f1_before = None
+        start = time.perf_counter()
+        if isinstance(model, LogisticRegression):
+            if df_replay is None:
+                df_replay = read_replay_rows(seen[name])
+            # Encoded together so both share one set of categories
+            X_fit, y_fit, _ = prepare_features(pd.concat([df_replay, df_new.iloc[offset:]], ignore_index=True), target)
+            Xt, yt = transform_batch(clf, X_fit, y_fit)
+        else:
+            Xt, yt = transform_batch(clf, X, y)
+        # By default the trees per row seen stay constant (RF_MAX_TREES)
+        new_trees = max(1, round(
+            len(X) * (trees_per_1k_rows / 1000 if trees_per_1k_rows else
+                      getattr(model, "n_estimators", 0) / max(seen[name], 1))
+        ))
+        change = update_model(model, Xt, yt, new_trees, max_trees)
+        seconds = time.perf_counter() - start
+        record["models"][name] = {
+            "update": change, "rows": [seen[name], n_rows], "seconds": seconds, "batch_f1_macro_before": f1_before
+        }
+        f1_text = f"{f1_before:.3f}" if f1_before is not None else "n/a"
+        print(f"{name}: {change} in {seconds:.2f}s (F1 on the batch before updating: {f1_text})")
+        if change.startswith("skipped"):
+            print(f"{name}: rows {seen[name]}-{n_rows - 1} are kept for its next update")
+            continue
+        updated[name] = clf
+        model_seen[name] = n_rows
+
+    # Nothing is saved unless every update succeeded, so a failed run can
+    # simply be repeated without applying a batch twice
+    existing = [version_path(name, version, models_dir) for name in updated
+                if os.path.exists(version_path(name, version, models_dir))]
+    if existing:
+        raise FileExistsError(
+            f"Version {version} already exists ({', '.join(existing)}) but training_state.json does not list it; "
+            f"run model_training.py for a full retrain"
+        )
+    for name, clf in updated.items():
+        record["models"][name]["path"] = save_version(name, clf, version, models_dir)
+        print(f"✅ Model saved to: {record['models'][name]['path']}")
+    record["stale"] = refresh_derived(updated, models_dir)
+    state["rows_seen"] = n_rows
+    state["model_rows_seen"] = model_seen
+    state["versions"].append(record)
+    save_training_state(state, models_dir)
+    return record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the saved models with newly cleaned rows only.")
+    parser.add_argument("models", nargs="*", default=INCREMENTAL_MODELS,
+                        help=f"Default: {' '.join(INCREMENTAL_MODELS)}")
+    parser.add_argument("--trees-per-1k-rows", type=float, default=None,
+                        help="Trees added to the random forest per 1000 new rows "
+                             "(default: keep trees per row seen constant)")
+    parser.add_argument("--max-trees", type=int, default=RF_MAX_TREES,
+                        help="Random forest size after which new trees replace the oldest ones")
+    parser.add_argument("--chunksize", type=int, default=CLEAN_CHUNKSIZE)
+    parser.add_argument("--target", choices=TARGETS, default=TARGETS[0])
+    parser.add_argument("--models-dir", help=f"Default: the target's folder under {MODELS_DIR}")
+    args = parser.parse_args()
+
+    update_models(args.models, args.trees_per_1k_rows, args.chunksize, args.max_trees, args.target, args.models_dir)
@@ -0,0 +1,100 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+import numpy as np
+import pandas as pd
+
+RAW_DATA_PATH = "data/raw/survey.csv"
+
+
+def load_sample_rows(path=RAW_DATA_PATH, n=500, seed=42):
+    """Raw survey rows as JSON-ready dicts (NaN -> null)."""
+    df = pd.read_csv(path).drop(columns=["Timestamp", "comments"], errors="ignore")
+    df = df.sample(n=min(n, len(df)), random_state=seed)
+    return json.loads(df.to_json(orient="records"))
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode().partition(":")
+        if key.lower() == "content-length":
+            length = int(value)
+    status = int(status_line.split()[1])
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _client(host, port, path, rows, n_requests, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            status, _ = await _request(reader, writer, "POST", path, random.choice(rows))
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load_test(host="127.0.0.1", port=8000, model="", concurrency=32, requests=2000,
+                        data_path=RAW_DATA_PATH):
+    """
+    Fire `requests` single-row POSTs from `concurrency` keep-alive clients and
+    return client-side throughput/latency plus the server's /metrics.
+    """
+    rows = load_sample_rows(data_path)
+    path = f"/predict/{model}" if model else "/predict"
+    latencies, errors = [], []
+
+    per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(host, port, path, rows, n, latencies, errors) for n in per_client if n
+    ])
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, server_metrics = await _request(reader, writer, "GET", "/metrics")
+    writer.close()
+
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "client_p50_ms": float(np.percentile(ms, 50)),
+        "client_p99_ms": float(np.percentile(ms, 99)),
+        "server": server_metrics,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a running serve.py on localhost.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default="", help="Model name (default: the server's default model)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--data", default=RAW_DATA_PATH, help="Raw survey CSV to sample request bodies from")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(
+        args.host, args.port, args.model, args.concurrency, args.requests, args.data
+    ))
+    print(json.dumps(report, indent=2))
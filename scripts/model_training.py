@@ -1,167 +1,540 @@
 import os
+import json
+import time
+import argparse
+import warnings
 import joblib
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.naive_bayes import CategoricalNB
-from sklearn.ensemble import VotingClassifier
-from imblearn.over_sampling import SMOTE
-from imblearn.pipeline import Pipeline as ImbPipeline
-from sklearn.metrics import classification_report, confusion_matrix
-from helper import extract_estimator_with_attr
+from helper import (
+    extract_estimator_with_attr, densify, matrix_nbytes, dump, span, add_instrumentation_args, start_instrumentation
+)
+from clean_store import CLEAN_COLUMNS, load_clean
+from orchestrator import FOLD_CACHE_DIR, run_training_grids
+from samplers import IMBALANCE_MODES, build_sampler
+from evaluation import (
+    CI_LEVEL, N_BOOTSTRAP, bootstrap_evaluate, paired_difference, summary_columns
+)
+from ensemble import (
+    ENSEMBLE_METHODS, ENSEMBLE_NAMES, OOF_FILE, build_ensemble, collect_oof, oof_score, parse_weights, save_oof
+)
+
+# sklearn, imblearn and matplotlib are imported by the functions that use
+# them: predict.py, serve.py and `--help` only need the constants and
+# prepare_features
 
 save_folder = "visuals/model_training"
-os.makedirs(save_folder, exist_ok=True)
+MODELS_DIR = "models"
+SUMMARY_PATH = os.path.join(MODELS_DIR, "model_performance_summary.csv")
+# Best hyperparameters found by search.py, applied with --tuned
+BEST_PARAMS_PATH = os.path.join(MODELS_DIR, "best_params.json")
+# Clean rows consumed by the saved models and their incremental versions
+TRAINING_STATE_PATH = os.path.join(MODELS_DIR, "training_state.json")
+# Versions saved by incremental.py since the last full retrain; a full
+# retrain moves them to versions_archive/<time>/ and starts a new history
+VERSIONS_DIR = os.path.join(MODELS_DIR, "versions")
+VERSIONS_ARCHIVE_DIR = os.path.join(MODELS_DIR, "versions_archive")
+
+# Targets model_training.py can train. The first is the default: its
+# artifacts stay directly in models/, where predict.py, serve.py and
+# export_model.py look; the others go to models/<target>/
+TARGETS = ("seek_help_cleaned", "treatment_cleaned")
+target = TARGETS[0]
+drop_cols = ['Country', 'Gender_cleaned']
+numeric_cols = ['Age', 'Employees_estimate']
+CV_FOLDS = 5
+# Held-out test split, shared with the evaluation scripts
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+
+# Design-matrix format after one-hot encoding:
+#   auto   - sklearn's sparse_threshold heuristic (previous behaviour)
+#   dense  - always a dense ndarray
+#   sparse - always CSR, kept sparse through SMOTE into the estimators
+MATRIX_FORMATS = ("auto", "dense", "sparse")
+
 
 # LOADING DATA
 
-CLEAN_DATA_PATH = "data/clean/survey.csv"
-df = pd.read_csv(CLEAN_DATA_PATH)
-df = df.fillna(-1)
+def encode_frame(df):
+    """
+    Impute and cast clean-schema rows once; every target's X and y are
+    column selections of the result (split_target).
+    """
+    df = df.drop(columns=[c for c in drop_cols if c in df.columns])
+    # Plain int64 after imputing: nullable ints would make the design matrix object dtype
+    df = df.fillna(-1).astype('int64')
 
-target = "seek_help_cleaned"
-drop_cols = ['Country', 'Gender_cleaned']
-X = df.drop(columns=[target] + drop_cols)
-y = df[target]
-# print(len(X)) - 21
+    # CATEGORICAL AND NUMERIC
 
-# CATEGORICAL AND NUMERIC
+    for col in df.columns:
+        if col.endswith('_cleaned'):
+            df[col] = df[col].astype('category')
+    return df
 
-categorical_cols = [col for col in X.columns if col.endswith('_cleaned')]
-if target in categorical_cols:
-    categorical_cols.remove(target)
 
-numeric_cols = ['Age', 'Employees_estimate']
+def split_target(frame, target=target):
+    """Encoded frame -> (X, y, categorical_cols) for one target; y is None when it is absent."""
+    y = frame[target].astype('int64') if target in frame.columns else None
+    X = frame.drop(columns=[target], errors='ignore')
+    categorical_cols = [col for col in X.columns if col.endswith('_cleaned')]
+    return X, y, categorical_cols
 
-for col in categorical_cols:
-    X[col] = X[col].astype('category')
 
-# TRAIN-TEST SPLIT
+def prepare_features(df, target=target):
+    """
+    Clean-schema rows -> model input X (and y when the target is present),
+    exactly as the models were trained. Shared with predict.py.
+    """
+    return split_target(encode_frame(df), target)
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
 
-# PREPROCESSING : ONE HOT ENCODING
+def load_training_frame():
+    """The encoded clean data, read once for any number of targets."""
+    # Only read the columns used for training
+    with span("load_clean") as sp:
+        df = load_clean(columns=[c for c in CLEAN_COLUMNS if c not in drop_cols])
+        sp.count(rows=len(df))
+    # print(len(X)) - 21
+    return encode_frame(df)
 
-preprocessor = ColumnTransformer(
-    transformers=[('cat', OneHotEncoder(handle_unknown='ignore', drop='first'), categorical_cols)],
-    remainder='passthrough'
-)
 
-# DEFINE MODELS
+def load_training_data(target=target):
+    return split_target(load_training_frame(), target)
+
+
+def target_name(target):
+    """seek_help_cleaned -> seek_help, for artifact paths."""
+    return target[:-len("_cleaned")] if target.endswith("_cleaned") else target
+
+
+def target_dir(target, root=MODELS_DIR):
+    """Artifact folder of a target under `root`: the default target keeps `root` itself."""
+    return root if target == TARGETS[0] else os.path.join(root, target_name(target))
+
 
-models = {
-    "RandomForest_Balanced" : RandomForestClassifier(
-        n_estimators=200, class_weight= 'balanced', random_state=42
-    ),
-    "CategoricalNB": CategoricalNB(),
-    "LogisticRegression": LogisticRegression(
-        max_iter=5000, class_weight='balanced', random_state=42
+def holdout_split(X, y):
+    """(X_train, X_test, y_train, y_test), the same split every run."""
+    from sklearn.model_selection import train_test_split
+    return train_test_split(X, y, test_size=TEST_SIZE, random_state=SPLIT_SEED, stratify=y)
+
+
+# PREPROCESSING : ONE HOT ENCODING
+
+def build_preprocessor(categorical_cols, matrix_format="auto"):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder
+    if matrix_format not in MATRIX_FORMATS:
+        raise ValueError(f"matrix_format must be one of {MATRIX_FORMATS}, got {matrix_format!r}")
+    if matrix_format == "auto":
+        return ColumnTransformer(
+            transformers=[('cat', OneHotEncoder(handle_unknown='ignore', drop='first'), categorical_cols)],
+            remainder='passthrough'
+        )
+
+    sparse = matrix_format == "sparse"
+    return ColumnTransformer(
+        transformers=[(
+            'cat', OneHotEncoder(handle_unknown='ignore', drop='first', sparse_output=sparse), categorical_cols
+        )],
+        remainder='passthrough',
+        # 1.0: any sparse block keeps the whole output CSR; 0: always dense
+        sparse_threshold=1.0 if sparse else 0.0
     )
-}
 
-# Ensure models directory exists
-os.makedirs("models", exist_ok=True)
 
-# TRAIN AND SAVE MODELS
+def accepts_sparse(model):
+    try:
+        from sklearn.utils import get_tags
+        return get_tags(model).input_tags.sparse
+    except ImportError:
+        from sklearn.naive_bayes import CategoricalNB
+        return not isinstance(model, CategoricalNB)
+
 
-results = []
+def design_matrix_footprint(categorical_cols, X):
+    """
+    Bytes of the one-hot design matrix for X in each explicit format. Only the
+    sparse matrix is built; the dense size follows from its shape.
+    """
+    sparse_pre = build_preprocessor(categorical_cols, "sparse")
+    Xt = sparse_pre.fit_transform(X)
+    return {
+        "dense": Xt.shape[0] * Xt.shape[1] * Xt.dtype.itemsize,
+        "sparse": matrix_nbytes(Xt),
+        "shape": Xt.shape,
+    }
 
-for name, model in models.items():
-    clf = ImbPipeline(steps=[
-        ('preprocessor', preprocessor),
-        ('smote', SMOTE(random_state=42)),
-        ('model', model)
-    ])
 
-    # Cross-validation
-    cv_scores = cross_val_score(clf, X_train, y_train, cv=5, scoring='f1_macro')
-    mean_cv = np.mean(cv_scores)
-    std_cv = np.std(cv_scores)
+# DEFINE MODELS
 
-    # Train final model
-    clf.fit(X_train, y_train)
-    y_pred = clf.predict(X_test)
+def build_models(params=None):
+    """The model zoo; `params` ({name: {param: value}}) overrides the defaults."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import CategoricalNB
+    models = {
+        "RandomForest_Balanced" : RandomForestClassifier(
+            n_estimators=200, class_weight= 'balanced', random_state=42
+        ),
+        "CategoricalNB": CategoricalNB(),
+        "LogisticRegression": LogisticRegression(
+            max_iter=5000, class_weight='balanced', random_state=42
+        )
+    }
+    for name, model_params in (params or {}).items():
+        if name in models:
+            models[name].set_params(**model_params)
+    return models
+
+
+def load_best_params(path=BEST_PARAMS_PATH):
+    """{name: params} of the best search.py configurations."""
+    with open(path) as f:
+        return {name: best["params"] for name, best in json.load(f).items()}
+
+
+def build_pipelines(preprocessor, models, matrix_format="auto", imbalance="smote"):
+    from sklearn.base import clone
+    from sklearn.naive_bayes import CategoricalNB
+    from sklearn.preprocessing import FunctionTransformer
+    from imblearn.pipeline import Pipeline as ImbPipeline
+    pipelines = {}
+    for name, model in models.items():
+        steps = [('preprocessor', preprocessor)]
+        sampler = build_sampler(imbalance)
+        if sampler is not None:
+            steps.append(('smote' if imbalance == "smote" else 'sampler', sampler))
+        elif isinstance(model, CategoricalNB):
+            # No class_weight for NB: uniform class priors do the balancing
+            model = clone(model).set_params(fit_prior=False)
+        # CategoricalNB cannot take CSR input: densify right before it
+        if matrix_format == "sparse" and not accepts_sparse(model):
+            steps.append(('densify', FunctionTransformer(densify, accept_sparse=True)))
+        steps.append(('model', model))
+        pipelines[name] = ImbPipeline(steps=steps)
+    return pipelines
+
+
+def summarize_folds(fold_results, name):
+    """CV mean/std plus one score and one timing column per fold."""
+    folds = sorted((r for r in fold_results if r["Model"] == name), key=lambda r: r["Fold"])
+    scores = np.array([r["Score"] for r in folds], dtype=float)
+    # Like cross_val_score + np.mean: one failed fold makes the mean NaN
+    row = {
+        "CV_F1_mean": np.mean(scores),
+        "CV_F1_std": np.std(scores),
+        "CV_fit_seconds_total": sum(r["Fit_seconds"] for r in folds),
+    }
+    for r in folds:
+        row[f"CV_fold{r['Fold'] + 1}_F1"] = r["Score"]
+        row[f"CV_fold{r['Fold'] + 1}_seconds"] = r["Fit_seconds"] + r["Score_seconds"]
+    return row
 
-    # Evaluation
-    report = classification_report(y_test, y_pred, output_dict=True)
-    cm = confusion_matrix(y_test, y_pred)
 
-    print(f"\n📊 {name}")
-    print(f"Average CV F1 (macro): {mean_cv:.3f} ± {std_cv:.3f}")
-    print(classification_report(y_test, y_pred))
-    print("Confusion Matrix:\n", cm)
+# TRAIN AND SAVE MODELS
+
+def train_and_save(n_workers=None, fold_cache=FOLD_CACHE_DIR, matrix_format="auto", params=None,
+                   imbalance="smote", targets=(target,), vote_weights=None, n_bootstrap=N_BOOTSTRAP):
+    """
+    Train, evaluate and save the model zoo for every target in `targets`.
+    The clean data is read and encoded once; each target gets its own
+    stratified holdout split and CV folds, and the whole targets x models x
+    folds grid runs on one process pool. The ensembles (voting_clf,
+    stacking_clf) reuse the fitted models and their out-of-fold
+    probabilities; `vote_weights` ({name: weight}) weights the soft vote.
+    Test metrics get CIs from `n_bootstrap` resamples of the test rows.
+    """
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        raise ValueError(f"targets must be in {TARGETS}, got {unknown}")
+
+    frame = load_training_frame()
+    params = params or {}
+
+    # TRAIN-TEST SPLIT, per target
+
+    grids, splits = {}, {}
+    for t in targets:
+        X, y, categorical_cols = split_target(frame, t)
+        X_train, X_test, y_train, y_test = holdout_split(X, y)
+
+        preprocessor = build_preprocessor(categorical_cols, matrix_format)
+        pipelines = build_pipelines(preprocessor, build_models(params), matrix_format, imbalance)
+
+        footprint = design_matrix_footprint(categorical_cols, X_train)
+        print(f"[{t}] Design matrix {footprint['shape']}: dense {footprint['dense'] / 1e6:.2f} MB, "
+              f"sparse CSR {footprint['sparse'] / 1e6:.2f} MB (training with: {matrix_format})")
+
+        grids[t] = (pipelines, X_train, y_train)
+        splits[t] = (X_train, X_test, y_train, y_test, footprint)
+
+    # Cross-validation and final fits of every model for every target, in
+    # parallel; the one-hot + resampled output of each fold is computed once
+    # for all models of a target
+    trained = run_training_grids(
+        grids, cv=CV_FOLDS, scoring='f1_macro', n_workers=n_workers, cache_dir=fold_cache, oof_proba=True
+    )
+
+    for t in targets:
+        fold_results, fitted = trained[t]
+        evaluate_and_save(t, grids[t][0], fold_results, fitted, *splits[t], matrix_format, params, imbalance,
+                          vote_weights, n_bootstrap)
+        # A full retrain consumes every clean row and starts a new version history
+        start_version_history(len(frame), target_dir(t))
+
+
+def evaluate_and_save(target, pipelines, fold_results, fitted, X_train, X_test, y_train, y_test, footprint,
+                      matrix_format, params, imbalance, vote_weights=None, n_bootstrap=N_BOOTSTRAP):
+    """
+    Score one target's fitted models and their ensembles on its holdout split
+    and save models, summary and plots. Every test metric gets a bootstrap CI
+    from the same `n_bootstrap` resamples of the test rows for all models.
+    """
+    models_dir = target_dir(target)
+    plots_dir = target_dir(target, save_folder)
+    os.makedirs(models_dir, exist_ok=True)
+    os.makedirs(plots_dir, exist_ok=True)
+
+    results, saved, evaluations = [], {}, {}
+
+    for name in pipelines:
+        clf, fit_seconds = fitted[name]
+        cv_row = summarize_folds(fold_results, name)
+        print(f"\n📊 {name} ({target})")
+        print(f"Average CV F1 (macro): {cv_row['CV_F1_mean']:.3f} ± {cv_row['CV_F1_std']:.3f}")
+        evaluations[name] = score_and_save(name, clf, target, models_dir, X_test, y_test, n_bootstrap)
+        if evaluations[name] is not None:
+            saved[name] = clf
+            # Save model - Core
+            save_core_model(name, clf, models_dir)
+        results.append(summary_row(
+            name, target, evaluations[name], fit_seconds, matrix_format, params.get(name, {}), imbalance, footprint, cv_row
+        ))
+
+    # ENSEMBLES of the fitted pipelines above, built from their out-of-fold
+    # probabilities: no base model is refitted
+
+    oof, classes = collect_oof(fold_results, list(pipelines), len(y_train))
+    save_oof(os.path.join(models_dir, OOF_FILE), oof, classes, y_train)
+    # Only models that could score the holdout split (and were saved) take part
+    members = {name: clf for name, clf in saved.items() if name in oof}
+    for method in ENSEMBLE_METHODS:
+        name = ENSEMBLE_NAMES[method]
+        print(f"\n=== {name}: {method} ensemble of {' + '.join(members)} ({target}) ===")
+        if len(members) < 2:
+            warnings.warn(f"{name} ({target}) needs two saved models with out-of-fold probabilities, skipped")
+            continue
+        start = time.perf_counter()
+        with span("fit_ensemble", model=name, target=target, method=method):
+            ensemble = build_ensemble(members, method, oof, y_train, vote_weights, models_dir)
+        fit_seconds = time.perf_counter() - start
+        if method == "soft":
+            print(f"Out-of-fold F1 (macro): {oof_score(ensemble, oof, y_train, macro_f1):.3f}")
+        evaluations[name] = score_and_save(name, ensemble, target, models_dir, X_test, y_test, n_bootstrap)
+        ensemble_params = {"members": list(members), "weights": vote_weights} if method == "soft" \
+            else {"members": list(members), "meta_rows": ensemble.meta_rows_}
+        results.append(summary_row(
+            name, target, evaluations[name], fit_seconds, matrix_format, ensemble_params, imbalance, footprint,
+            {"CV_F1_mean": np.nan, "CV_F1_std": np.nan}
+        ))
+
+    # Paired bootstrap difference to the best model: an interval below 0
+    # means the gap is more than resampling noise
+    scored = {name: e for name, e in evaluations.items() if e is not None}
+    if scored:
+        best = max(scored, key=lambda name: scored[name]["point"]["macro_f1"])
+        print(f"\nTest F1 (macro) vs {best} ({target}), {CI_LEVEL:.0%} paired bootstrap CI:")
+        for row in results:
+            low, high = paired_difference(scored[row["Model"]], scored[best]) if row["Model"] in scored \
+                else (np.nan, np.nan)
+            row.update(Test_F1_macro_vs_best_CI_low=low, Test_F1_macro_vs_best_CI_high=high)
+            if row["Model"] in scored and row["Model"] != best:
+                print(f"  {row['Model']:<24} [{low:+.3f}, {high:+.3f}]")
+
+    # SAVE MODEL PERFORMANCE
+    summary_path = os.path.join(models_dir, os.path.basename(SUMMARY_PATH))
+    results_df = pd.DataFrame(results)
+    results_df.to_csv(summary_path, index=False)
+    print(f"\nModel performance summary saved to {summary_path}")
+
+    plot_rf_importances(fitted["RandomForest_Balanced"][0], plots_dir)
+
+
+def macro_f1(y_true, y_pred):
+    from sklearn.metrics import f1_score
+    return f1_score(y_true, y_pred, average="macro")
+
+
+def score_and_save(name, clf, target, models_dir, X_test, y_test, n_bootstrap=N_BOOTSTRAP):
+    """
+    Holdout metrics of a fitted model with bootstrap CIs over `n_bootstrap`
+    resamples (evaluation.bootstrap_evaluate, same seed for every model,
+    so the resamples are paired); the model is then saved as
+    <models_dir>/<name>.joblib. None (and nothing saved) when it cannot predict.
+    """
+    from sklearn.metrics import classification_report
+    try:
+        with span("predict", model=name, target=target) as sp:
+            y_pred = clf.predict(X_test)
+            sp.count(rows=len(X_test))
+    except Exception as e:
+        # e.g. CategoricalNB meeting an Age it never saw: score NaN like a
+        # failed CV fold, and do not save a model that cannot predict
+        warnings.warn(f"{name} ({target}) failed on the test split, not saved: {type(e).__name__}: {e}")
+        return None
+
+    # Evaluation
+    with span("bootstrap_evaluate", model=name, target=target, resamples=n_bootstrap):
+        evaluation = bootstrap_evaluate(y_test, y_pred, n_bootstrap)
+    low, high = evaluation["ci"]["macro_f1"]
+    print(f"Test F1 (macro): {evaluation['point']['macro_f1']:.3f} ({CI_LEVEL:.0%} CI {low:.3f}-{high:.3f})")
+    dump(classification_report(y_test, y_pred))
+    dump("Confusion Matrix:\n", evaluation["confusion"])
+    dump(f"Confusion Matrix {CI_LEVEL:.0%} CI (low / high):\n", *evaluation["confusion_ci"])
 
     # Save model - Pipeline
-    model_path = f"models/{name}.joblib"
-    joblib.dump(clf, model_path)
+    model_path = os.path.join(models_dir, f"{name}.joblib")
+    with span("save_model", model=name, target=target):
+        joblib.dump(clf, model_path)
     print(f"✅ Model saved to: {model_path}")
+    return evaluation
 
-    # Save model - Core
+
+def summary_row(name, target, evaluation, fit_seconds, matrix_format, params, imbalance, footprint, cv_row):
+    """One model's row of model_performance_summary.csv; `evaluation` None means it failed on the holdout."""
+    point = evaluation["point"] if evaluation else {"accuracy": np.nan, "macro_f1": np.nan}
+    cv_row = dict(cv_row)
+    return {
+        "Model": name,
+        "Target": target,
+        "CV_F1_mean": cv_row.pop("CV_F1_mean"),
+        "CV_F1_std": cv_row.pop("CV_F1_std"),
+        "Test_Accuracy": point["accuracy"],
+        "Test_F1_macro": point["macro_f1"],
+        **(summary_columns(evaluation) if evaluation else {}),
+        "Fit_seconds": fit_seconds,
+        "Matrix_format": matrix_format,
+        "Params": json.dumps(params, sort_keys=True),
+        "Imbalance": imbalance,
+        "Design_MB_dense": footprint["dense"] / 1e6,
+        "Design_MB_sparse": footprint["sparse"] / 1e6,
+        **cv_row
+    }
+
+
+def save_core_model(name, clf, models_dir=MODELS_DIR):
+    model = clf.named_steps['model']
     if name in ("RandomForest_Balanced"):
         core = extract_estimator_with_attr(model, "feature_importances_")
-        joblib.dump(core, os.path.join("models", f"{name}_core.joblib"))
+        joblib.dump(core, os.path.join(models_dir, f"{name}_core.joblib"))
     elif name in ("LogisticRegression"):
         core = extract_estimator_with_attr(model, "coef_")
-        joblib.dump(core, os.path.join("models", f"{name}_core.joblib"))
+        joblib.dump(core, os.path.join(models_dir, f"{name}_core.joblib"))
 
-    # Save results
-    results.append({
-        "Model": name,
-        "CV_F1_mean": mean_cv,
-        "CV_F1_std": std_cv,
-        "Test_Accuracy": report["accuracy"],
-        "Test_F1_macro": report["macro avg"]["f1-score"]
-    })
-
-# SAVE MODEL PERFORMANCE
-results_df = pd.DataFrame(results)
-results_df.to_csv("models/model_performance_summary.csv", index=False)
-print("\nModel performance summary saved to models/model_performance_summary.csv")
-
-print("\n=== VotingClassifier (RF + LR + CategoricalNB) ===")
-voting_clf = VotingClassifier(
-    estimators=[
-        ("rf", RandomForestClassifier(
-            n_estimators=200, class_weight='balanced', random_state=42
-        )),
-        ("lr", LogisticRegression(
-            max_iter=5000, class_weight='balanced', random_state=42
-        )),
-        ("nb", CategoricalNB())
-    ],
-    voting='soft'
-)
 
-voting_clf.fit(X_train, y_train)
-y_pred_voting = voting_clf.predict(X_test)
+def load_training_state(models_dir=MODELS_DIR):
+    path = os.path.join(models_dir, os.path.basename(TRAINING_STATE_PATH))
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
 
-print(classification_report(y_test, y_pred_voting))
-print("Confusion Matrix:")
-print(confusion_matrix(y_test, y_pred_voting))
 
-model_path = f"models/voting_clf.joblib"
-joblib.dump(voting_clf, model_path)
-print(f"✅ Model saved to: {model_path}")
+def save_training_state(state, models_dir=MODELS_DIR):
+    with open(os.path.join(models_dir, os.path.basename(TRAINING_STATE_PATH)), "w") as f:
+        json.dump(state, f, indent=2)
 
-# FEATURE IMPORTANCE PLOT
 
-rf_model = joblib.load("models/RandomForest_Balanced.joblib")
-rf_feature_names = rf_model.named_steps['preprocessor'].get_feature_names_out()
-all_features = np.append(rf_feature_names, numeric_cols)
+def start_version_history(rows_seen, models_dir=MODELS_DIR):
+    """
+    Reset the training state after a full retrain. Versions saved by
+    incremental updates of the previous models are archived, so the next
+    update's v0000 / v0001 cannot be confused with (or overwrite) them.
+    """
+    versions_dir = os.path.join(models_dir, os.path.basename(VERSIONS_DIR))
+    if os.path.isdir(versions_dir):
+        archive = os.path.join(
+            models_dir, os.path.basename(VERSIONS_ARCHIVE_DIR), time.strftime("%Y%m%dT%H%M%S")
+        )
+        while os.path.exists(archive):
+            archive += "_"
+        os.makedirs(os.path.dirname(archive), exist_ok=True)
+        os.replace(versions_dir, archive)
+        print(f"Previous model versions archived to {archive}")
+    save_training_state({"rows_seen": rows_seen, "versions": []}, models_dir)
 
-importances = rf_model.named_steps['model'].feature_importances_
-indices = np.argsort(importances)[::-1]
 
-plt.figure(figsize=(10,6))
-plt.bar(range(15), importances[indices[:15]], align='center')
-plt.xticks(range(15), [all_features[i] for i in indices[:15]], rotation=75)
-plt.title("Top 15 Feature Importances (Random Forest)")
-plt.tight_layout()
-plt.savefig(os.path.join(save_folder, "RF_15_features.png"))
-plt.close()
+# FEATURE IMPORTANCE PLOT
 
+def plot_rf_importances(rf_model, plots_dir=save_folder):
+    import matplotlib.pyplot as plt
+    rf_feature_names = rf_model.named_steps['preprocessor'].get_feature_names_out()
+    all_features = np.append(rf_feature_names, numeric_cols)
+
+    importances = rf_model.named_steps['model'].feature_importances_
+    indices = np.argsort(importances)[::-1]
+
+    with span("render_plot", plot="RF_15_features.png"):
+        plt.figure(figsize=(10,6))
+        plt.bar(range(15), importances[indices[:15]], align='center')
+        plt.xticks(range(15), [all_features[i] for i in indices[:15]], rotation=75)
+        plt.title("Top 15 Feature Importances (Random Forest)")
+        plt.tight_layout()
+        plt.savefig(os.path.join(plots_dir, "RF_15_features.png"))
+        plt.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train, evaluate and save the model zoo.")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Core budget for training (processes x n_jobs threads); default: all cores"
+    )
+    parser.add_argument(
+        "--no-fold-cache", action="store_true",
+        help=f"Do not persist preprocessed/resampled folds in {FOLD_CACHE_DIR} between runs"
+    )
+    parser.add_argument(
+        "--matrix-format", choices=MATRIX_FORMATS, default="auto",
+        help="One-hot design matrix format; 'sparse' keeps CSR through SMOTE and the estimators"
+    )
+    parser.add_argument(
+        "--tuned", action="store_true",
+        help=f"Train with the best hyperparameters from search.py ({BEST_PARAMS_PATH})"
+    )
+    parser.add_argument(
+        "--imbalance", choices=IMBALANCE_MODES, default="smote",
+        help="Imbalance handling between the one-hot encoder and the models (compare them: imbalance_report.py)"
+    )
+    parser.add_argument(
+        "--targets", nargs="+", choices=TARGETS, default=[target],
+        help="Targets to train in one run (shared read/encoding, one process pool); "
+             f"the first of {TARGETS} saves to {MODELS_DIR}/, the others to {MODELS_DIR}/<target>/"
+    )
+    parser.add_argument(
+        "--vote-weights", nargs="+", metavar="MODEL=W", default=None,
+        help="Soft-voting weights of voting_clf's members, e.g. RandomForest_Balanced=2 (default: equal)"
+    )
+    parser.add_argument(
+        "--bootstrap", type=int, default=N_BOOTSTRAP,
+        help="Bootstrap resamples of the test rows for the metric CIs in the summary"
+    )
+    add_instrumentation_args(parser)
+    args = parser.parse_args(argv)
+
+    with start_instrumentation(args, "model_training"):
+        train_and_save(
+            n_workers=args.workers,
+            fold_cache=None if args.no_fold_cache else FOLD_CACHE_DIR,
+            matrix_format=args.matrix_format,
+            params=load_best_params() if args.tuned else None,
+            imbalance=args.imbalance,
+            targets=args.targets,
+            vote_weights=parse_weights(args.vote_weights),
+            n_bootstrap=args.bootstrap
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import os
+import json
+import mmap
+import time
+import struct
+import numpy as np
+
+# Written by export_model.py; bump when the layout below changes.
+# Version 1 artifacts are .npz files (LR / NB only), still readable
+ARTIFACT_VERSION = 2
+ARTIFACT_EXT = ".mmap"
+
+# ---------- Memory-mapped array container ----------
+# MAGIC, a little-endian uint64 header length, a JSON header
+# {"meta": ..., "arrays": {key: {dtype, shape, offset}}}, then every array
+# uncompressed at an aligned offset. Loading maps the file read-only and
+# wraps each array around the mapping without copying, so every process
+# scoring with the same artifact shares one page-cache copy of it.
+MAGIC = b"MHNPART\n"
+ALIGN = 64
+# Rows per batch when walking the forest (trees x rows node ids in memory)
+FOREST_BATCH_ROWS = 2048
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def save_arrays(path, meta, arrays):
+    """Write meta (JSON-able) and {key: ndarray} as a memory-mappable artifact, atomically."""
+    arrays = {key: np.ascontiguousarray(value) for key, value in arrays.items()}
+    for key, value in arrays.items():
+        if value.dtype.hasobject:
+            raise TypeError(f"Array {key!r} has object dtype; convert it to str or numbers first")
+
+    def layout(start):
+        specs, offset = {}, start
+        for key, value in arrays.items():
+            specs[key] = {"dtype": value.dtype.str, "shape": list(value.shape), "offset": offset}
+            offset = _aligned(offset + value.nbytes)
+        return specs
+
+    # The header holds the offsets, which depend on the header's length
+    start = 0
+    while True:
+        specs = layout(start)
+        header = json.dumps({"meta": meta, "arrays": specs}).encode()
+        needed = _aligned(len(MAGIC) + 8 + len(header))
+        if needed == start:
+            break
+        start = needed
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for key, value in arrays.items():
+            f.seek(specs[key]["offset"])
+            f.write(value.tobytes())
+    os.replace(tmp, path)
+
+
+def load_arrays(path, mmap_mode=True):
+    """
+    (meta, {key: ndarray}) of an artifact. With mmap_mode the arrays are
+    read-only views of a shared mapping of the file; otherwise private copies.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a {ARTIFACT_EXT} artifact")
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+        # The mapping stays valid after the file is closed
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = {}
+    for key, spec in header["arrays"].items():
+        dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+        if 0 in shape:
+            arrays[key] = np.empty(shape, dtype=dtype)
+            continue
+        view = np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=spec["offset"]).reshape(shape)
+        arrays[key] = view if mmap_mode else view.copy()
+    return header["meta"], arrays
+
+
+def mapping_memory(path):
+    """
+    {rss_mb, shared_mb, private_mb} of this process's mappings of `path`,
+    from /proc/self/smaps (None where that is not available). Shared pages
+    are the ones other processes mapping the same artifact use too.
+    """
+    target = os.path.realpath(path)
+    totals = {"Rss": 0, "Shared_Clean": 0, "Shared_Dirty": 0, "Private_Clean": 0, "Private_Dirty": 0}
+    try:
+        with open("/proc/self/smaps") as f:
+            current = False
+            for line in f:
+                fields = line.split(None, 5)
+                if not fields[0].endswith(":"):
+                    # Mapping header: address perms offset dev inode [path]
+                    current = len(fields) == 6 and fields[5].rstrip("\n") == target
+                elif current and fields[0][:-1] in totals:
+                    totals[fields[0][:-1]] += int(fields[1])
+    except OSError:
+        return None
+    return {
+        "rss_mb": totals["Rss"] / 1024,
+        "shared_mb": (totals["Shared_Clean"] + totals["Shared_Dirty"]) / 1024,
+        "private_mb": (totals["Private_Clean"] + totals["Private_Dirty"]) / 1024,
+    }
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    np.exp(scores, out=scores)
+    scores /= scores.sum(axis=1, keepdims=True)
+    return scores
+
+
+class NumpyScorer:
+    """
+    Scores clean-schema rows with an artifact from export_model.py using
+    NumPy only, so it loads in milliseconds without sklearn/imblearn/pandas.
+
+    LogisticRegression / CategoricalNB: the one-hot encoder and the model are
+    folded into additive per-column score tables: score = bias + one table
+    row per categorical column (+ weight x value or a table row per numeric
+    column), and predict_proba is the softmax of the scores over classes.
+
+    RandomForestClassifier: every tree's node table is concatenated into one
+    set of arrays (children, split feature, threshold, leaf class
+    probabilities), walked for all trees and rows at once on the one-hot
+    design matrix; predict_proba averages the leaves like sklearn.
+
+    .mmap artifacts are memory-mapped (mmap_mode=False copies them instead);
+    load_seconds and memory() report what loading cost.
+    """
+
+    def __init__(self, path, mmap_mode=True):
+        start = time.perf_counter()
+        if path.endswith(".npz"):
+            with np.load(path, allow_pickle=False) as npz:
+                meta = json.loads(str(npz["meta"]))
+                arrays = {key: npz[key] for key in npz.files}
+            mmap_mode = False
+        else:
+            meta, arrays = load_arrays(path, mmap_mode)
+        if meta.get("version") not in (1, ARTIFACT_VERSION):
+            raise ValueError(f"{path}: artifact version {meta.get('version')}, expected {ARTIFACT_VERSION}")
+
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.model = meta["model"]
+        self.columns = meta["columns"]
+        self.classes_ = arrays["classes"]
+        self.bias = arrays.get("bias")
+        self.features = []
+        for i, feature in enumerate(meta["features"]):
+            feature = dict(feature)
+            for key in ("categories", "table", "weights", "out"):
+                if f"{i}.{key}" in arrays:
+                    feature[key] = arrays[f"{i}.{key}"]
+            self.features.append(feature)
+        if self.model == "RandomForestClassifier":
+            self.n_outputs = meta["n_outputs"]
+            self.trees = {
+                key: arrays[f"tree.{key}"] for key in ("roots", "left", "right", "feature", "threshold", "proba")
+            }
+        self.load_seconds = time.perf_counter() - start
+
+    def memory(self):
+        """Artifact bytes and how much of them this process holds (shared vs private, when known)."""
+        report = {"artifact_mb": os.path.getsize(self.path) / 2 ** 20, "mmap": self.mmap_mode}
+        if self.mmap_mode:
+            report.update(mapping_memory(self.path) or {})
+        return report
+
+    def _values(self, X, name):
+        """One input column as an array; X is a DataFrame/dict or a 2D array in self.columns order."""
+        if hasattr(X, "columns") or isinstance(X, dict):
+            values = np.asarray(X[name])
+        else:
+            values = np.asarray(X)[:, self.columns.index(name)]
+        # Same imputation as model_training.prepare_features
+        if values.dtype.kind == "f":
+            values = np.where(np.isnan(values), -1, values)
+        return values
+
+    def design_matrix(self, X):
+        """The one-hot + passthrough matrix the forest was fitted on, as float32 like sklearn's trees."""
+        design = None
+        for feature in self.features:
+            values = self._values(X, feature["name"])
+            if design is None:
+                design = np.zeros((len(values), self.n_outputs), dtype=np.float32)
+            out = feature["out"]
+            if feature["type"] == "onehot":
+                categories = feature["categories"]
+                pos = np.minimum(np.searchsorted(categories, values), len(categories) - 1)
+                known = categories[pos] == values
+                if not known.all() and feature["handle_unknown"] == "error":
+                    raise ValueError(f"Unknown categories in column {feature['name']!r}")
+                # Unknown and dropped categories are all zeros
+                cols = np.where(known, out[pos], -1)
+                rows = np.flatnonzero(cols >= 0)
+                design[rows, cols[rows]] = 1
+            else:
+                (col,) = np.atleast_1d(out)
+                design[:, col] = values
+        return design
+
+    def _forest_proba(self, X):
+        trees = self.trees
+        design = self.design_matrix(X)
+        n_trees = len(trees["roots"])
+        proba = np.empty((len(design), trees["proba"].shape[1]))
+        for start in range(0, len(design), FOREST_BATCH_ROWS):
+            D = design[start:start + FOREST_BATCH_ROWS]
+            n = len(D)
+            flat = D.ravel()
+            # Current node of every (tree, row), flattened tree-major; only
+            # pairs not at a leaf yet are walked further
+            node = np.repeat(trees["roots"], n)
+            active = np.arange(len(node))
+            # Start of each pair's row in the flattened design matrix
+            row_start = np.tile(np.arange(n) * D.shape[1], n_trees)
+            while active.size:
+                at = node[active]
+                left = trees["left"][at]
+                inner = left >= 0
+                active, at, left, row_start = active[inner], at[inner], left[inner], row_start[inner]
+                # X is float32 as in sklearn; the comparison is in float64 as in sklearn
+                go_left = flat[row_start + trees["feature"][at]] <= trees["threshold"][at]
+                node[active] = np.where(go_left, left, trees["right"][at])
+            node = node.reshape(n_trees, n)
+            # Same summation order as RandomForestClassifier.predict_proba
+            batch = np.zeros((len(D), proba.shape[1]))
+            for t in range(n_trees):
+                batch += trees["proba"][node[t]]
+            proba[start:start + len(D)] = batch / n_trees
+        return proba
+
+    def decision_function(self, X):
+        """Per-class scores (log-odds for LR, joint log-likelihood for NB)."""
+        if self.model == "RandomForestClassifier":
+            raise AttributeError("RandomForestClassifier has no decision_function; use predict_proba")
+        scores = None
+        for feature in self.features:
+            values = self._values(X, feature["name"])
+            if scores is None:
+                scores = np.tile(self.bias, (len(values), 1))
+
+            if feature["type"] == "onehot":
+                categories = feature["categories"]
+                pos = np.minimum(np.searchsorted(categories, values), len(categories) - 1)
+                known = categories[pos] == values
+                if not known.all() and feature["handle_unknown"] == "error":
+                    raise ValueError(f"Unknown categories in column {feature['name']!r}")
+                # The last table row is the all-zeros (unknown) encoding
+                scores += feature["table"][np.where(known, pos, len(categories))]
+            elif feature["type"] == "linear":
+                scores += np.outer(values, feature["weights"])
+            else:
+                # CategoricalNB on a passthrough column: the value is the table row
+                table = feature["table"]
+                if (values < 0).any() or (values >= len(table)).any() or (values % 1 != 0).any():
+                    raise ValueError(
+                        f"Column {feature['name']!r} has values outside the {len(table)} categories seen in training"
+                    )
+                scores += table[values.astype(np.intp)]
+
+        if np.isnan(scores).any():
+            raise ValueError("Input has a category the model never saw in training")
+        return scores
+
+    def predict_proba(self, X):
+        if self.model == "RandomForestClassifier":
+            return self._forest_proba(X)
+        return _softmax(self.decision_function(X))
+
+    def predict(self, X):
+        if self.model == "RandomForestClassifier":
+            return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+        return self.classes_.take(self.decision_function(X).argmax(axis=1))
+
+
+def load_model(pipeline_path, mmap_mode=True):
+    """
+    A saved model for scoring: the exported artifact next to pipeline_path
+    (memory-mapped, shared between processes) when there is one at least as
+    new as the joblib pipeline, otherwise the pipeline itself.
+    """
+    artifact_path = os.path.splitext(pipeline_path)[0] + ARTIFACT_EXT
+    if os.path.exists(artifact_path) and (
+        not os.path.exists(pipeline_path) or os.path.getmtime(artifact_path) >= os.path.getmtime(pipeline_path)
+    ):
+        return NumpyScorer(artifact_path, mmap_mode)
+    import joblib
+    model = joblib.load(pipeline_path)
+    if hasattr(model, "set_members_dir"):
+        # A saved ensemble: its members are the models saved next to it
+        model.set_members_dir(os.path.dirname(pipeline_path))
+    return model
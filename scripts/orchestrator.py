@@ -0,0 +1,309 @@
+import os
+import time
+import shutil
+import tempfile
+import warnings
+from collections import deque
+import joblib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from helper import span
+
+# On-disk cache of fitted preprocessing + resampled fold matrices, shared by
+# every worker process and by later runs on the same data
+FOLD_CACHE_DIR = os.path.join(".cache", "fold_cache")
+# Least recently used entries are evicted above this size
+FOLD_CACHE_BYTES = 2 * 1024 ** 3
+# Fold entries prepared ahead of their model fits, per worker process
+LIVE_ENTRIES_PER_WORKER = 2
+
+# Worker-process state, set once per worker by _init_worker so the training
+# data is pickled once per process instead of once per task
+_WORKER = {}
+
+
+def _init_worker(grids, scoring, n_threads, cache_dir, oof_proba=False):
+    from sklearn.metrics import get_scorer
+    memory = joblib.Memory(cache_dir, verbose=0)
+    _WORKER.update(
+        grids=grids, scorer=get_scorer(scoring), n_threads=n_threads, oof_proba=oof_proba,
+        fit_prefix=memory.cache(_fit_prefix, ignore=["X", "y"])
+    )
+    try:
+        from threadpoolctl import threadpool_limits
+        # BLAS/OpenMP threads count against the same budget as n_jobs
+        _WORKER["limits"] = threadpool_limits(limits=n_threads)
+    except ImportError:
+        pass
+
+
+def set_thread_budget(estimator, n_threads):
+    """
+    Set every n_jobs parameter of a (pipeline) estimator to n_threads.
+    Returns the previous values so they can be restored.
+    """
+    params = estimator.get_params()
+    # n_jobs=None already means one thread; leave those alone for a budget of 1
+    previous = {k: v for k, v in params.items()
+                if k.endswith("n_jobs") and (n_threads > 1 or v not in (None, 1))}
+    if previous:
+        estimator.set_params(**{k: n_threads for k in previous})
+    return previous
+
+
+def _subset(data, idx):
+    return data.iloc[idx] if hasattr(data, "iloc") else data[idx]
+
+
+def split_pipeline(pipeline):
+    """(prefix steps, final step) of a Pipeline; a bare estimator has no prefix."""
+    if hasattr(pipeline, "steps"):
+        return pipeline.steps[:-1], pipeline.steps[-1]
+    return [], ("model", pipeline)
+
+
+def prefix_key(pipeline):
+    """Pipelines whose prefix steps have identical params share cached folds."""
+    return joblib.hash(split_pipeline(pipeline)[0])
+
+
+def _fit_prefix(prefix, data_key, train_idx, X, y):
+    """
+    Fit the transformer/sampler steps on X[train_idx] and return the fitted
+    steps with the transformed (and resampled) training matrix. Cached on
+    (prefix params, data_key, train_idx); X and y are identified by data_key.
+    """
+    from sklearn.base import clone
+    Xt, yt = _subset(X, train_idx), _subset(y, train_idx)
+    fitted = []
+    for name, step in prefix:
+        step = clone(step)
+        resample = hasattr(step, "fit_resample")
+        with span("fit_resample" if resample else "fit_transform", step=name, rows_in=Xt.shape[0]) as sp:
+            if resample:
+                Xt, yt = step.fit_resample(Xt, yt)
+            else:
+                Xt = step.fit_transform(Xt, yt)
+            sp.count(rows=Xt.shape[0])
+        fitted.append((name, step))
+    return fitted, Xt, yt
+
+
+def _prepare(grid, name, data_key, train_idx):
+    """Warm the cache for one (prefix, fold) so model tasks only load it."""
+    pipelines, X, y = _WORKER["grids"][grid]
+    prefix, _ = split_pipeline(pipelines[name])
+    start = time.perf_counter()
+    # Near-instant when the fold is already in the on-disk cache
+    with span("prepare_fold", model=name, grid=grid, rows=len(train_idx)):
+        _WORKER["fit_prefix"](prefix, data_key, train_idx, X, y)
+    return time.perf_counter() - start
+
+
+def _fit_model(grid, name, data_key, train_idx):
+    from sklearn.base import clone
+    pipelines, X, y = _WORKER["grids"][grid]
+    pipeline = pipelines[name]
+    prefix, (model_name, model) = split_pipeline(pipeline)
+    fitted_prefix, Xt, yt = _WORKER["fit_prefix"](prefix, data_key, train_idx, X, y)
+
+    model = clone(model)
+    previous = set_thread_budget(model, _WORKER["n_threads"])
+    start = time.perf_counter()
+    with span("fit", model=name, grid=grid, rows=Xt.shape[0]):
+        model.fit(Xt, yt)
+    seconds = time.perf_counter() - start
+    # The saved model keeps its own n_jobs, not this host's budget
+    if previous:
+        model.set_params(**previous)
+
+    if not prefix:
+        return model, seconds
+    clf = clone(pipeline)
+    clf.steps = fitted_prefix + [(model_name, model)]
+    return clf, seconds
+
+
+def _run_fold(grid, name, fold, data_key, train_idx, test_idx):
+    _, X, y = _WORKER["grids"][grid]
+    start = time.perf_counter()
+    with span("cv_fold", model=name, grid=grid, fold=fold) as sp:
+        try:
+            clf, _ = _fit_model(grid, name, data_key, train_idx)
+            fit_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            X_test = _subset(X, test_idx)
+            with span("score", model=name, grid=grid, fold=fold, rows=len(test_idx)):
+                score = _WORKER["scorer"](clf, X_test, _subset(y, test_idx))
+                # Out-of-fold probabilities, for ensembles over the fitted models
+                proba = clf.predict_proba(X_test) if _WORKER["oof_proba"] else None
+            score_seconds = time.perf_counter() - start
+            error = None
+        except Exception as e:
+            # Same as cross_val_score(error_score=np.nan): the fold scores NaN
+            fit_seconds, score_seconds = time.perf_counter() - start, 0.0
+            score, proba, error = np.nan, None, f"{type(e).__name__}: {e}"
+        sp.attrs.update(score=score, error=error)
+
+    result = {
+        "Model": name, "Fold": fold, "Score": score,
+        "Fit_seconds": fit_seconds, "Score_seconds": score_seconds, "Error": error
+    }
+    if proba is not None:
+        result.update(Proba=proba, Test_idx=test_idx, Classes=clf.classes_)
+    return grid, result
+
+
+def _run_final_fit(grid, name, data_key, train_idx):
+    with span("final_fit", model=name, grid=grid):
+        clf, seconds = _fit_model(grid, name, data_key, train_idx)
+    return grid, (name, clf, seconds)
+
+
+def plan_workers(n_tasks, n_workers=None):
+    """
+    Split a core budget between processes and threads per process:
+    at most one process per task, leftover cores go to each task's n_jobs.
+    """
+    budget = n_workers or os.cpu_count() or 1
+    n_procs = max(1, min(budget, n_tasks))
+    return n_procs, max(1, budget // n_procs)
+
+
+def run_training_grid(pipelines, X, y, cv=5, scoring="f1_macro", n_workers=None, final_fit=True,
+                      cache_dir=FOLD_CACHE_DIR, cache_bytes=FOLD_CACHE_BYTES, oof_proba=False):
+    """
+    Cross-validate every pipeline on every fold, and optionally fit each one
+    on all of (X, y), scheduling the whole model x fold grid on one process
+    pool within a `n_workers` core budget. Folds are the same ones
+    cross_val_score(cv=cv) would use, so scores match it exactly.
+
+    The preprocessing/resampling steps before the final estimator are fitted
+    once per fold and cached in `cache_dir` (joblib.Memory), then reused by
+    every pipeline with the same steps. The cache is trimmed back to
+    `cache_bytes` (least recently used first) whenever a fold's model tasks
+    have all finished. cache_dir=None uses a throwaway directory for this
+    call only.
+
+    Returns (fold_results, fitted): a list of per-fold dicts with score and
+    timings, and {name: (fitted pipeline, fit seconds)}. With oof_proba each
+    successful fold also carries its predict_proba ("Proba"), the row
+    positions in X it was computed for ("Test_idx") and "Classes".
+    """
+    return run_training_grids(
+        {None: (pipelines, X, y)}, cv=cv, scoring=scoring, n_workers=n_workers, final_fit=final_fit,
+        cache_dir=cache_dir, cache_bytes=cache_bytes, oof_proba=oof_proba
+    )[None]
+
+
+def run_training_grids(grids, cv=5, scoring="f1_macro", n_workers=None, final_fit=True,
+                       cache_dir=FOLD_CACHE_DIR, cache_bytes=FOLD_CACHE_BYTES, oof_proba=False):
+    """
+    run_training_grid for several datasets at once, e.g. one per target:
+    `grids` is {key: (pipelines, X, y)}. Every key gets its own (stratified)
+    folds, and all of their tasks share one process pool, so a short grid
+    fills the cores a long one leaves idle.
+
+    Returns {key: (fold_results, fitted)}, as run_training_grid per key.
+    """
+    from sklearn.base import is_classifier
+    from sklearn.model_selection import check_cv
+
+    plans = {}
+    for key, (pipelines, X, y) in grids.items():
+        any_classifier = any(is_classifier(p) for p in pipelines.values())
+        folds = list(check_cv(cv, y, classifier=any_classifier).split(X, y))
+        # Pipelines with identical prefix steps share one prepare task per fold
+        groups = {}
+        for name, pipeline in pipelines.items():
+            groups.setdefault(prefix_key(pipeline), []).append(name)
+        plans[key] = (folds, np.arange(len(y)), joblib.hash((X, y)), groups)
+
+    n_tasks = sum(
+        len(pipelines) * (len(plans[key][0]) + (1 if final_fit else 0))
+        for key, (pipelines, _, _) in grids.items()
+    )
+    n_procs, n_threads = plan_workers(n_tasks, n_workers)
+
+    tmp_dir = None
+    if cache_dir is None:
+        cache_dir = tmp_dir = tempfile.mkdtemp(prefix="fold_cache_")
+
+    results = {key: ([], {}) for key in grids}
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_procs, initializer=_init_worker,
+            initargs=(grids, scoring, n_threads, cache_dir, oof_proba)
+        ) as pool:
+            # (prefix, fold) entries in submission order
+            pending = deque()
+            for key, (folds, all_idx, data_key, groups) in plans.items():
+                for names in groups.values():
+                    # Full-data prefix first: the final fits are the longest tasks
+                    if final_fit:
+                        pending.append((key, names, None))
+                    for i, (train_idx, test_idx) in enumerate(folds):
+                        pending.append((key, names, (i, train_idx, test_idx)))
+
+            # As each (prefix, fold) lands in the cache, queue its model fits;
+            # once they have all finished, the entry is not needed again in
+            # this run and the cache is trimmed back to its bound (LRU). At
+            # most LIVE_ENTRIES_PER_WORKER entries per worker are prepared
+            # ahead of their model fits, so the cache stays within its bound
+            # plus those entries while the grids run, not only at the end
+            memory = joblib.Memory(cache_dir, verbose=0)
+            prepared, models, remaining = {}, {}, {}
+            max_live = LIVE_ENTRIES_PER_WORKER * n_procs
+            while pending or prepared or models:
+                while pending and len(prepared) + len(remaining) < max_live:
+                    key, names, split = pending.popleft()
+                    _, all_idx, data_key, _ = plans[key]
+                    train_idx = all_idx if split is None else split[1]
+                    prepared[pool.submit(_prepare, key, names[0], data_key, train_idx)] = (key, names, split)
+                done, _ = wait(list(prepared) + list(models), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in prepared:
+                        key, names, split = prepared.pop(future)
+                        _, all_idx, data_key, _ = plans[key]
+                        # A failing prefix is not fatal here: each model task
+                        # recomputes it and reports the error for its own fold
+                        future.exception()
+                        entry = (key, names[0], None if split is None else split[0])
+                        remaining[entry] = len(names)
+                        for name in names:
+                            if split is None:
+                                task = pool.submit(_run_final_fit, key, name, data_key, all_idx)
+                            else:
+                                i, train_idx, test_idx = split
+                                task = pool.submit(_run_fold, key, name, i, data_key, train_idx, test_idx)
+                            models[task] = entry
+                        continue
+
+                    entry = models.pop(future)
+                    key, result = future.result()
+                    fold_results, fitted = results[key]
+                    if isinstance(result, dict):
+                        if result["Error"]:
+                            label = result["Model"] if key is None else f"{key} {result['Model']}"
+                            warnings.warn(f"{label} fold {result['Fold']} failed, scored NaN: {result['Error']}")
+                        fold_results.append(result)
+                    else:
+                        name, clf, seconds = result
+                        fitted[name] = (clf, seconds)
+                    remaining[entry] -= 1
+                    if remaining[entry] == 0:
+                        del remaining[entry]
+                        memory.reduce_size(bytes_limit=cache_bytes)
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            # Bounded after a failed run too
+            joblib.Memory(cache_dir, verbose=0).reduce_size(bytes_limit=cache_bytes)
+
+    # Tasks finish in any order: report them in the grids' model order
+    for key, (fold_results, fitted) in results.items():
+        order = list(grids[key][0])
+        fold_results.sort(key=lambda r: (order.index(r["Model"]), r["Fold"]))
+        results[key] = (fold_results, {name: fitted[name] for name in order if name in fitted})
+    return results
@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import time
+import glob
+import fnmatch
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Every stage script uses paths relative to the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_FILE = os.path.join(".cache", "pipeline_state.json")
+
+# Stage declarations: script to run, source files whose change invalidates
+# the stage, data it reads and data it writes. Dependencies between stages
+# are derived from inputs/outputs, so there is no separate edge list.
+# A 'source' stage brings in external data: it is up to date whenever its
+# outputs exist. Paths may be glob patterns, so that a stage owns only the
+# files it writes in a folder other tools write to as well (models/ holds
+# .mmap exports, search results and incremental versions next to the
+# trained pipelines).
+STAGES = {
+    "fetch": {
+        "script": "scripts/fetch_data.py",
+        "code": ["scripts/fetch_data.py", "scripts/dataset_store.py"],
+        "inputs": [],
+        "outputs": ["data/raw/survey.csv"],
+        "source": True,
+    },
+    "clean": {
+        "script": "scripts/clean_data.py",
+        "code": ["scripts/clean_data.py", "scripts/encoding.py", "scripts/clean_store.py", "scripts/helper.py",
+                 "scripts/audit.py"],
+        "inputs": ["data/raw/survey.csv"],
+        "outputs": ["data/clean"],
+    },
+    "train": {
+        "script": "scripts/model_training.py",
+        "code": ["scripts/model_training.py", "scripts/orchestrator.py", "scripts/clean_store.py", "scripts/helper.py",
+                 "scripts/samplers.py", "scripts/batched_smote.py", "scripts/ensemble.py",
+                 "scripts/evaluation.py"],
+        "inputs": ["data/clean"],
+        "outputs": ["models/*.joblib", "models/model_performance_summary.csv", "models/oof_proba.npz",
+                    "visuals/model_training/*.png"],
+    },
+    "importance": {
+        "script": "scripts/feature_importance.py",
+        "code": ["scripts/feature_importance.py", "scripts/helper.py", "scripts/model_training.py",
+                 "scripts/clean_store.py", "scripts/numpy_scorer.py",
+                 "scripts/ensemble.py"],
+        # Exported .mmap artifacts are not inputs: they score exactly as the pipelines they mirror
+        "inputs": ["models/*.joblib", "data/clean"],
+        "outputs": ["visuals/feature_importance"],
+    },
+    "eda": {
+        "script": "scripts/EDA.py",
+        "code": ["scripts/EDA.py", "scripts/aggregates.py", "scripts/clean_store.py", "scripts/helper.py"],
+        "inputs": ["data/clean"],
+        "outputs": ["visuals/eda"],
+    },
+}
+
+
+# ---------- Fingerprints ----------
+
+def _is_pattern(path):
+    return any(c in path for c in "*?[")
+
+
+def _is_within(path, parent):
+    path, parent = os.path.normpath(path), os.path.normpath(parent)
+    return path == parent or path.startswith(parent + os.sep) or fnmatch.fnmatch(path, parent)
+
+
+def _exists(path):
+    return bool(glob.glob(path)) if _is_pattern(path) else os.path.exists(path)
+
+
+def _iter_files(path):
+    for match in sorted(glob.glob(path)) if _is_pattern(path) else [path]:
+        if os.path.isfile(match):
+            yield match
+        elif os.path.isdir(match):
+            for root, dirs, files in os.walk(match):
+                dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+                for name in sorted(files):
+                    if not name.startswith("."):
+                        yield os.path.join(root, name)
+
+
+class FileHasher:
+    """
+    sha256 of file contents, memoised on (size, mtime_ns) across runs so that
+    unchanged multi-GB inputs are not re-read just to confirm they are unchanged.
+    """
+
+    def __init__(self, memo=None):
+        self.memo = memo if memo is not None else {}
+
+    def file_hash(self, path):
+        st = os.stat(path)
+        key = [st.st_size, st.st_mtime_ns]
+        cached = self.memo.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.memo[path] = [key, digest]
+        return digest
+
+    def paths_hash(self, paths):
+        """One digest over every file under `paths` (missing paths hash as such)."""
+        h = hashlib.sha256()
+        for path in paths:
+            h.update(path.encode())
+            if not _exists(path):
+                h.update(b"<missing>")
+            for file_path in _iter_files(path):
+                h.update(file_path.encode())
+                h.update(self.file_hash(file_path).encode())
+        return h.hexdigest()
+
+
+def stage_fingerprint(stage, hasher):
+    spec = STAGES[stage]
+    return hasher.paths_hash(spec["code"]) + ":" + hasher.paths_hash(spec["inputs"])
+
+
+# ---------- DAG ----------
+
+def stage_dependencies(stage):
+    """Stages whose outputs overlap this stage's inputs."""
+    deps = set()
+    for other, spec in STAGES.items():
+        if other == stage:
+            continue
+        for inp in STAGES[stage]["inputs"]:
+            if any(_is_within(inp, out) or _is_within(out, inp) for out in spec["outputs"]):
+                deps.add(other)
+    return deps
+
+
+def select_stages(targets):
+    """The requested stages plus everything upstream of them."""
+    selected = set()
+    todo = list(targets or STAGES)
+    while todo:
+        stage = todo.pop()
+        if stage not in selected:
+            selected.add(stage)
+            todo.extend(stage_dependencies(stage))
+    return selected
+
+
+# ---------- Runner ----------
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    return {"stages": {}, "hashes": {}}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, STATE_FILE)
+
+
+def is_up_to_date(stage, fingerprint, state, hasher):
+    if STAGES[stage].get("source"):
+        return all(_exists(p) for p in STAGES[stage]["outputs"])
+    record = state["stages"].get(stage)
+    if not record or record["fingerprint"] != fingerprint:
+        return False
+    # Outputs deleted or edited by hand since the last run also force a rerun
+    outputs = STAGES[stage]["outputs"]
+    return all(_exists(p) for p in outputs) and record["outputs"] == hasher.paths_hash(outputs)
+
+
+def run_stage(stage):
+    env = dict(os.environ, MPLBACKEND=os.environ.get("MPLBACKEND", "Agg"))
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, STAGES[stage]["script"]],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+    )
+    return proc, time.perf_counter() - start
+
+
+def run_pipeline(targets=None, jobs=2, force=False, dry_run=False):
+    """
+    Run the selected stages in dependency order, up to `jobs` at a time.
+    A stage is skipped when its code and inputs hash the same as on its last
+    successful run and its recorded outputs are intact. Returns {stage: status}.
+    """
+    os.chdir(PROJECT_ROOT)
+    selected = select_stages(targets)
+    state = load_state()
+    hasher = FileHasher(state.setdefault("hashes", {}))
+
+    deps = {s: stage_dependencies(s) & selected for s in selected}
+    status = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while len(status) < len(selected):
+            ready = [s for s in sorted(selected)
+                     if s not in status and s not in running and all(d in status for d in deps[s])]
+            for stage in ready:
+                if any(status[d] == "failed" or status[d] == "blocked" for d in deps[stage]):
+                    status[stage] = "blocked"
+                    print(f"[{stage}] blocked by failed upstream stage")
+                    continue
+                fingerprint = stage_fingerprint(stage, hasher)
+                upstream_stale = any(status[d] == "would run" for d in deps[stage])
+                if not force and not upstream_stale and is_up_to_date(stage, fingerprint, state, hasher):
+                    status[stage] = "skipped"
+                    print(f"[{stage}] up to date, skipped")
+                    continue
+                if dry_run:
+                    status[stage] = "would run"
+                    print(f"[{stage}] would run")
+                    continue
+                print(f"[{stage}] running {STAGES[stage]['script']}")
+                running[stage] = (pool.submit(run_stage, stage), fingerprint)
+
+            if not running:
+                continue
+
+            done, _ = wait([f for f, _ in running.values()], return_when=FIRST_COMPLETED)
+            for stage in [s for s, (f, _) in running.items() if f in done]:
+                future, fingerprint = running.pop(stage)
+                proc, elapsed = future.result()
+                if proc.returncode == 0:
+                    status[stage] = "ran"
+                    state["stages"][stage] = {
+                        "fingerprint": fingerprint,
+                        "outputs": hasher.paths_hash(STAGES[stage]["outputs"]),
+                        "seconds": round(elapsed, 3),
+                    }
+                    save_state(state)
+                    print(f"[{stage}] done in {elapsed:.1f}s")
+                else:
+                    status[stage] = "failed"
+                    print(f"[{stage}] FAILED (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+    save_state(state)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run fetch -> clean -> train/eda -> importance, skipping stages whose inputs are unchanged."
+    )
+    parser.add_argument("stages", nargs="*", metavar="stage",
+                        help=f"Stages to bring up to date: {', '.join(STAGES)} (default: all); "
+                             "upstream stages are included")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Stages to run in parallel")
+    parser.add_argument("--force", action="store_true", help="Rerun selected stages even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages are stale")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="Trace every stage that runs into one file (Chrome trace, or JSON lines for .jsonl)")
+    args = parser.parse_args()
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    if args.trace:
+        # Stage processes inherit the trace through the environment
+        from helper import configure_tracing
+        configure_tracing(args.trace)
+
+    result = run_pipeline(args.stages, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    sys.exit(1 if "failed" in result.values() or "blocked" in result.values() else 0)
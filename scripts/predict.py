@@ -0,0 +1,202 @@
+import os
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from clean_data import ENCODING_SPEC, map_columns, select_clean_columns
+from clean_store import CLEAN_COLUMNS
+from model_training import MODELS_DIR, encode_frame
+from numpy_scorer import load_model
+
+DEFAULT_MODEL = os.path.join(MODELS_DIR, "LogisticRegression.joblib")
+DEFAULT_BATCH_SIZE = 50_000
+INPUT_KINDS = ("auto", "raw", "clean")
+
+
+def detect_input_kind(columns):
+    """'raw' for OSMI survey exports, 'clean' for data/clean rows."""
+    if "Gender" in columns and "Gender_cleaned" not in columns:
+        return "raw"
+    return "clean"
+
+
+def raw_to_clean(df, on_unknown="default"):
+    """
+    Apply clean_data.py's mappings to raw survey rows. Unlike cleaning, no
+    rows are dropped (out-of-range ages are still scored) so the output lines
+    up with the input. Missing columns (e.g. the target, or questions a
+    form did not ask) become NaN.
+    """
+    df = df.copy()
+    raw_cols = ['Age', 'Country'] + [rule["source"] for rule in ENCODING_SPEC.values()]
+    for col in raw_cols:
+        if col not in df.columns:
+            df[col] = np.nan
+    return select_clean_columns(map_columns(df, on_unknown))
+
+
+def model_columns(model):
+    """
+    Input columns of a saved model, in training order: a pipeline's
+    feature_names_in_, an exported artifact's columns, an ensemble's first
+    member's. Whatever the model's target, it is not among them.
+    """
+    if hasattr(model, "names") and hasattr(model, "estimators"):
+        return model_columns(model.estimators[0][1])
+    columns = getattr(model, "columns", None)
+    return list(columns if columns is not None else model.feature_names_in_)
+
+
+class BatchPredictor:
+    """A saved pipeline, loaded once, scoring DataFrames of raw or clean rows."""
+
+    def __init__(self, model_path=DEFAULT_MODEL, input_kind="auto", keep_columns=()):
+        self.model_path = model_path
+        # A newer exported artifact is memory-mapped: worker processes share it
+        self.model = load_model(model_path)
+        self.columns = model_columns(self.model)
+        self.input_kind = input_kind
+        self.keep_columns = list(keep_columns)
+
+    def features(self, df):
+        kind = self.input_kind if self.input_kind != "auto" else detect_input_kind(df.columns)
+        clean = raw_to_clean(df) if kind == "raw" else df
+        clean = clean[[c for c in CLEAN_COLUMNS if c in clean.columns]]
+        # Encoded as for training, then exactly the model's inputs: this also
+        # drops the target the model predicts, whichever it is
+        return encode_frame(clean)[self.columns]
+
+    def predict_frame(self, df):
+        """Prediction plus one proba_<class> column per class, index aligned with df."""
+        X = self.features(df)
+        out = df[self.keep_columns].copy() if self.keep_columns else pd.DataFrame(index=df.index)
+
+        if hasattr(self.model, "predict_proba"):
+            proba = self.model.predict_proba(X)
+            classes = self.model.classes_
+            out["prediction"] = classes.take(proba.argmax(axis=1))
+            for j, cls in enumerate(classes):
+                out[f"proba_{cls}"] = proba[:, j]
+        else:
+            out["prediction"] = self.model.predict(X)
+        return out
+
+
+# ---------- Batched file scoring ----------
+
+def iter_batches(path, batch_size=DEFAULT_BATCH_SIZE):
+    """DataFrames of at most batch_size rows from a CSV or Parquet file."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=batch_size)
+
+
+class BatchWriter:
+    """Appends scored batches to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._file = None
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.path, "w", newline="")
+            df.to_csv(self._file, header=header, index=False)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker-process predictor, loaded once per process by _init_worker
+_WORKER = {}
+
+
+def _init_worker(model_path, input_kind, keep_columns):
+    _WORKER["predictor"] = BatchPredictor(model_path, input_kind, keep_columns)
+
+
+def _predict_batch(df):
+    return _WORKER["predictor"].predict_frame(df)
+
+
+def score_file(input_path, output_path, model_path=DEFAULT_MODEL, batch_size=DEFAULT_BATCH_SIZE,
+               workers=1, input_kind="auto", keep_columns=()):
+    """
+    Score input_path (CSV/Parquet, raw or clean rows) in batches of batch_size
+    and write predictions + probabilities to output_path, in input order.
+    With workers > 1, batches are scored on a process pool that loads the
+    model once per process; at most 2 x workers batches are in flight, so
+    memory stays bounded for any input size. Returns the number of rows.
+    """
+    n_rows = 0
+    with BatchWriter(output_path) as writer:
+        if workers <= 1:
+            predictor = BatchPredictor(model_path, input_kind, keep_columns)
+            for batch in iter_batches(input_path, batch_size):
+                writer.write(predictor.predict_frame(batch))
+                n_rows += len(batch)
+            return n_rows
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(model_path, input_kind, list(keep_columns))
+        ) as pool:
+            pending = deque()
+            for batch in iter_batches(input_path, batch_size):
+                pending.append(pool.submit(_predict_batch, batch))
+                if len(pending) >= 2 * workers:
+                    scored = pending.popleft().result()
+                    writer.write(scored)
+                    n_rows += len(scored)
+            while pending:
+                scored = pending.popleft().result()
+                writer.write(scored)
+                n_rows += len(scored)
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score survey responses with a saved model pipeline.")
+    parser.add_argument("input", help="CSV or Parquet file of raw survey rows or clean rows")
+    parser.add_argument("output", help="Output CSV or Parquet file")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="Scoring processes (default: 1, in-process)")
+    parser.add_argument("--input-kind", choices=INPUT_KINDS, default="auto")
+    parser.add_argument("--keep", default="", help="Comma-separated input columns to copy to the output")
+    args = parser.parse_args(argv)
+
+    keep = [c for c in args.keep.split(",") if c]
+    n = score_file(args.input, args.output, args.model, args.batch_size, args.workers, args.input_kind, keep)
+    print(f"Scored {n} rows with {args.model} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
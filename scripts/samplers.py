@@ -0,0 +1,26 @@
+# Imbalance handling between the preprocessor and the model:
+#   smote          - imblearn SMOTE (previous behaviour)
+#   class_weight   - no resampling; class weights / uniform priors only
+#   undersample    - random undersampling of the larger classes
+#   batched_smote  - SMOTE over sparse or dense input in row batches, with
+#                    neighbours searched in a bounded random candidate pool
+IMBALANCE_MODES = ("smote", "class_weight", "undersample", "batched_smote")
+
+
+def build_sampler(mode="smote", random_state=42):
+    """
+    The resampling step for an imbalance mode (None: no resampling step).
+    Samplers are imported here, so importing IMBALANCE_MODES stays cheap.
+    """
+    if mode not in IMBALANCE_MODES:
+        raise ValueError(f"imbalance mode must be one of {IMBALANCE_MODES}, got {mode!r}")
+    if mode == "smote":
+        from imblearn.over_sampling import SMOTE
+        return SMOTE(random_state=random_state)
+    if mode == "undersample":
+        from imblearn.under_sampling import RandomUnderSampler
+        return RandomUnderSampler(random_state=random_state)
+    if mode == "batched_smote":
+        from batched_smote import BatchedSMOTE
+        return BatchedSMOTE(random_state=random_state)
+    return None
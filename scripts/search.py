@@ -0,0 +1,253 @@
+import os
+import json
+import math
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from model_training import (
+    CV_FOLDS, MATRIX_FORMATS, MODELS_DIR, BEST_PARAMS_PATH,
+    load_training_data, holdout_split, build_preprocessor, build_models, build_pipelines
+)
+from orchestrator import FOLD_CACHE_DIR, run_training_grid
+
+# One JSON-lines trial store per model; finished trials are never rerun
+SEARCH_DIR = os.path.join(".cache", "search")
+SEARCH_RESULTS_PATH = os.path.join(MODELS_DIR, "search_results.csv")
+
+# Per model: the hyperparameters sampled for the candidates, and the
+# resource successive halving grows rung by rung: n_samples (training rows)
+# or a model parameter such as n_estimators. max_resource None = all rows.
+# ("log", lo, hi) samples log-uniformly, a list uniformly.
+SEARCH_SPACES = {
+    "RandomForest_Balanced": {
+        "resource": "n_estimators", "min_resource": 25, "max_resource": 400,
+        "params": {
+            "max_depth": [None, 6, 10, 16],
+            "min_samples_leaf": [1, 2, 4, 8],
+            "max_features": ["sqrt", "log2", 0.5],
+        },
+    },
+    "LogisticRegression": {
+        "resource": "n_samples", "min_resource": 200, "max_resource": None,
+        "params": {"C": ("log", 1e-3, 1e2)},
+    },
+    "CategoricalNB": {
+        "resource": "n_samples", "min_resource": 200, "max_resource": None,
+        "params": {"alpha": ("log", 1e-2, 1e1)},
+    },
+}
+N_CANDIDATES = 27
+ETA = 3
+
+
+class TrialStore:
+    """Append-only JSON-lines file of finished trials, keyed by trial hash."""
+
+    def __init__(self, path):
+        self.path = path
+        self.trials = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.trials[record["key"]] = record
+
+    def get(self, key):
+        return self.trials.get(key)
+
+    def add(self, record):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+        self.trials[record["key"]] = record
+
+
+def sample_candidates(space, n_candidates, seed=42):
+    """n_candidates distinct parameter dicts drawn from the space."""
+    rng = np.random.default_rng(seed)
+    candidates, seen = [], set()
+    for _ in range(n_candidates * 20):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple) and values[0] == "log":
+                params[name] = float(10 ** rng.uniform(np.log10(values[1]), np.log10(values[2])))
+            else:
+                value = values[rng.integers(len(values))]
+                params[name] = value.item() if hasattr(value, "item") else value
+        key = json.dumps(params, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+        if len(candidates) == n_candidates:
+            break
+    return candidates
+
+
+def rung_resources(min_resource, max_resource, n_candidates, eta=ETA):
+    """Resource per rung, ending at max_resource, one rung per factor eta of candidates."""
+    n_rungs = min(
+        int(math.log(max_resource / min_resource, eta)) + 1 if max_resource > min_resource else 1,
+        math.ceil(math.log(n_candidates, eta)) + 1 if n_candidates > 1 else 1,
+    )
+    return [int(max_resource / eta ** (n_rungs - 1 - i)) for i in range(n_rungs)]
+
+
+def subsample(X, y, n, seed=42):
+    """A stratified sample of n rows (all of them if n >= len(y))."""
+    if n >= len(y):
+        return X, y
+    idx = np.arange(len(y))
+    keep, _ = train_test_split(idx, train_size=n, random_state=seed, stratify=y)
+    keep = np.sort(keep)
+    return X.iloc[keep], y.iloc[keep]
+
+
+def evaluate_rung(name, candidates, resource, X, y, store, cv=CV_FOLDS, n_workers=None,
+                  matrix_format="auto", fold_cache=FOLD_CACHE_DIR):
+    """
+    CV macro F1 of every candidate at one resource level. Trials already in
+    the store are reused; the rest run as one model x fold grid on the
+    process pool, sharing each fold's preprocessing + SMOTE.
+    """
+    space = SEARCH_SPACES[name]
+    if space["resource"] == "n_samples":
+        Xr, yr = subsample(X, y, resource)
+        trial_params = [dict(p) for p in candidates]
+    else:
+        Xr, yr = X, y
+        trial_params = [{**p, space["resource"]: resource} for p in candidates]
+    data_key = joblib.hash((Xr, yr))
+    categorical_cols = [c for c in X.columns if c.endswith('_cleaned')]
+
+    records, pipelines = [], {}
+    for params in trial_params:
+        key = joblib.hash((name, params, resource, data_key, cv, matrix_format))
+        record = store.get(key)
+        if record is None:
+            models = build_models({name: params})
+            pipelines[key] = build_pipelines(
+                build_preprocessor(categorical_cols, matrix_format), {name: models[name]}, matrix_format
+            )[name]
+        records.append((key, params, record))
+
+    if pipelines:
+        start = time.perf_counter()
+        fold_results, _ = run_training_grid(
+            pipelines, Xr, yr, cv=cv, scoring="f1_macro", n_workers=n_workers, final_fit=False,
+            cache_dir=fold_cache
+        )
+        print(f"  {name}: {len(pipelines)} trials at {space['resource']}={resource} "
+              f"in {time.perf_counter() - start:.1f}s")
+        for key, params, record in records:
+            if record is None:
+                folds = [r for r in fold_results if r["Model"] == key]
+                scores = np.array([r["Score"] for r in folds], dtype=float)
+                store.add({
+                    "key": key, "model": name, "params": params,
+                    "resource": space["resource"], "resource_value": resource,
+                    # Failed folds (NaN) are left out rather than sinking the candidate
+                    "cv_f1_mean": float(np.nanmean(scores)) if np.isfinite(scores).any() else None,
+                    "cv_f1_std": float(np.nanstd(scores)) if np.isfinite(scores).any() else None,
+                    "failed_folds": int(np.isnan(scores).sum()),
+                    "fit_seconds": float(sum(r["Fit_seconds"] for r in folds)),
+                })
+    return [store.get(key) for key, _, _ in records]
+
+
+def successive_halving(name, X, y, n_candidates=N_CANDIDATES, eta=ETA, seed=42, **kwargs):
+    """
+    Successive halving over SEARCH_SPACES[name]: every candidate is scored
+    with the smallest resource, and only the best 1/eta of each rung moves on
+    to the next, eta times larger one. Returns all trial records and the best
+    (None when no candidate of the last rung scored any fold).
+    """
+    space = SEARCH_SPACES[name]
+    store = TrialStore(os.path.join(SEARCH_DIR, f"{name}.jsonl"))
+    candidates = sample_candidates(space["params"], n_candidates, seed)
+    max_resource = space["max_resource"] or len(y)
+    resources = rung_resources(space["min_resource"], max_resource, len(candidates), eta)
+
+    history = []
+    for rung, resource in enumerate(resources):
+        results = evaluate_rung(name, candidates, resource, X, y, store, **kwargs)
+        for record in results:
+            history.append({"rung": rung, **record})
+        ranked = sorted(
+            zip(candidates, results),
+            key=lambda cr: -cr[1]["cv_f1_mean"] if cr[1]["cv_f1_mean"] is not None else math.inf
+        )
+        if rung < len(resources) - 1:
+            candidates = [c for c, _ in ranked[:max(1, math.ceil(len(ranked) / eta))]]
+
+    # Candidates whose every fold failed have no score and cannot be the best
+    scored = [record for _, record in ranked if record["cv_f1_mean"] is not None]
+    return history, scored[0] if scored else None
+
+
+def run_search(model_names=None, n_candidates=N_CANDIDATES, eta=ETA, n_workers=None, matrix_format="auto",
+               fold_cache=FOLD_CACHE_DIR):
+    """Search every model on the training split; writes BEST_PARAMS_PATH and SEARCH_RESULTS_PATH."""
+    X, y, _ = load_training_data()
+    # Tune on the training split only: the test split stays held out for the summary
+    X_train, _, y_train, _ = holdout_split(X, y)
+
+    best_params, rows = {}, []
+    searched = list(model_names or SEARCH_SPACES)
+    for name in searched:
+        print(f"\n🔎 {name}")
+        history, best = successive_halving(
+            name, X_train, y_train, n_candidates, eta,
+            n_workers=n_workers, matrix_format=matrix_format, fold_cache=fold_cache
+        )
+        if best is None:
+            print(f"[WARN] Every fold of every {name} candidate failed; {BEST_PARAMS_PATH} keeps its previous entry")
+        else:
+            best_params[name] = {"params": best["params"], "cv_f1_mean": best["cv_f1_mean"]}
+            print(f"Best {name}: CV F1 (macro) {best['cv_f1_mean']:.3f} with {best['params']}")
+        for record in history:
+            rows.append({
+                "Model": name, "Rung": record["rung"], "Resource": record["resource"],
+                "Resource_value": record["resource_value"], "Params": json.dumps(record["params"], sort_keys=True),
+                "CV_F1_mean": record["cv_f1_mean"], "CV_F1_std": record["cv_f1_std"],
+                "Failed_folds": record["failed_folds"], "Fit_seconds": record["fit_seconds"],
+            })
+
+    # Models not searched this time keep their previous best
+    if os.path.exists(BEST_PARAMS_PATH):
+        with open(BEST_PARAMS_PATH) as f:
+            best_params = {**json.load(f), **best_params}
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    with open(BEST_PARAMS_PATH, "w") as f:
+        json.dump(best_params, f, indent=2, sort_keys=True)
+    results = pd.DataFrame(rows)
+    if os.path.exists(SEARCH_RESULTS_PATH):
+        # ... and their previous rungs, so the table matches best_params.json
+        previous = pd.read_csv(SEARCH_RESULTS_PATH)
+        results = pd.concat([previous[~previous["Model"].isin(searched)], results], ignore_index=True)
+    results.to_csv(SEARCH_RESULTS_PATH, index=False)
+    print(f"\nBest parameters saved to {BEST_PARAMS_PATH}; "
+          f"train with them: python scripts/model_training.py --tuned")
+    return best_params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search for the model zoo.")
+    parser.add_argument("models", nargs="*", help=f"Models to search (default: {' '.join(SEARCH_SPACES)})")
+    parser.add_argument("--candidates", type=int, default=N_CANDIDATES)
+    parser.add_argument("--eta", type=int, default=ETA, help="Keep the best 1/eta per rung")
+    parser.add_argument("--workers", type=int, default=None, help="Core budget (default: all cores)")
+    parser.add_argument("--matrix-format", choices=MATRIX_FORMATS, default="auto")
+    parser.add_argument("--no-fold-cache", action="store_true")
+    args = parser.parse_args()
+    unknown = set(args.models) - set(SEARCH_SPACES)
+    if unknown:
+        parser.error(f"no search space for {', '.join(sorted(unknown))}")
+
+    run_search(
+        args.models or None, args.candidates, args.eta, args.workers, args.matrix_format,
+        fold_cache=None if args.no_fold_cache else FOLD_CACHE_DIR
+    )
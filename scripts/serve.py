@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from predict import BatchPredictor, INPUT_KINDS
+from model_training import MODELS_DIR
+
+# Pipelines saved by model_training.py; the first one found is the default
+SERVED_MODELS = ["LogisticRegression", "CategoricalNB", "RandomForest_Balanced", "voting_clf", "stacking_clf"]
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+# Latencies kept for the /metrics percentiles
+LATENCY_WINDOW = 10_000
+
+
+class LatencyStats:
+    """Rolling window of request latencies (seconds) with percentile summaries."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {"count": self.count}
+        ms = np.array(self.samples) * 1000
+        return {
+            "count": self.count,
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p90_ms": float(np.percentile(ms, 90)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "max_ms": float(ms.max()),
+        }
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row requests for one model: the first queued
+    row opens a batch, which closes after max_batch rows or max_wait_ms,
+    whichever comes first, and is scored with one predict_proba call.
+    """
+
+    def __init__(self, predictor, executor, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.predictor = predictor
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self.n_batches = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future))
+        return await future
+
+    def _score(self, rows):
+        try:
+            return self.predictor.predict_frame(pd.DataFrame(rows)).to_dict(orient="records")
+        except Exception:
+            # One malformed row must not fail the whole batch: score rows alone
+            results = []
+            for row in rows:
+                try:
+                    results.append(self.predictor.predict_frame(pd.DataFrame([row])).to_dict(orient="records")[0])
+                except Exception as e:
+                    results.append(e)
+            return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batch_sizes.append(len(batch))
+            self.n_batches += 1
+            rows = [row for row, _ in batch]
+            # Score off the event loop so new requests keep being accepted meanwhile
+            results = await loop.run_in_executor(self.executor, self._score, rows)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+class ScoringService:
+    """Warm model cache + one MicroBatcher per model + latency metrics."""
+
+    def __init__(self, models_dir=MODELS_DIR, model_names=SERVED_MODELS, input_kind="raw",
+                 max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS, threads=1):
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.batchers = {}
+        for name in model_names:
+            path = os.path.join(models_dir, f"{name}.joblib")
+            if os.path.exists(path):
+                # Loaded once at startup, never per request
+                predictor = BatchPredictor(path, input_kind=input_kind)
+                self.batchers[name] = MicroBatcher(predictor, self.executor, max_batch, max_wait_ms)
+        if not self.batchers:
+            raise FileNotFoundError(f"None of {model_names} found in {models_dir}; run model_training.py first")
+        self.default_model = next(iter(self.batchers))
+        self.latency = {name: LatencyStats() for name in self.batchers}
+        self.errors = 0
+
+    def start(self):
+        for batcher in self.batchers.values():
+            batcher.start()
+
+    async def stop(self):
+        for batcher in self.batchers.values():
+            await batcher.stop()
+        self.executor.shutdown(wait=False)
+
+    async def predict(self, model, row):
+        start = time.perf_counter()
+        result = await self.batchers[model].submit(row)
+        self.latency[model].add(time.perf_counter() - start)
+        return result
+
+    def metrics(self):
+        return {
+            "models": {
+                name: {
+                    "latency": self.latency[name].summary(),
+                    "batch_size": {
+                        "mean": float(np.mean(b.batch_sizes)) if b.batch_sizes else None,
+                        "batches": b.n_batches,
+                    },
+                }
+                for name, b in self.batchers.items()
+            },
+            "errors": self.errors,
+        }
+
+
+# ---------- Minimal HTTP/1.1 front end (stdlib only) ----------
+
+def _response(status, payload, keep_alive=True):
+    body = json.dumps(payload, default=_json_default).encode()
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+    head = (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, version = request_line.decode("latin-1").split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+    return method, target, body, keep_alive
+
+
+async def handle_request(service, method, target, body):
+    """Route one request. POST /predict[/<model>] with one JSON survey row."""
+    path = target.split("?", 1)[0].rstrip("/")
+    if method == "GET" and path == "/health":
+        return 200, {"status": "ok", "models": list(service.batchers)}
+    if method == "GET" and path == "/metrics":
+        return 200, service.metrics()
+    if method == "POST" and (path == "/predict" or path.startswith("/predict/")):
+        model = path[len("/predict/"):] or service.default_model
+        if model not in service.batchers:
+            return 404, {"error": f"unknown model {model!r}", "models": list(service.batchers)}
+        try:
+            row = json.loads(body)
+        except ValueError as e:
+            return 400, {"error": f"invalid JSON: {e}"}
+        if not isinstance(row, dict):
+            return 400, {"error": "expected one JSON object (a survey response)"}
+        try:
+            return 200, {"model": model, **(await service.predict(model, row))}
+        except Exception as e:
+            service.errors += 1
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+    return 404, {"error": f"no route for {method} {path}"}
+
+
+async def serve(service, host="127.0.0.1", port=8000):
+    async def on_client(reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                status, payload = await handle_request(service, method, target, body)
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    service.start()
+    server = await asyncio.start_server(on_client, host, port)
+    print(f"Serving {', '.join(service.batchers)} on http://{host}:{port} (POST /predict/<model>, GET /metrics)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batching HTTP scoring service for the saved pipelines.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--input-kind", choices=INPUT_KINDS, default="raw")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--threads", type=int, default=1, help="Threads running predict_proba")
+    args = parser.parse_args()
+
+    service = ScoringService(
+        args.models_dir, SERVED_MODELS, args.input_kind, args.max_batch, args.max_wait_ms, args.threads
+    )
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,128 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# Raw OSMI export columns, in file order (data/raw/survey.csv)
+RAW_COLUMNS = [
+    "Timestamp", "Age", "Gender", "Country", "state", "self_employed", "family_history", "treatment",
+    "work_interfere", "no_employees", "remote_work", "tech_company", "benefits", "care_options",
+    "wellness_program", "seek_help", "anonymity", "leave", "mental_health_consequence",
+    "phys_health_consequence", "coworkers", "supervisor", "mental_health_interview", "phys_health_interview",
+    "mental_vs_physical", "obs_consequence", "comments",
+]
+GENERATE_CHUNKSIZE = 100_000
+
+# Free-text gender exactly as respondents typed it (case, spacing, typos),
+# weighted roughly as in the 2014 survey
+GENDER_ANSWERS = {
+    "Male": 615, "male": 206, "Female": 121, "M": 116, "female": 62, "F": 38, "m": 34, "f": 15,
+    "Make": 4, "Woman": 3, "Male ": 3, "Female ": 2, "Cis Male": 2, "Man": 2, "Female (trans)": 2,
+    "Male-ish": 1, "maile": 1, "Trans-female": 1, "Cis Female": 1, "Mal": 1, "Male (CIS)": 1, "Femake": 1,
+    "woman": 1, "msle": 1, "Mail": 1, "Malr": 1, "femail": 1, "cis male": 1, "Cis Man": 1, "Trans woman": 1,
+    "Female (cis)": 1, "non-binary": 1, "Enby": 1, "fluid": 1, "Genderqueer": 1, "Androgyne": 1, "Agender": 1,
+    "queer/she/they": 1, "something kinda male?": 1, "Guy (-ish) ^_^": 1, "Nah": 1, "All": 1, "p": 1,
+    "A little about you": 1,
+}
+COUNTRY_ANSWERS = {
+    "United States": 751, "United Kingdom": 185, "Canada": 72, "Germany": 45, "Netherlands": 27,
+    "Ireland": 27, "Australia": 21, "France": 13, "India": 10, "New Zealand": 8, "Switzerland": 7,
+    "Poland": 7, "Italy": 7, "Sweden": 7, "Belgium": 6, "Brazil": 6, "South Africa": 6, "Israel": 5, "Singapore": 4,
+    "Bulgaria": 4, "Austria": 3, "Finland": 3, "Mexico": 3, "Russia": 3, "Denmark": 2, "Greece": 2,
+    "Colombia": 2, "Portugal": 2, "Croatia": 2, "Spain": 1, "Japan": 1, "Nigeria": 1,
+}
+US_STATES = ["CA", "WA", "NY", "TN", "TX", "OH", "IL", "PA", "OR", "IN", "MI", "MN", "MA", "FL", "NC", "VA"]
+# Answer -> share for the closed questions ("NA" = left blank)
+ANSWERS = {
+    "self_employed": {"No": 0.87, "Yes": 0.12, "NA": 0.01},
+    "family_history": {"No": 0.61, "Yes": 0.39},
+    "work_interfere": {"Sometimes": 0.37, "NA": 0.21, "Never": 0.17, "Rarely": 0.14, "Often": 0.11},
+    "no_employees": {"6-25": 0.23, "26-100": 0.23, "More than 1000": 0.22, "100-500": 0.14, "1-5": 0.13,
+                     "500-1000": 0.05},
+    "remote_work": {"No": 0.7, "Yes": 0.3},
+    "tech_company": {"Yes": 0.82, "No": 0.18},
+    "benefits": {"Yes": 0.38, "Don't know": 0.32, "No": 0.3},
+    "care_options": {"No": 0.4, "Yes": 0.35, "Not sure": 0.25},
+    "wellness_program": {"No": 0.67, "Yes": 0.18, "Don't know": 0.15},
+    "seek_help": {"No": 0.51, "Don't know": 0.29, "Yes": 0.2},
+    "anonymity": {"Don't know": 0.65, "Yes": 0.3, "No": 0.05},
+    "leave": {"Don't know": 0.45, "Somewhat easy": 0.21, "Very easy": 0.16, "Somewhat difficult": 0.1,
+              "Very difficult": 0.08},
+    "mental_health_consequence": {"No": 0.39, "Maybe": 0.38, "Yes": 0.23},
+    "phys_health_consequence": {"No": 0.73, "Maybe": 0.22, "Yes": 0.05},
+    "coworkers": {"Some of them": 0.61, "No": 0.21, "Yes": 0.18},
+    "supervisor": {"Yes": 0.41, "No": 0.31, "Some of them": 0.28},
+    "mental_health_interview": {"No": 0.8, "Maybe": 0.16, "Yes": 0.04},
+    "phys_health_interview": {"Maybe": 0.44, "No": 0.4, "Yes": 0.16},
+    "mental_vs_physical": {"Don't know": 0.46, "Yes": 0.27, "No": 0.27},
+    "obs_consequence": {"No": 0.85, "Yes": 0.15},
+}
+# P(treatment = Yes) by work_interfere, as observed; family history shifts it
+TREATMENT_RATE = {"NA": 0.02, "Never": 0.14, "Rarely": 0.71, "Sometimes": 0.77, "Often": 0.85}
+FAMILY_HISTORY_LOGIT = 1.0
+# Share of ages that are typos / jokes (negative, 0-17, or absurdly large),
+# which clean_data.py has to drop
+BAD_AGE_RATE = 0.006
+COMMENT_RATE = 0.13
+
+
+def _choice(rng, answers, n):
+    values = np.array(list(answers), dtype=object)
+    weights = np.array(list(answers.values()), dtype=float)
+    return values[rng.choice(len(values), size=n, p=weights / weights.sum())]
+
+
+def generate_raw(n_rows, seed=42, start_row=0):
+    """
+    n_rows synthetic survey answers with the raw export's columns and quirks:
+    messy free-text Gender, blank answers, bad ages, US-only states. Answers
+    are drawn independently per question except treatment, which follows
+    work_interfere and family_history so models have something to learn.
+    """
+    rng = np.random.default_rng([seed, start_row])
+    df = pd.DataFrame(index=pd.RangeIndex(start_row, start_row + n_rows))
+
+    df["Timestamp"] = (pd.Timestamp("2014-08-27 11:29:31") + pd.to_timedelta(df.index, unit="s")).astype(str)
+    age = np.clip(np.round(rng.normal(32, 7.3, n_rows)), 18, 72).astype(np.int64)
+    bad = rng.random(n_rows) < BAD_AGE_RATE
+    age[bad] = rng.choice([-1726, -29, -1, 5, 8, 11, 329, 99999999999], size=bad.sum())
+    df["Age"] = age
+    df["Gender"] = _choice(rng, GENDER_ANSWERS, n_rows)
+    df["Country"] = _choice(rng, COUNTRY_ANSWERS, n_rows)
+    df["state"] = np.where(df["Country"] == "United States",
+                           rng.choice(US_STATES, size=n_rows), None)
+    for col, answers in ANSWERS.items():
+        df[col] = _choice(rng, answers, n_rows)
+
+    base = df["work_interfere"].map(TREATMENT_RATE).to_numpy(dtype=float)
+    logit = np.log(base / (1 - base)) + FAMILY_HISTORY_LOGIT * (df["family_history"].to_numpy() == "Yes") \
+        - FAMILY_HISTORY_LOGIT * ANSWERS["family_history"]["Yes"]
+    df["treatment"] = np.where(rng.random(n_rows) < 1 / (1 + np.exp(-logit)), "Yes", "No")
+    df["comments"] = np.where(rng.random(n_rows) < COMMENT_RATE, "synthetic comment", None)
+
+    df = df.replace({"NA": None})
+    return df[RAW_COLUMNS].reset_index(drop=True)
+
+
+def write_raw(path, n_rows, seed=42, chunksize=GENERATE_CHUNKSIZE):
+    """Write n_rows synthetic rows to a CSV like data/raw/survey.csv, one chunk in memory at a time."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        for start in range(0, n_rows, chunksize):
+            chunk = generate_raw(min(chunksize, n_rows - start), seed, start_row=start)
+            chunk.to_csv(f, header=(start == 0), index=False, na_rep="NA")
+    os.replace(tmp, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic raw survey rows (OSMI export schema).")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("--output", default="data/raw/synthetic_survey.csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunksize", type=int, default=GENERATE_CHUNKSIZE)
+    args = parser.parse_args()
+
+    write_raw(args.output, args.rows, args.seed, args.chunksize)
+    print(f"Wrote {args.rows} synthetic rows to {args.output}")